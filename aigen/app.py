@@ -4,11 +4,23 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import requests
 import os
-
-app = FastAPI()
+import sys
 
 # Настройка путей
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+# профилировщик запросов общий с backend (запуск из каталога aigen — корень проекта не в sys.path)
+if ROOT_DIR not in sys.path:
+    sys.path.append(ROOT_DIR)
+from backend import profiler
+
+app = FastAPI()
+if profiler.TOKEN or profiler.SAMPLE_RATE:
+    app.add_middleware(
+        profiler.ProfilerMiddleware,
+        ring=profiler.ProfileRing(os.environ.get("GODATE_PROFILE_DIR") or os.path.join(BASE_DIR, "profiles")),
+    )
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 
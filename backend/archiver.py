@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from .models import FriendRequest, FriendRequestArchive
+
+
+# Архивация заявок: в friend_requests остаются ожидающие и недавно решённые заявки,
+# принятые/отклонённые старше RETENTION_DAYS фоновый поток пакетами переносит в
+# friend_requests_archive. Дружба хранится отдельно, в friendships, и от архива не зависит.
+# После переноса отклонённую заявку можно отправить повторно.
+
+RETENTION_DAYS = float(os.environ.get("GODATE_REQUEST_RETENTION_DAYS", "30"))
+BATCH_SIZE = 500
+PAUSE_SECONDS = 0.05
+IDLE_SECONDS = 3600.0
+
+logger = logging.getLogger("godate.archiver")
+
+
+class RequestArchiver:
+    def __init__(self, retention_days: float = RETENTION_DAYS):
+        self.retention = timedelta(days=retention_days)
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.running = False
+        self.archived = 0
+        self.last_run: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def wake(self):
+        self._wake.set()
+
+    def _cutoff(self) -> datetime:
+        return datetime.utcnow() - self.retention
+
+    def run_once(self, session_factory: Callable[[], Session]) -> int:
+        # один пакет в одной транзакции: копия в архив и удаление из горячей таблицы
+        db = session_factory()
+        try:
+            ids = db.scalars(
+                select(FriendRequest.id)
+                .where(FriendRequest.resolved_at.is_not(None), FriendRequest.resolved_at < self._cutoff())
+                .order_by(FriendRequest.resolved_at)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not ids:
+                return 0
+            columns = ["id", "from_user_id", "to_user_id", "type", "status", "created_at", "resolved_at"]
+            source = select(*(getattr(FriendRequest, c) for c in columns), func.datetime("now")).where(FriendRequest.id.in_(ids))
+            db.execute(insert(FriendRequestArchive).prefix_with("OR REPLACE").from_select([*columns, "archived_at"], source))
+            db.execute(delete(FriendRequest).where(FriendRequest.id.in_(ids)))
+            db.commit()
+            self.archived += len(ids)
+            return len(ids)
+        finally:
+            db.close()
+
+    def drain(self, session_factory: Callable[[], Session]):
+        self.running = True
+        try:
+            while not self._stop.is_set() and self.run_once(session_factory) == BATCH_SIZE:
+                time.sleep(PAUSE_SECONDS)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.exception("friend request archival failed")
+        finally:
+            self.running = False
+            self.last_run = datetime.utcnow()
+
+    def pending(self, db: Session) -> int:
+        # по частичному индексу ix_friend_requests_resolved
+        return db.scalar(
+            select(func.count()).select_from(FriendRequest)
+            .where(FriendRequest.resolved_at.is_not(None), FriendRequest.resolved_at < self._cutoff())
+        ) or 0
+
+    def status(self, db: Session) -> dict:
+        return {
+            "retention_days": self.retention.total_seconds() / 86400,
+            "pending": self.pending(db),
+            "archived_total": db.scalar(select(func.count()).select_from(FriendRequestArchive)) or 0,
+            "archived": self.archived,
+            "running": self.running,
+            "last_run": self.last_run,
+            "last_error": self.last_error,
+        }
+
+    def start(self, session_factory: Callable[[], Session]):
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                self.drain(session_factory)
+                self._wake.wait(IDLE_SECONDS)
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=loop, name="godate-archiver", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+archiver = RequestArchiver()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from itertools import groupby
+from typing import List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import DailyCompletion, DailyStat, User
+
+
+# Сводки дейликов без обхода daily_completion: daily_stats — число выполнений за дату,
+# users.daily_streak/daily_best_streak/daily_last_date — серия пользователя. Оба обновляются
+# атомарными UPDATE в транзакции complete_daily, чтение — одна строка по первичному ключу
+# (или уже загруженный User), сколько бы ни накопилось истории. Пропущенный день серию в базе
+# не обнуляет: при чтении серия, последний день которой раньше вчерашнего, считается нулевой.
+
+MAX_HISTORY_DAYS = 90
+
+
+def record_completion(db: Session, user_id: int, day: date):
+    # вызывать в транзакции вставки DailyCompletion; commit — на вызывающем
+    stmt = sqlite_insert(DailyStat).values(date=day, completions=1)
+    db.execute(stmt.on_conflict_do_update(index_elements=[DailyStat.date], set_={"completions": DailyStat.completions + 1}))
+    # в SET все выражения видят старые значения строки
+    streak = case(
+        (User.daily_last_date == day - timedelta(days=1), func.coalesce(User.daily_streak, 0) + 1),
+        (User.daily_last_date == day, func.coalesce(User.daily_streak, 1)),
+        else_=1,
+    )
+    db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(daily_streak=streak, daily_best_streak=func.max(func.coalesce(User.daily_best_streak, 0), streak), daily_last_date=day)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def completions(db: Session, day: date) -> int:
+    return db.scalar(select(DailyStat.completions).where(DailyStat.date == day)) or 0
+
+
+def history(db: Session, today: date, days: int) -> List[Tuple[date, int]]:
+    # последние days дат, включая today; даты без выполнений — с нулём
+    start = today - timedelta(days=days - 1)
+    counts = dict(db.execute(select(DailyStat.date, DailyStat.completions).where(DailyStat.date.between(start, today))).all())
+    return [(day, counts.get(day, 0)) for day in (today - timedelta(days=back) for back in range(days))]
+
+
+def streak(user: User, today: date) -> int:
+    last: Optional[date] = user.daily_last_date
+    if last is None or last < today - timedelta(days=1):
+        return 0
+    return user.daily_streak or 0
+
+
+def completed(user: User, day: date) -> bool:
+    return user.daily_last_date == day
+
+
+def rebuild(bind):
+    # счётчики и серии заново из daily_completion (миграция, bench.datagen); bind — Connection или Session
+    bind.execute(delete(DailyStat))
+    bind.execute(insert(DailyStat).from_select(
+        ["date", "completions"],
+        select(DailyCompletion.date, func.count(DailyCompletion.user_id.distinct())).group_by(DailyCompletion.date),
+    ))
+    rows = bind.execute(
+        select(DailyCompletion.user_id, DailyCompletion.date).distinct().order_by(DailyCompletion.user_id, DailyCompletion.date)
+    ).all()
+    users = User.__table__
+    bind.execute(update(users).values(daily_streak=0, daily_best_streak=0, daily_last_date=None))
+    params = []
+    for user_id, group in groupby(rows, key=lambda row: row[0]):
+        current = best = 0
+        last = None
+        for _, day in group:
+            current = current + 1 if last is not None and day - last == timedelta(days=1) else 1
+            best = max(best, current)
+            last = day
+        params.append({"uid": user_id, "streak": current, "best": best, "last_day": last})
+    if params:
+        bind.execute(
+            update(users)
+            .where(users.c.id == bindparam("uid"))
+            .values(daily_streak=bindparam("streak"), daily_best_streak=bindparam("best"), daily_last_date=bindparam("last_day")),
+            params,
+        )
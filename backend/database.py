@@ -1,12 +1,14 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
 
 BASE_DIR = Path(__file__).resolve().parent
-DB_PATH = BASE_DIR / "godate.db"
+# GODATE_DB_PATH позволяет гонять бенчмарки/нагрузку на отдельной копии базы
+DB_PATH = Path(os.environ.get("GODATE_DB_PATH") or BASE_DIR / "godate.db")
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH.as_posix()}"
 
 
@@ -24,5 +26,3 @@ def get_db():
         yield db
     finally:
         db.close()
-
-
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import math
+import os
+import random
+import re
+import struct
+from collections import Counter
+from hashlib import blake2b
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, delete, func, insert, select, update
+
+from .fragments import parse_points
+from .models import Route, RouteMinhashBand
+
+
+# Почти-дубликаты маршрутов (копипаста пользователей и ИИ): признаки маршрута — ячейки
+# двух сеток (~170 м и ~550 м) под точками и слова названия, подпись — MinHash из NUM_HASHES
+# значений, доля совпавших значений двух подписей оценивает коэффициент Жаккара их признаков.
+# Порядок точек на подпись не влияет, сдвиг точек на десятки метров — почти не влияет.
+# Подпись хранится в routes.minhash, её полосы (BANDS по ROWS значений, вместе с городом) —
+# в route_minhash_bands: маршруты с общей полосой — кандидаты, поэтому поиск дубликата —
+# несколько поисков по индексу, а не обход каталога. С ROWS=4, BANDS=16 пара со сходством
+# 0.6 попадает в кандидаты с вероятностью ~0.9, со сходством 0.7 — ~0.99.
+
+NUM_HASHES = 64
+BANDS = 16
+ROWS = NUM_HASHES // BANDS
+CELLS_DEG = (0.0015, 0.005)
+# Совпадение точек важнее совпадения слов названия: ячейка идёт в признаки GEOMETRY_WEIGHT раз
+# (взвешенный Жаккар). Маршрут меньше чем с MIN_CELLS ячейками (без точек, одна точка) подписи
+# не получает — по одному названию дубликат не определить
+GEOMETRY_WEIGHT = 3
+MIN_CELLS = 4
+# create_route отклоняет маршрут, если сходство с живым маршрутом не меньше порога; 0 — не проверять.
+# Копия со сдвигом точек до ~30 м даёт 0.6 и выше в ~85% случаев; половина общих точек при том же
+# названии — ниже 0.6 в 99%+, разные маршруты одного района — до ~0.3
+THRESHOLD = float(os.environ.get("GODATE_ROUTE_DUPLICATE_THRESHOLD", "0.6"))
+MAX_CANDIDATES = 200
+REBUILD_BATCH = 1000
+
+_PRIME = (1 << 61) - 1
+_MASK = 0xFFFFFFFF
+_rnd = random.Random(0x60DA7E)
+_PERMUTATIONS = [(_rnd.randrange(1, _PRIME), _rnd.randrange(0, _PRIME)) for _ in range(NUM_HASHES)]
+_PACK = struct.Struct(f"<{NUM_HASHES}I")
+_WORD = re.compile(r"\w+")
+
+
+def _normalize(text: str) -> str:
+    return (text or "").lower().replace("ё", "е").strip()
+
+
+def cells(coords: Iterable[Tuple[float, float]]) -> Set[str]:
+    return {
+        f"c{level}:{math.floor(lat / cell)}:{math.floor(lon / cell)}"
+        for lat, lon in coords
+        for level, cell in enumerate(CELLS_DEG)
+    }
+
+
+def features(title: str, coords: Iterable[Tuple[float, float]]) -> Set[str]:
+    found = {"t:" + word for word in _WORD.findall(_normalize(title))}
+    for item in cells(coords):
+        found.update(f"{item}:{copy}" for copy in range(GEOMETRY_WEIGHT))
+    return found
+
+
+def signature(title: str, coords: Iterable[Tuple[float, float]]) -> Optional[bytes]:
+    coords = list(coords)
+    if len(cells(coords)) < MIN_CELLS:
+        return None
+    items = features(title, coords)
+    hashes = [int.from_bytes(blake2b(item.encode(), digest_size=8).digest(), "little") for item in items]
+    return _PACK.pack(*(min((a * h + b) % _PRIME for h in hashes) & _MASK for a, b in _PERMUTATIONS))
+
+
+def band_keys(city: str, packed: bytes) -> List[int]:
+    # полосы разных городов не пересекаются: дубликат ищется только в своём городе
+    prefix = _normalize(city).encode()
+    size = ROWS * 4
+    return [
+        int.from_bytes(blake2b(prefix + bytes([band]) + packed[band * size:(band + 1) * size], digest_size=8).digest(), "little", signed=True)
+        for band in range(BANDS)
+    ]
+
+
+def similarity(a: bytes, b: bytes) -> float:
+    return sum(x == y for x, y in zip(_PACK.unpack(a), _PACK.unpack(b))) / NUM_HASHES
+
+
+def _route_signature(r: Route) -> Optional[bytes]:
+    return signature(r.title, ((p["lat"], p["lon"]) for p in parse_points(r.points_json)))
+
+
+def index(db, r: Route):
+    # при каждой записи маршрута, после flush (нужен id)
+    r.minhash = _route_signature(r)
+    db.execute(delete(RouteMinhashBand).where(RouteMinhashBand.route_id == r.id))
+    if r.minhash is not None:
+        db.execute(insert(RouteMinhashBand), [{"band_key": key, "route_id": r.id} for key in band_keys(r.city, r.minhash)])
+
+
+def find(db, city: str, title: str, coords: Iterable[Tuple[float, float]], threshold: float = THRESHOLD) -> List[Tuple[int, float]]:
+    # [(route_id, сходство)] живых маршрутов не ниже порога, самые похожие первыми
+    packed = signature(title, coords)
+    if packed is None:
+        return []
+    shared = Counter(db.scalars(select(RouteMinhashBand.route_id).where(RouteMinhashBand.band_key.in_(band_keys(city, packed)))))
+    ids = [route_id for route_id, _ in shared.most_common(MAX_CANDIDATES)]
+    if not ids:
+        return []
+    found = []
+    for route_id, other in db.execute(select(Route.id, Route.minhash).where(Route.id.in_(ids), Route.deleted_at.is_(None))):
+        if other is not None:
+            score = similarity(packed, other)
+            if score >= threshold:
+                found.append((route_id, score))
+    found.sort(key=lambda item: (-item[1], item[0]))
+    return found
+
+
+def clusters(db, threshold: float = THRESHOLD, limit: int = 100) -> List[dict]:
+    # Кластеры по всему каталогу: пары из общих полос, проверенные по подписи, склеиваются
+    # через union-find. similarity — наименьшее сходство среди пар, связавших кластер.
+    shared = select(RouteMinhashBand.band_key).group_by(RouteMinhashBand.band_key).having(func.count() > 1)
+    rows = db.execute(
+        select(RouteMinhashBand.band_key, RouteMinhashBand.route_id)
+        .where(RouteMinhashBand.band_key.in_(shared))
+        .order_by(RouteMinhashBand.band_key, RouteMinhashBand.route_id)
+    )
+    buckets = [[route_id for _, route_id in group] for _, group in groupby(rows, key=lambda row: row[0])]
+    ids = sorted({route_id for bucket in buckets for route_id in bucket})
+    routes: Dict[int, tuple] = {}
+    for start in range(0, len(ids), REBUILD_BATCH):
+        chunk = ids[start:start + REBUILD_BATCH]
+        for route_id, packed, city, title in db.execute(
+            select(Route.id, Route.minhash, Route.city, Route.title).where(Route.id.in_(chunk), Route.deleted_at.is_(None))
+        ):
+            if packed is not None:
+                routes[route_id] = (packed, city, title)
+
+    parent: Dict[int, int] = {}
+    weakest: Dict[int, float] = {}
+
+    def root(x: int) -> int:
+        while parent.get(x, x) != x:
+            parent[x] = parent.get(parent[x], parent[x])
+            x = parent[x]
+        return x
+
+    for bucket in buckets:
+        live = [route_id for route_id in bucket if route_id in routes]
+        for i, a in enumerate(live):
+            for b in live[i + 1:]:
+                ra, rb = root(a), root(b)
+                if ra == rb:
+                    continue
+                score = similarity(routes[a][0], routes[b][0])
+                if score < threshold:
+                    continue
+                low, high = min(ra, rb), max(ra, rb)
+                parent[high] = low
+                weakest[low] = min(score, weakest.get(low, 1.0), weakest.pop(high, 1.0))
+
+    members: Dict[int, List[int]] = {}
+    for route_id in parent:
+        members.setdefault(root(route_id), []).append(route_id)
+    result = []
+    for head, group in members.items():
+        group = sorted(set(group) | {head})
+        _, city, title = routes[group[0]]
+        result.append({"route_ids": group, "city": city, "title": title, "similarity": weakest.get(head, 1.0)})
+    result.sort(key=lambda c: (-len(c["route_ids"]), c["route_ids"][0]))
+    return result[:limit]
+
+
+def rebuild(bind):
+    # подписи и полосы всех живых маршрутов заново (миграция, bench.datagen); bind — Connection или Session
+    bind.execute(delete(RouteMinhashBand))
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            select(Route.id, Route.city, Route.title, Route.points_json)
+            .where(Route.id > last_id, Route.deleted_at.is_(None))
+            .order_by(Route.id)
+            .limit(REBUILD_BATCH)
+        ).all()
+        if not rows:
+            break
+        signatures, bands = [], []
+        for route_id, city, title, points_json in rows:
+            packed = signature(title, ((p["lat"], p["lon"]) for p in parse_points(points_json)))
+            signatures.append({"route_id": route_id, "minhash": packed})
+            if packed is not None:
+                bands.extend({"band_key": key, "route_id": route_id} for key in band_keys(city, packed))
+        bind.execute(
+            update(Route.__table__).where(Route.__table__.c.id == bindparam("route_id")).values(minhash=bindparam("minhash")),
+            signatures,
+        )
+        if bands:
+            bind.execute(insert(RouteMinhashBand), bands)
+        last_id = rows[-1][0]
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import hashlib
+from typing import Iterable, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .models import ResourceVersion
+from . import fragments
+from . import metrics
+
+
+# ETag по дешёвым валидаторам: счётчики версий в resource_versions увеличиваются в той же
+# транзакции, что и запись. Чтение ETag — один запрос по первичному ключу, поэтому
+# 304 отдаётся до выборки данных и сериализации ответа.
+
+ROUTES = "routes"
+RATING = "rating"
+
+CONDITIONAL_REQUESTS = metrics.Counter(
+    "godate_conditional_requests_total",
+    "Requests to ETag-enabled endpoints: hit (304), miss (stale If-None-Match), unconditional",
+    ("path", "result"),
+)
+
+
+def user_key(user_id: int) -> str:
+    # профиль пользователя: ник, аватар, рейтинг, связи
+    return f"user:{user_id}"
+
+
+def favorites_key(user_id: int) -> str:
+    return f"favorites:{user_id}"
+
+
+def bump(db: Session, *keys: str):
+    # вызывать до commit() записи, которую отражает ключ
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    stmt = insert(ResourceVersion).values([{"key": key, "version": 1} for key in keys])
+    db.execute(stmt.on_conflict_do_update(index_elements=[ResourceVersion.key], set_={"version": ResourceVersion.version + 1}))
+
+
+def compute(db: Session, keys: Iterable[str], vary: str = "") -> str:
+    keys = sorted(set(keys))
+    versions = dict(db.execute(select(ResourceVersion.key, ResourceVersion.version).where(ResourceVersion.key.in_(keys))).all())
+    # формат фрагментов тоже часть представления
+    raw = f"{fragments.VERSION}|{vary}|" + ",".join(f"{key}={versions.get(key, 0)}" for key in keys)
+    return 'W/"%s"' % hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # слабое сравнение: W/ не учитывается
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def _headers(etag: str) -> dict:
+    # private: ответы зависят от пользователя; no-cache: браузер всегда переспрашивает с If-None-Match
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def check(request: Request, db: Session, keys: Sequence[str], vary: str = "") -> Tuple[str, Optional[Response]]:
+    # (etag, готовый 304 или None)
+    etag = compute(db, keys, vary)
+    path = metrics.route_label(request.scope)
+    header = request.headers.get("if-none-match")
+    if header is None:
+        CONDITIONAL_REQUESTS.inc(path, "unconditional")
+        return etag, None
+    if _matches(header, etag):
+        CONDITIONAL_REQUESTS.inc(path, "hit")
+        return etag, Response(status_code=304, headers=_headers(etag))
+    CONDITIONAL_REQUESTS.inc(path, "miss")
+    return etag, None
+
+
+def tag(response: Response, etag: str) -> Response:
+    response.headers.update(_headers(etag))
+    return response
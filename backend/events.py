@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, insert, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from .models import ChangeEvent, WorkerLease
+from . import metrics
+
+
+# Несколько процессов uvicorn (GODATE_WORKERS > 1, запуск — python -m backend.serve).
+# Данные общие, в SQLite, но индексы в памяти (trending, ники, overlay рекомендаций) у каждого
+# воркера свои. Запись, которая меняет такой индекс, кладёт событие в change_events в той же
+# транзакции; поток каждого воркера раз в POLL_SECONDS дочитывает журнал по первичному ключу
+# и применяет чужие события. SQLite пропускает одного писателя за раз, поэтому id видны в
+# порядке коммитов. Журнал живёт RETENTION_SECONDS; воркер, отставший сильнее (пропуск id),
+# перечитывает индексы из базы целиком. Фоновые задачи (purger, archiver) запускает один
+# воркер — держатель аренды в worker_leases. С одним воркером шина выключена: ни записей
+# в журнал, ни потока.
+
+WORKERS = max(int(os.environ.get("GODATE_WORKERS", "1")), 1)
+ENABLED = WORKERS > 1
+POLL_SECONDS = float(os.environ.get("GODATE_EVENTS_POLL", "0.2"))
+RETENTION_SECONDS = 600.0
+LEASE_SECONDS = 15.0
+RENEW_SECONDS = 5.0
+BATCH_SIZE = 1000
+
+logger = logging.getLogger("godate.events")
+
+APPLIED = metrics.Counter("godate_events_applied_total", "Change-log events from other workers applied by this one", ("topic",))
+RESYNCS = metrics.Counter("godate_events_resyncs_total", "Full reloads of in-memory indexes after falling behind the change log")
+
+# обработчик получает все чужие события своей темы из прочитанной пачки
+Handler = Callable[[Session, List[dict]], None]
+
+
+class EventBus:
+    def __init__(self, enabled: bool = ENABLED):
+        self.enabled = enabled
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.cursor = 0
+        self._handlers: Dict[str, Handler] = {}
+        self._resync: List[Callable[[Session], None]] = []
+        self._leases: Dict[str, Callable[[], None]] = {}
+        self._held: Set[str] = set()
+        # (время, cursor): до какого id журнал можно чистить
+        self._checkpoints: Deque[Tuple[float, int]] = deque()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def publish(self, db: Session, topic: str, **payload):
+        # вызывать до commit() записи, которую отражает событие
+        if self.enabled:
+            db.execute(insert(ChangeEvent).values(origin=self.origin, topic=topic, payload=json.dumps(payload)))
+
+    def subscribe(self, topic: str, handler: Handler):
+        self._handlers[topic] = handler
+
+    def on_resync(self, reload: Callable[[Session], None]):
+        self._resync.append(reload)
+
+    def lead(self, name: str, on_acquire: Callable[[], None]):
+        # on_acquire вызывается в воркере, который первым взял аренду name
+        self._leases[name] = on_acquire
+
+    def mark(self, db: Session):
+        # перед загрузкой индексов из базы: события с этого места ещё не учтены.
+        # sqlite_sequence, а не max(id): после чистки журнал может быть пуст
+        if self.enabled:
+            self.cursor = db.execute(text("SELECT seq FROM sqlite_sequence WHERE name = 'change_events'")).scalar() or 0
+
+    def poll(self, db: Session) -> int:
+        # одна пачка журнала; темы применяются по очереди, обработчики не зависят от порядка между темами
+        rows = db.execute(
+            select(ChangeEvent.id, ChangeEvent.origin, ChangeEvent.topic, ChangeEvent.payload)
+            .where(ChangeEvent.id > self.cursor)
+            .order_by(ChangeEvent.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return 0
+        if rows[0][0] != self.cursor + 1:
+            self.resync(db)
+            return 0
+        grouped: Dict[str, List[dict]] = {}
+        for _, origin, topic, payload in rows:
+            if origin != self.origin and topic in self._handlers:
+                grouped.setdefault(topic, []).append(json.loads(payload))
+        for topic, payloads in grouped.items():
+            self._handlers[topic](db, payloads)
+            APPLIED.inc(topic, amount=len(payloads))
+        self.cursor = rows[-1][0]
+        return len(rows)
+
+    def resync(self, db: Session):
+        logger.warning("event log gap after id %d, reloading in-memory indexes", self.cursor)
+        self.mark(db)
+        for reload in self._resync:
+            reload(db)
+        RESYNCS.inc()
+
+    def _renew(self, db: Session, now: float):
+        for name, on_acquire in self._leases.items():
+            stmt = sqlite_insert(WorkerLease).values(name=name, holder=self.origin, expires_at=now + LEASE_SECONDS)
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=[WorkerLease.name],
+                set_={"holder": stmt.excluded.holder, "expires_at": stmt.excluded.expires_at},
+                where=(WorkerLease.holder == self.origin) | (WorkerLease.expires_at < now),
+            ))
+            db.commit()
+            held = db.scalar(select(WorkerLease.holder).where(WorkerLease.name == name)) == self.origin
+            if held and name not in self._held:
+                logger.info("worker %s acquired lease %s", self.origin, name)
+                self._held.add(name)
+                on_acquire()
+            elif not held and name in self._held:
+                # аренда истекла, пока воркер висел: задачи уже запущены и переживут пересечение
+                logger.warning("worker %s lost lease %s", self.origin, name)
+                self._held.discard(name)
+
+    def _prune(self, db: Session, now: float):
+        self._checkpoints.append((now, self.cursor))
+        cutoff = 0
+        while self._checkpoints and self._checkpoints[0][0] < now - RETENTION_SECONDS:
+            cutoff = self._checkpoints.popleft()[1]
+        # чистит один воркер — держатель любой аренды
+        if cutoff and self._held:
+            db.execute(delete(ChangeEvent).where(ChangeEvent.id <= cutoff))
+            db.commit()
+
+    def start(self, session_factory: Callable[[], Session]):
+        if not self.enabled or self._thread is not None:
+            return
+
+        def loop():
+            next_renew = 0.0
+            while not self._stop.is_set():
+                db = session_factory()
+                try:
+                    while self.poll(db) == BATCH_SIZE:
+                        pass
+                    now = time.time()
+                    if now >= next_renew:
+                        self._renew(db, now)
+                        self._prune(db, now)
+                        next_renew = now + RENEW_SECONDS
+                except Exception:
+                    logger.exception("event bus poll failed")
+                    db.rollback()
+                finally:
+                    db.close()
+                self._stop.wait(POLL_SECONDS)
+
+        self._thread = threading.Thread(target=loop, name="godate-events", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+bus = EventBus()
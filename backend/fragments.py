@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import gzip
+import json
+import zlib
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+from .models import Route
+from .schemas import RoutePublic, RoutePublicPolyline
+from . import polyline
+
+
+# Тело ответа меньше этого порога не сжимаем: gzip на коротких списках дороже передачи
+GZIP_MIN_SIZE = 16 * 1024
+GZIP_LEVEL = 5
+# Потоковая выдача: элементы склеиваются в куски примерно такого размера
+# (каждый кусок — отдельный переход в пул потоков у StreamingResponse)
+STREAM_CHUNK_SIZE = 64 * 1024
+# Повышается при изменении RoutePublic или производных полей маршрута:
+# устаревшие строки пересчитываются на старте
+VERSION = 5
+# Формат точек в списках маршрутов (?points=...)
+POINTS_FULL = "full"
+POINTS_POLYLINE = "polyline"
+POINT_FORMATS = (POINTS_FULL, POINTS_POLYLINE)
+
+
+def parse_points(points_json: Optional[str]) -> List[dict]:
+    points: List[dict] = []
+    try:
+        raw = json.loads(points_json) if points_json else []
+        for p in raw:
+            if 'lat' in p and 'lon' in p and 'name' in p:
+                points.append({
+                    'name': p.get('name'),
+                    'description': p.get('description'),
+                    'lat': float(p.get('lat')),
+                    'lon': float(p.get('lon')),
+                })
+    except Exception:
+        points = []
+    return points
+
+
+def route_public(r: Route, likes: int = 0) -> RoutePublic:
+    return RoutePublic(
+        id=r.id,
+        title=r.title,
+        description=r.description,
+        city=r.city,
+        time_minutes=r.time_minutes,
+        budget=r.budget,
+        likes=likes,
+        points=parse_points(r.points_json),
+        distance_m=r.distance_m,
+    )
+
+
+# Изменчивые поля: подставляются при выдаче, во фрагменте их нет
+STITCHED_FIELDS = {"likes", "liked_by_me", "favorited_by_me"}
+_BOOL = {False: b"false", True: b"true"}
+
+
+def render_route(r: Route) -> str:
+    # Публичный JSON маршрута без изменчивых полей
+    return route_public(r).model_dump_json(exclude=STITCHED_FIELDS)
+
+
+def render_route_polyline(r: Route) -> str:
+    points = parse_points(r.points_json)
+    return RoutePublicPolyline(
+        id=r.id,
+        title=r.title,
+        description=r.description,
+        city=r.city,
+        time_minutes=r.time_minutes,
+        budget=r.budget,
+        points=[{"name": p["name"], "description": p["description"]} for p in points],
+        polyline=polyline.encode((p["lat"], p["lon"]) for p in points),
+        distance_m=r.distance_m,
+    ).model_dump_json(exclude=STITCHED_FIELDS, exclude_none=True)
+
+
+def refresh_fragment(r: Route) -> None:
+    # Вызывается при каждой записи маршрута; id должен быть уже известен (после flush)
+    r.public_json = render_route(r)
+    r.public_polyline_json = render_route_polyline(r)
+    r.public_json_version = VERSION
+
+
+def fragment_column(points: str):
+    return Route.public_polyline_json if points == POINTS_POLYLINE else Route.public_json
+
+
+def stitch(fragment: str, likes: int, liked: bool = False, favorited: bool = False) -> bytes:
+    # '{"id":...}' -> '{"likes":N,"liked_by_me":false,"favorited_by_me":false,"id":...}'
+    return b'{"likes":%d,"liked_by_me":%s,"favorited_by_me":%s,%s' % (likes, _BOOL[liked], _BOOL[favorited], fragment[1:].encode())
+
+
+def stitch_list(rows: Iterable[tuple]) -> bytes:
+    # строки — (fragment, likes) или (fragment, likes, liked, favorited)
+    return b"[" + b",".join(stitch(*row) for row in rows) + b"]"
+
+
+def iter_json_array(items: Iterable[bytes], chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[bytes]:
+    # JSON-массив из уже сериализованных элементов, кусками по ~chunk_size байт
+    parts = [b"["]
+    size = 1
+    first = True
+    for item in items:
+        if not first:
+            parts.append(b",")
+        first = False
+        parts.append(item)
+        size += len(item) + 1
+        if size >= chunk_size:
+            yield b"".join(parts)
+            parts, size = [], 0
+    parts.append(b"]")
+    yield b"".join(parts)
+
+
+def iter_stitched(rows: Iterable[tuple]) -> Iterator[bytes]:
+    return iter_json_array(stitch(*row) for row in rows)
+
+
+def json_stream_response(request: Request, chunks: Iterable[bytes]) -> Response:
+    # Пока тело меньше GZIP_MIN_SIZE — обычный ответ, как json_list_response. Дальше —
+    # StreamingResponse: память не зависит от размера списка, gzip потоковый.
+    chunks = iter(chunks)
+    head: List[bytes] = []
+    size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= GZIP_MIN_SIZE:
+            break
+    else:
+        return json_list_response(request, b"".join(head))
+    headers = {"Vary": "Accept-Encoding"}
+    body = chain(head, chunks)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        body = _gzip_stream(body)
+    return StreamingResponse(body, media_type="application/json", headers=headers)
+
+
+def _gzip_stream(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def json_list_response(request: Request, body: bytes) -> Response:
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_SIZE and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
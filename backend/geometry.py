@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# Геометрия маршрута: матрица расстояний (haversine), длина пути, оценка времени
+# по видам транспорта и порядок обхода точек (ближайший сосед + 2-opt).
+# numpy импортируется при первом вызове, чтобы не замедлять импорт приложения.
+
+EARTH_RADIUS_M = 6371008.8
+# Прямая между точками короче реального пути по улицам
+DETOUR_FACTOR = 1.3
+# Те же ключи, что в transport_mapping генерации ИИ; км/ч с учётом остановок и пробок
+TRANSPORT_SPEED_KMH: Dict[str, float] = {
+    "onfoot": 4.5,
+    "trans": 18.0,
+    "car": 25.0,
+    "rental": 12.0,
+    "own": 14.0,
+    "taxi": 25.0,
+    "boat": 10.0,
+}
+TWO_OPT_MAX_PASSES = 50
+# Оптимизация порядка — O(n²) на проход 2-opt, поэтому число точек ограничено (422 выше),
+# а с keep_start=False пробуется не больше OPTIMIZE_MAX_RESTARTS стартовых точек
+OPTIMIZE_MAX_POINTS = 50
+OPTIMIZE_MAX_RESTARTS = 8
+
+
+def haversine_matrix(lat: Sequence[float], lon: Sequence[float]) -> np.ndarray:
+    import numpy as np
+
+    phi = np.radians(np.asarray(lat, dtype=np.float64))
+    lam = np.radians(np.asarray(lon, dtype=np.float64))
+    dphi = phi[:, None] - phi[None, :]
+    dlam = lam[:, None] - lam[None, :]
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi)[:, None] * np.cos(phi)[None, :] * np.sin(dlam / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def path_length(dist: np.ndarray, order: Sequence[int]) -> float:
+    import numpy as np
+
+    if len(order) < 2:
+        return 0.0
+    idx = np.asarray(order)
+    return float(dist[idx[:-1], idx[1:]].sum())
+
+
+def path_length_m(points: Sequence[Tuple[float, float]]) -> float:
+    import numpy as np
+
+    # длина по прямым между соседними точками в заданном порядке
+    if len(points) < 2:
+        return 0.0
+    lat = np.radians([p[0] for p in points])
+    lon = np.radians([p[1] for p in points])
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    return float((2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))).sum())
+
+
+def durations_minutes(distance_m: float) -> Dict[str, int]:
+    street_km = distance_m * DETOUR_FACTOR / 1000
+    return {mode: int(round(street_km / speed * 60)) for mode, speed in TRANSPORT_SPEED_KMH.items()}
+
+
+def nearest_neighbour(dist: np.ndarray, start: int = 0) -> List[int]:
+    import numpy as np
+
+    n = dist.shape[0]
+    visited = np.zeros(n, dtype=bool)
+    order = [start]
+    visited[start] = True
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, dist[order[-1]])
+        nxt = int(np.argmin(row))
+        order.append(nxt)
+        visited[nxt] = True
+    return order
+
+
+def two_opt(dist: np.ndarray, order: Sequence[int]) -> List[int]:
+    import numpy as np
+
+    # Открытый путь с фиксированным началом: разворот отрезка order[i..j], i >= 1.
+    # Для каждого i все j оцениваются одним векторным выражением.
+    route = np.asarray(order)
+    n = len(route)
+    if n < 4:
+        return route.tolist()
+    for _ in range(TWO_OPT_MAX_PASSES):
+        improved = False
+        for i in range(1, n - 1):
+            a, b = route[i - 1], route[i]
+            js = np.arange(i + 1, n)
+            c = route[js]
+            removed = dist[a, b] + np.where(js < n - 1, dist[c, route[np.minimum(js + 1, n - 1)]], 0.0)
+            added = dist[a, c] + np.where(js < n - 1, dist[b, route[np.minimum(js + 1, n - 1)]], 0.0)
+            delta = added - removed
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-6:
+                j = js[best]
+                route[i:j + 1] = route[i:j + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return route.tolist()
+
+
+def optimize_order(points: Sequence[Tuple[float, float]], keep_start: bool = True) -> List[int]:
+    n = len(points)
+    if n < 3:
+        return list(range(n))
+    dist = haversine_matrix([p[0] for p in points], [p[1] for p in points])
+    # старты берутся равномерно по входному порядку
+    starts = [0] if keep_start else range(0, n, -(-n // OPTIMIZE_MAX_RESTARTS))
+    best_order, best_len = list(range(n)), path_length(dist, range(n))
+    for start in starts:
+        order = two_opt(dist, nearest_neighbour(dist, start))
+        length = path_length(dist, order)
+        if length < best_len - 1e-6:
+            best_order, best_len = order, length
+    return best_order
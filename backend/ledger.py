@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .models import RatingEvent, RatingSnapshot, User
+from . import etags
+
+
+# Рейтинг как журнал: каждое начисление — строка в rating_events, User.rating увеличивается
+# атомарным UPDATE ... SET rating = rating + :delta (без чтения-изменения-записи в Python),
+# а приросты за неделю/месяц копятся в rating_snapshots тем же коммитом. Лидерборды и
+# история читают готовые строки снапшотов, журнал сканируется только при rebuild_snapshots.
+
+WEEK = "week"
+MONTH = "month"
+PERIODS = (WEEK, MONTH)
+
+# Начальный рейтинг баз, заведённых до журнала: в снапшоты не попадает
+BASELINE = "baseline"
+DAILY = "daily"
+LIKES = "likes"
+
+
+def period_start(period: str, day: date) -> date:
+    if period == WEEK:
+        return day - timedelta(days=day.weekday())
+    if period == MONTH:
+        return day.replace(day=1)
+    raise ValueError(f"unknown period: {period}")
+
+
+def previous_start(period: str, start: date) -> date:
+    return period_start(period, start - timedelta(days=1))
+
+
+def _add_to_snapshots(db: Session, user_id: int, delta: int, day: date):
+    rows = [{"period": p, "period_start": period_start(p, day), "user_id": user_id, "gained": delta} for p in PERIODS]
+    stmt = insert(RatingSnapshot).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[RatingSnapshot.period, RatingSnapshot.period_start, RatingSnapshot.user_id],
+        set_={"gained": RatingSnapshot.gained + stmt.excluded.gained},
+    ))
+
+
+def award(db: Session, user_id: int, delta: int, reason: str, ref: Optional[str] = None, at: Optional[datetime] = None):
+    # вызывать внутри транзакции записи, которая даёт начисление; commit — на вызывающем
+    if not delta:
+        return
+    at = at or datetime.utcnow()
+    db.add(RatingEvent(user_id=user_id, delta=delta, reason=reason, ref=ref, created_at=at))
+    db.execute(update(User).where(User.id == user_id).values(rating=User.rating + delta).execution_options(synchronize_session=False))
+    if reason != BASELINE:
+        _add_to_snapshots(db, user_id, delta, at.date())
+    etags.bump(db, etags.RATING, etags.user_key(user_id))
+
+
+def leaderboard(db: Session, period: str, start: date, limit: int) -> List[Tuple[int, str, int, int]]:
+    # [(user_id, nickname, прирост, текущий рейтинг)] — по индексу ix_rating_snapshots_leaderboard
+    rows = db.execute(
+        select(RatingSnapshot.user_id, User.nickname, RatingSnapshot.gained, User.rating)
+        .join(User, User.id == RatingSnapshot.user_id)
+        .where(RatingSnapshot.period == period, RatingSnapshot.period_start == start, RatingSnapshot.gained > 0)
+        .order_by(RatingSnapshot.gained.desc(), RatingSnapshot.user_id.desc())
+        .limit(limit)
+    ).all()
+    return [tuple(r) for r in rows]
+
+
+def history(db: Session, user_id: int, period: str, limit: int, today: Optional[date] = None) -> List[Tuple[date, int]]:
+    # последние limit периодов, включая текущий; периоды без начислений — с нулём
+    starts = [period_start(period, today or date.today())]
+    while len(starts) < limit:
+        starts.append(previous_start(period, starts[-1]))
+    gained = dict(db.execute(
+        select(RatingSnapshot.period_start, RatingSnapshot.gained).where(
+            RatingSnapshot.user_id == user_id,
+            RatingSnapshot.period == period,
+            RatingSnapshot.period_start >= starts[-1],
+        )
+    ).all())
+    return [(start, gained.get(start, 0)) for start in reversed(starts)]
+
+
+def rebuild_snapshots(db: Session, periods: Iterable[str] = PERIODS) -> int:
+    # Пересчёт снапшотов из журнала (после ручных правок или смены границ периодов).
+    # Возвращает число записанных строк; commit — на вызывающем.
+    written = 0
+    for period in periods:
+        db.execute(delete(RatingSnapshot).where(RatingSnapshot.period == period))
+        totals = {}
+        events = db.execute(
+            select(RatingEvent.user_id, func.date(RatingEvent.created_at), func.sum(RatingEvent.delta))
+            .where(RatingEvent.reason != BASELINE)
+            .group_by(RatingEvent.user_id, func.date(RatingEvent.created_at))
+        )
+        for user_id, day, delta in events:
+            key = (user_id, period_start(period, date.fromisoformat(day)))
+            totals[key] = totals.get(key, 0) + delta
+        if totals:
+            db.execute(insert(RatingSnapshot), [
+                {"period": period, "period_start": start, "user_id": user_id, "gained": gained}
+                for (user_id, start), gained in totals.items()
+            ])
+        written += len(totals)
+    return written
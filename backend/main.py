@@ -1,24 +1,36 @@
 from __future__ import annotations
 
 import json
+import math
 import random
-from datetime import date, timedelta
-from typing import List, Optional
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+from typing import Iterable, List, Optional, Set, Tuple, Union
 from pathlib import Path
 
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
+from pydantic import ValidationError
+from sqlalchemy import delete, func, literal, or_, select, union_all, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from .database import Base, engine, get_db, SessionLocal
-from .models import User, FriendRequest, RequestType, RequestStatus, DailyTask, GlobalDaily, DailyCompletion, Route, RouteLike, LikesAward, FavoriteRoute
+from .database import engine, get_db, SessionLocal
+from .models import normalize_login, User, FriendRequest, RequestType, RequestStatus, DailyTask, GlobalDaily, DailyCompletion, Route, RouteLike, LikesAward, FavoriteRoute, ResourceVersion, Friendship
 from .schemas import (
     Token,
     UserCreate,
     UserLogin,
     UserPublic,
+    UserSearchItem,
     Profile,
     SimpleOk,
     RequestCreate,
@@ -28,10 +40,26 @@ from .schemas import (
     DailyTodayResponse,
     DailyTaskPublic,
     DailyCompleteResponse,
+    DailyStatItem,
+    DailyStatsResponse,
     RoutePublic,
+    RoutePublicPolyline,
     RouteCreate,
+    RouteExportItem,
+    RouteImportItem,
+    RouteImportError,
+    RouteImportResult,
+    RouteOptimizeRequest,
+    RouteOptimizeResponse,
     RoutePoint,
     RatingItem,
+    LeaderboardItem,
+    RatingHistoryItem,
+    RouteFilters,
+    PurgeStatus,
+    ArchiveStatus,
+    DuplicateCluster,
+    BootstrapResponse,
     RecommendationRequest,
     RecommendationResponse,
     RecommendationStep,
@@ -41,13 +69,46 @@ from .schemas import (
     AvatarUpdate,
     LikeAction,
 )
-from .auth import get_password_hash, verify_password, create_access_token, get_current_user
-from .utils import find_user_by_login_or_id
-import requests
+from .auth import get_password_hash, verify_password, create_access_token, get_current_user, get_optional_user
+from .utils import find_user_by_email, find_user_by_login_or_id
+from .fragments import route_public, refresh_fragment, stitch_list, json_list_response, json_stream_response, parse_points
+from . import fragments
+from . import etags
+from . import events
+from . import ledger
+from . import dedup
+from . import dailies
+from . import geometry
+from . import ndjson
+from . import metrics
+from . import sqldebug
+from . import profiler
+from . import ratelimit
+from .recommender import recommender, LIKE_WEIGHT, FAVORITE_WEIGHT
+from .trending import trending, TOP_K as TRENDING_TOP_K
+from .purger import purger
+from .archiver import archiver
+from .usersearch import nicknames
+from . import usersearch
+from . import migrations
 
 
 app = FastAPI(title="GOdate API", openapi_url="/api/openapi.json")
 
+
+@app.exception_handler(RequestValidationError)
+async def validation_error(request: Request, exc: RequestValidationError):
+    # как стандартный 422 FastAPI, но NaN/Infinity из входа (lat/lon точек) отдаются строкой:
+    # JSON-ответ с ними не сериализуется, и вместо 422 получался 500
+    errors = [
+        dict(err, input=str(err["input"])) if isinstance(err.get("input"), float) and not math.isfinite(err["input"]) else err
+        for err in exc.errors()
+    ]
+    return JSONResponse(status_code=422, content={"detail": jsonable_encoder(errors)})
+
+# внутри CORS: ответы 429 тоже получают CORS-заголовки
+if ratelimit.ENABLED:
+    app.add_middleware(ratelimit.RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -55,49 +116,102 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(engine)
+metrics.install_threadpool_gauges()
+if sqldebug.ENABLED:
+    app.add_middleware(sqldebug.QueryDebugMiddleware)
+    sqldebug.instrument_engine(engine)
+# снаружи всех остальных: в профиль попадают и middleware
+if profiler.TOKEN or profiler.SAMPLE_RATE:
+    app.add_middleware(profiler.ProfilerMiddleware)
+
+
+# Формат фрагментов, которым уже пересчитаны все строки: при совпадении routes не сканируется
+FRAGMENTS_FORMAT_KEY = "fragments_format"
 
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    # схема — версионированными миграциями (backend/migrations.py), с актуальной базой это один PRAGMA
+    applied = migrations.upgrade(engine)
     db = SessionLocal()
     try:
-        if db.query(DailyTask).count() == 0:
-            tasks = [
-                DailyTask(
-                    code="add_friend",
-                    title="Добавить нового друга",
-                    description="Добавьте нового друга сегодня",
-                    reward_points=20,
-                ),
-                DailyTask(
-                    code="date_out",
-                    title="Сходить на свидание",
-                    description="Кино/ресторан/парк — засчитывается по кнопке",
-                    reward_points=40,
-                ),
-                DailyTask(
-                    code="create_route",
-                    title="Создать свой маршрут",
-                    description="Создайте маршрут и поделитесь с другими",
-                    reward_points=30,
-                ),
-            ]
-            db.add_all(tasks)
-            db.commit()
         # Убрано автосоздание демо-маршрутов
+        # фрагменты и метрики старых строк (или после смены формата RoutePublic)
+        done = db.get(ResourceVersion, FRAGMENTS_FORMAT_KEY)
+        if applied or done is None or done.version != fragments.VERSION:
+            while True:
+                stale = db.query(Route).filter(
+                    (Route.public_json_version.is_(None)) | (Route.public_json_version != fragments.VERSION)
+                ).limit(1000).all()
+                if not stale:
+                    break
+                for r in stale:
+                    refresh_route_derived(r)
+                db.commit()
+            db.merge(ResourceVersion(key=FRAGMENTS_FORMAT_KEY, version=fragments.VERSION))
+            db.commit()
+        events.bus.mark(db)
+        trending.load(db, backfill=bool(applied))
     finally:
         db.close()
 
 
+# Несколько воркеров (backend/events.py): индексы в памяти догоняют чужие записи по журналу
+def _trending_changed(db: Session, payloads: List[dict]):
+    trending.refresh(db, {p["route_id"] for p in payloads})
+
+
+def _nicknames_added(db: Session, payloads: List[dict]):
+    for p in payloads:
+        nicknames.add(p["user_id"], p["nickname"])
+
+
+def _recommender_recorded(db: Session, payloads: List[dict]):
+    for p in payloads:
+        recommender.record(p["user_id"], p["route_id"], p["weight"])
+
+
+def _reload_indexes(db: Session):
+    trending.load(db, backfill=False)
+    if nicknames.loaded:
+        nicknames.load(db)
+    recommender.invalidate()
+
+
+events.bus.subscribe("trending", _trending_changed)
+events.bus.subscribe("trending.clear", lambda db, payloads: trending.clear())
+events.bus.subscribe("nicknames", _nicknames_added)
+events.bus.subscribe("recommender", _recommender_recorded)
+events.bus.subscribe("purger.wake", lambda db, payloads: purger.wake())
+events.bus.on_resync(_reload_indexes)
+
+
+def _start_background():
+    purger.start(SessionLocal)
+    archiver.start(SessionLocal)
+
+
 @app.on_event("startup")
 def on_startup():
     init_db()
+    recommender.start(SessionLocal)
+    if events.bus.enabled:
+        # purger и archiver — только в воркере с арендой
+        events.bus.lead("background", _start_background)
+        events.bus.start(SessionLocal)
+    else:
+        _start_background()
 
 
 # Auth endpoints
 @app.post("/api/auth/register", response_model=UserPublic)
 def register(payload: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter((User.email == payload.email) | (User.nickname == payload.nickname)).first():
+    # без учёта регистра: «Bob» и «bob» — один ник; уникальные индексы *_lower ловят и гонку
+    taken = db.scalar(select(User.id).where(
+        (User.email_lower == normalize_login(payload.email)) | (User.nickname_lower == normalize_login(payload.nickname))
+    ).limit(1))
+    if taken is not None:
         raise HTTPException(status_code=400, detail="Email или ник уже заняты")
     user = User(
         email=payload.email,
@@ -105,14 +219,22 @@ def register(payload: UserCreate, db: Session = Depends(get_db)):
         password_hash=get_password_hash(payload.password),
     )
     db.add(user)
-    db.commit()
+    etags.bump(db, etags.RATING)
+    try:
+        db.flush()
+        events.bus.publish(db, "nicknames", user_id=user.id, nickname=user.nickname)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Email или ник уже заняты")
     db.refresh(user)
+    nicknames.add(user.id, user.nickname)
     return user
 
 
 @app.post("/api/auth/login", response_model=Token)
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.email == form_data.username).first()
+    user = find_user_by_email(db, form_data.username)
     if not user or not verify_password(form_data.password, user.password_hash):
         raise HTTPException(status_code=400, detail="Неверные учетные данные")
     token = create_access_token({"sub": str(user.id)})
@@ -120,18 +242,44 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 
 # Users & profile
+def _friend_ids(db: Session, user_id: int) -> set:
+    # пара хранится как (меньший id, больший id): два поиска по индексам friendships
+    higher = select(Friendship.user_high_id).where(Friendship.user_low_id == user_id)
+    lower = select(Friendship.user_low_id).where(Friendship.user_high_id == user_id)
+    return set(db.scalars(higher.union_all(lower)).all())
+
+
+def _friendship_key(a: int, b: int):
+    return (Friendship.user_low_id == min(a, b)) & (Friendship.user_high_id == max(a, b))
+
+
 @app.get("/api/users/me", response_model=Profile)
-def get_me(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_me(request: Request, response: Response, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # профиль включает публичные данные половинки и друзей — их версии тоже в ETag
+    friend_ids = _friend_ids(db, current.id)
+    related = {current.id, *friend_ids} | ({current.soulmate_id} if current.soulmate_id else set())
+    etag, not_modified = etags.check(request, db, [etags.user_key(uid) for uid in related])
+    if not_modified:
+        return not_modified
+    etags.tag(response, etag)
+    return _profile(db, current, friend_ids)
+
+
+@app.get("/api/users/search", response_model=List[UserSearchItem])
+def search_users(
+    prefix: str = Query(..., min_length=1, max_length=50),
+    limit: int = Query(10, ge=1, le=usersearch.MAX_LIMIT),
+    current: User = Depends(get_current_user),
+):
+    # автодополнение ника в «добавить друга»; индекс в памяти, база не трогается
+    nicknames.ensure_loaded(SessionLocal)
+    return [UserSearchItem(id=user_id, nickname=nickname) for user_id, nickname in nicknames.search(prefix, limit, exclude=current.id)]
+
+
+def _profile(db: Session, current: User, friend_ids: Optional[set] = None) -> Profile:
     soulmate = db.get(User, current.soulmate_id) if current.soulmate_id else None
-    # Friends are accepted friend requests involving current user
-    friend_ids = set()
-    accepted = db.query(FriendRequest).filter(
-        FriendRequest.status == RequestStatus.accepted,
-        ((FriendRequest.from_user_id == current.id) | (FriendRequest.to_user_id == current.id)),
-        FriendRequest.type == RequestType.friend,
-    ).all()
-    for fr in accepted:
-        friend_ids.add(fr.from_user_id if fr.from_user_id != current.id else fr.to_user_id)
+    if friend_ids is None:
+        friend_ids = _friend_ids(db, current.id)
     friends = db.query(User).filter(User.id.in_(friend_ids)).all() if friend_ids else []
     return Profile(
         id=current.id,
@@ -164,6 +312,7 @@ def update_avatar(file: UploadFile = File(...), current: User = Depends(get_curr
     public_url = f"/uploads/{filename}"
     current.avatar_url = public_url
     db.add(current)
+    etags.bump(db, etags.user_key(current.id))
     db.commit()
     return SimpleOk()
 
@@ -179,6 +328,8 @@ def send_request(payload: RequestCreate, current: User = Depends(get_current_use
         # must be unique: neither has a soulmate yet
         if current.soulmate_id or target.soulmate_id:
             raise HTTPException(status_code=400, detail="У одного из пользователей уже есть половинка")
+    elif db.scalar(select(Friendship.user_low_id).where(_friendship_key(current.id, target.id))) is not None:
+        raise HTTPException(status_code=400, detail="Вы уже друзья")
     req = FriendRequest(from_user_id=current.id, to_user_id=target.id, type=payload.type)
     db.add(req)
     try:
@@ -202,6 +353,7 @@ def remove_soulmate(current: User = Depends(get_current_user), db: Session = Dep
         soulmate.soulmate_id = None
         db.add(current)
         db.add(soulmate)
+        etags.bump(db, etags.user_key(current.id), etags.user_key(soulmate.id))
         db.commit()
     
     return SimpleOk()
@@ -213,19 +365,23 @@ def remove_friend(payload: dict, current: User = Depends(get_current_user), db:
     if not friend_id:
         raise HTTPException(status_code=400, detail="ID друга не указан")
     
-    # Находим запрос дружбы между пользователями
-    friend_request = db.query(FriendRequest).filter(
+    try:
+        friend_id = int(friend_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="ID друга не указан")
+
+    removed = db.execute(delete(Friendship).where(_friendship_key(current.id, friend_id))).rowcount
+    if not removed:
+        raise HTTPException(status_code=404, detail="Дружба не найдена")
+
+    # Принятая заявка (если ещё не в архиве) тоже удаляется — иначе новую не отправить
+    db.execute(delete(FriendRequest).where(
         FriendRequest.status == RequestStatus.accepted,
         FriendRequest.type == RequestType.friend,
         ((FriendRequest.from_user_id == current.id) & (FriendRequest.to_user_id == friend_id)) |
         ((FriendRequest.from_user_id == friend_id) & (FriendRequest.to_user_id == current.id))
-    ).first()
-    
-    if not friend_request:
-        raise HTTPException(status_code=404, detail="Дружба не найдена")
-    
-    # Удаляем запрос дружбы
-    db.delete(friend_request)
+    ))
+    etags.bump(db, etags.user_key(current.id), etags.user_key(friend_id))
     db.commit()
     
     return SimpleOk()
@@ -235,12 +391,17 @@ def remove_friend(payload: dict, current: User = Depends(get_current_user), db:
 def get_messages(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
     incoming = db.query(FriendRequest).filter(FriendRequest.to_user_id == current.id, FriendRequest.status == RequestStatus.pending).all()
     outgoing = db.query(FriendRequest).filter(FriendRequest.from_user_id == current.id, FriendRequest.status == RequestStatus.pending).all()
+    # собеседники одним запросом, а не db.get на каждую заявку
+    other_ids = {fr.from_user_id for fr in incoming} | {fr.to_user_id for fr in outgoing}
+    users = {current.id: current}
+    if other_ids - users.keys():
+        users.update((u.id, u) for u in db.query(User).filter(User.id.in_(other_ids - users.keys())))
 
     def to_item(fr: FriendRequest) -> RequestItem:
         return RequestItem(
             id=fr.id,
-            from_user=db.get(User, fr.from_user_id),
-            to_user=db.get(User, fr.to_user_id),
+            from_user=users[fr.from_user_id],
+            to_user=users[fr.to_user_id],
             type=fr.type,
             status=fr.status,
             created_at=fr.created_at,
@@ -259,6 +420,7 @@ def act_on_request(payload: RequestAct, current: User = Depends(get_current_user
         raise HTTPException(status_code=404, detail="Заявка не найдена")
     if payload.action not in {"accept", "decline"}:
         raise HTTPException(status_code=400, detail="Некорректное действие")
+    fr.resolved_at = datetime.utcnow()
     if payload.action == "decline":
         fr.status = RequestStatus.declined
         db.commit()
@@ -276,11 +438,22 @@ def act_on_request(payload: RequestAct, current: User = Depends(get_current_user
         b.soulmate_id = a.id
         db.add(a)
         db.add(b)
+    else:
+        db.execute(sqlite_insert(Friendship).values(
+            user_low_id=min(fr.from_user_id, fr.to_user_id), user_high_id=max(fr.from_user_id, fr.to_user_id),
+        ).on_conflict_do_nothing())
     db.add(fr)
+    etags.bump(db, etags.user_key(fr.from_user_id), etags.user_key(fr.to_user_id))
     db.commit()
     return SimpleOk()
 
 
+@app.get("/api/messages/archive", response_model=ArchiveStatus)
+def archive_status(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    _ensure_admin(current)
+    return ArchiveStatus(**archiver.status(db))
+
+
 # Dailies
 def ensure_global_daily(db: Session) -> GlobalDaily:
     today = date.today()
@@ -299,15 +472,34 @@ def ensure_global_daily(db: Session) -> GlobalDaily:
 @app.get("/api/dailies/today", response_model=DailyTodayResponse)
 def get_daily_today(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
     gd = ensure_global_daily(db)
-    completed = db.query(DailyCompletion).filter(
-        DailyCompletion.user_id == current.id, DailyCompletion.date == gd.date, DailyCompletion.task_id == gd.task_id
-    ).first() is not None
+    # выполнение и серия — из уже загруженного пользователя, счётчик дня — строка daily_stats
     return DailyTodayResponse(
         date=gd.date,
         task=DailyTaskPublic(
             code=gd.task.code, title=gd.task.title, description=gd.task.description, reward_points=gd.task.reward_points
         ),
-        completed=completed,
+        completed=dailies.completed(current, gd.date),
+        completions=dailies.completions(db, gd.date),
+        streak=dailies.streak(current, gd.date),
+        best_streak=current.daily_best_streak or 0,
+    )
+
+
+@app.get("/api/dailies/stats", response_model=DailyStatsResponse)
+def get_daily_stats(
+    days: int = Query(7, ge=1, le=dailies.MAX_HISTORY_DAYS),
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    today = date.today()
+    history = dailies.history(db, today, days)
+    return DailyStatsResponse(
+        date=today,
+        completions=history[0][1],
+        streak=dailies.streak(current, today),
+        best_streak=current.daily_best_streak or 0,
+        last_completed=current.daily_last_date,
+        history=[DailyStatItem(date=day, completions=count) for day, count in history],
     )
 
 
@@ -321,66 +513,174 @@ def complete_daily(current: User = Depends(get_current_user), db: Session = Depe
         raise HTTPException(status_code=400, detail="Дейлик уже выполнен сегодня")
     comp = DailyCompletion(user_id=current.id, date=gd.date, task_id=gd.task_id)
     db.add(comp)
-    current.rating += gd.task.reward_points
-    db.add(current)
+    ledger.award(db, current.id, gd.task.reward_points, ledger.DAILY, ref=gd.date.isoformat())
+    dailies.record_completion(db, current.id, gd.date)
     db.commit()
     db.refresh(current)
-    return DailyCompleteResponse(awarded_points=gd.task.reward_points, new_rating=current.rating)
+    return DailyCompleteResponse(awarded_points=gd.task.reward_points, new_rating=current.rating, streak=current.daily_streak or 0)
 
 
 # Routes listing (no creation per request)
-@app.get("/api/routes", response_model=List[RoutePublic])
-def list_routes(city: Optional[str] = None, db: Session = Depends(get_db)):
-    q = db.query(Route)
-    if city:
-        q = q.filter(Route.city == city)
-    routes = q.order_by(Route.created_at.desc()).all()
-    # добавить количество лайков
-    result: List[RoutePublic] = []
-    for r in routes:
-        likes = db.query(RouteLike).filter(RouteLike.route_id == r.id).count()
-        points = []
-        try:
-            raw = json.loads(r.points_json) if r.points_json else []
-            for p in raw:
-                if 'lat' in p and 'lon' in p and 'name' in p:
-                    points.append({'name': p.get('name'), 'description': p.get('description'), 'lat': float(p.get('lat')), 'lon': float(p.get('lon'))})
-        except Exception:
-            points = []
-        result.append(RoutePublic(**{
-            "id": r.id,
-            "title": r.title,
-            "description": r.description,
-            "city": r.city,
-            "time_minutes": r.time_minutes,
-            "budget": r.budget,
-            "likes": likes,
-            "points": points,
-        }))
-    return result
+def _likes_count():
+    return select(func.count(RouteLike.id)).where(RouteLike.route_id == Route.id).correlate(Route).scalar_subquery()
+
+
+def _live_routes(db: Session):
+    # помеченные на удаление маршруты (ждут purger) не видны ни одному пути чтения
+    return db.query(Route).filter(Route.deleted_at.is_(None))
+
+
+# Длинные списки отдаются потоком: из базы только (id, public_json, likes) пачками по
+# STREAM_YIELD_PER строк, тело собирается кусками (fragments.json_stream_response) —
+# память не растёт с размером выборки
+STREAM_YIELD_PER = 500
+
+
+def _viewer_flags(db: Session, viewer_id: int, route_ids: List[int]) -> Tuple[Set[int], Set[int]]:
+    # какие из route_ids зритель лайкнул и добавил в избранное — один запрос на страницу,
+    # оба поиска по уникальным индексам (route_id, user_id) / (user_id, route_id)
+    liked = select(RouteLike.route_id, literal(0)).where(RouteLike.user_id == viewer_id, RouteLike.route_id.in_(route_ids))
+    favorited = select(FavoriteRoute.route_id, literal(1)).where(FavoriteRoute.user_id == viewer_id, FavoriteRoute.route_id.in_(route_ids))
+    found: Tuple[Set[int], Set[int]] = (set(), set())
+    for route_id, kind in db.execute(union_all(liked, favorited)):
+        found[kind].add(route_id)
+    return found
+
+
+def _fragment_rows(db: Session, rows, viewer_id: Optional[int] = None, column=Route.public_json):
+    # (фрагмент, likes, liked_by_me, favorited_by_me) пачками по STREAM_YIELD_PER строк
+    rows = iter(rows)
+    refreshed = False
+    while batch := list(islice(rows, STREAM_YIELD_PER)):
+        liked, favorited = _viewer_flags(db, viewer_id, [row[0] for row in batch]) if viewer_id else (set(), set())
+        for route_id, fragment, likes in batch:
+            if fragment is None:
+                r = db.get(Route, route_id)
+                refresh_route_derived(r)
+                fragment = getattr(r, column.key)
+                refreshed = True
+            yield fragment, likes, route_id in liked, route_id in favorited
+    if refreshed:
+        # сохраняем перерисованные фрагменты, чтобы не рендерить их на каждом чтении;
+        # коммит — когда выборка дочитана (yield_per держит курсор открытым до конца)
+        db.commit()
+
+
+def _route_fragments(
+    db: Session, q, order: Optional[List[int]] = None, viewer_id: Optional[int] = None, points: str = fragments.POINTS_FULL
+) -> List[tuple]:
+    # (фрагмент, likes) на каждую строку: один запрос вместо count() на маршрут
+    column = fragments.fragment_column(points)
+    rows = q.with_entities(Route.id, column, _likes_count()).all()
+    if order is not None:
+        rank = {route_id: i for i, route_id in enumerate(order)}
+        rows.sort(key=lambda row: rank.get(row[0], len(rank)))
+    return list(_fragment_rows(db, rows, viewer_id, column))
+
+
+def _stream_route_fragments(q, viewer_id: Optional[int] = None, points: str = fragments.POINTS_FULL):
+    # Своя сессия, как у _export_lines: get_db закрывается раньше, чем отдаётся стрим
+    column = fragments.fragment_column(points)
+    db = SessionLocal()
+    try:
+        rows = q.with_session(db).with_entities(Route.id, column, _likes_count()).yield_per(STREAM_YIELD_PER)
+        yield from fragments.iter_stitched(_fragment_rows(db, rows, viewer_id, column))
+    finally:
+        db.close()
+
+
+# ?points=polyline во всех списках маршрутов: координаты одной строкой (RoutePublicPolyline)
+RouteListItem = Union[RoutePublic, RoutePublicPolyline]
+
+
+def _points_format(points: str = Query(fragments.POINTS_FULL, description="full | polyline")) -> str:
+    if points not in fragments.POINT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Неизвестный формат точек: {points}")
+    return points
+
+
+# При равенстве — по id в том же направлении: индекс (колонка) / (city, колонка) хранит
+# rowid последним ключом, и ORDER BY целиком читается из индекса без сортировки в памяти
+ROUTE_SORTS = {
+    "new": (Route.created_at.desc(), Route.id.desc()),
+    "old": (Route.created_at.asc(), Route.id.asc()),
+    "budget": (Route.budget.asc(), Route.id.asc()),
+    "-budget": (Route.budget.desc(), Route.id.desc()),
+    "time": (Route.time_minutes.asc(), Route.id.asc()),
+    "-time": (Route.time_minutes.desc(), Route.id.desc()),
+    "distance": (Route.distance_m.asc(), Route.id.asc()),
+    "-distance": (Route.distance_m.desc(), Route.id.desc()),
+    "points": (Route.points_count.asc(), Route.id.asc()),
+    "-points": (Route.points_count.desc(), Route.id.desc()),
+}
+ROUTE_RANGES = (
+    (Route.budget, "min_budget", "max_budget"),
+    (Route.time_minutes, "min_time", "max_time"),
+    (Route.points_count, "min_points", "max_points"),
+    (Route.distance_m, "min_distance", "max_distance"),
+)
+
+
+def _filter_routes(q, f: RouteFilters):
+    if f.sort not in ROUTE_SORTS:
+        raise HTTPException(status_code=400, detail=f"Неизвестная сортировка: {f.sort}")
+    _points_format(f.points)
+    if f.city:
+        q = q.filter(Route.city == f.city)
+    for column, low, high in ROUTE_RANGES:
+        if getattr(f, low) is not None:
+            q = q.filter(column >= getattr(f, low))
+        if getattr(f, high) is not None:
+            q = q.filter(column <= getattr(f, high))
+    q = q.order_by(*ROUTE_SORTS[f.sort])
+    if f.offset:
+        q = q.offset(f.offset)
+    if f.limit is not None:
+        q = q.limit(f.limit)
+    return q
+
+
+@app.get("/api/routes", response_model=List[RouteListItem])
+def list_routes(
+    request: Request,
+    filters: RouteFilters = Depends(),
+    viewer: Optional[User] = Depends(get_optional_user),
+    db: Session = Depends(get_db),
+):
+    # с токеном — ещё и флаги liked_by_me/favorited_by_me: лайк меняет ROUTES, избранное — favorites:<id>
+    viewer_id = viewer.id if viewer else None
+    keys = [etags.ROUTES, etags.favorites_key(viewer_id)] if viewer_id else [etags.ROUTES]
+    etag, not_modified = etags.check(request, db, keys, vary=f"{filters.model_dump_json()}|{viewer_id}")
+    if not_modified:
+        return not_modified
+    chunks = _stream_route_fragments(_filter_routes(_live_routes(db), filters), viewer_id, filters.points)
+    return etags.tag(json_stream_response(request, chunks), etag)
 
 
 def _award_rating_for_likes(db: Session, route_owner: User):
     # каждый полный блок из 10 лайков => +1 рейтинг, считаем совокупно по всем маршрутам пользователя
     total_likes = db.query(RouteLike).join(Route, Route.id == RouteLike.route_id).filter(Route.creator_user_id == route_owner.id).count()
-    la = db.get(LikesAward, route_owner.id)
-    if not la:
-        la = LikesAward(user_id=route_owner.id, awarded_count=0)
-        db.add(la)
-        db.commit()
-        db.refresh(la)
+    db.execute(sqlite_insert(LikesAward).values(user_id=route_owner.id, awarded_count=0).on_conflict_do_nothing())
+    awarded = db.scalar(select(LikesAward.awarded_count).where(LikesAward.user_id == route_owner.id))
     eligible = total_likes // 10
-    if eligible > la.awarded_count:
-        delta = eligible - la.awarded_count
-        route_owner.rating += delta
-        la.awarded_count = eligible
-        db.add(route_owner)
-        db.add(la)
+    if eligible <= awarded:
         db.commit()
+        return
+    # compare-and-set: параллельный лайк, успевший начислить тот же блок, обнулит rowcount
+    claimed = db.execute(
+        update(LikesAward)
+        .where(LikesAward.user_id == route_owner.id, LikesAward.awarded_count == awarded)
+        .values(awarded_count=eligible)
+    ).rowcount
+    if claimed:
+        ledger.award(db, route_owner.id, eligible - awarded, ledger.LIKES, ref=str(eligible * 10))
+    db.commit()
+
+
 @app.post("/api/routes/like", response_model=SimpleOk)
 def like_route(payload: LikeAction, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
     route = db.get(Route, payload.route_id)
-    if not route:
+    if not route or route.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Маршрут не найден")    
     # запретить лайкать свой маршрут — опционально
     if route.creator_user_id and route.creator_user_id == current.id:
@@ -390,7 +690,13 @@ def like_route(payload: LikeAction, current: User = Depends(get_current_user), d
         raise HTTPException(status_code=400, detail="Уже лайкнуто")
     like = RouteLike(route_id=route.id, user_id=current.id)
     db.add(like)
+    t0, hot = trending.record_like(db, route)
+    etags.bump(db, etags.ROUTES)
+    events.bus.publish(db, "trending", route_id=route.id)
+    events.bus.publish(db, "recommender", user_id=current.id, route_id=route.id, weight=LIKE_WEIGHT)
     db.commit()
+    trending.add(route.id, route.city, t0, hot)
+    recommender.record(current.id, route.id, LIKE_WEIGHT)
     # награда автору
     if route.creator_user_id:
         owner = db.get(User, route.creator_user_id)
@@ -403,7 +709,7 @@ def like_route(payload: LikeAction, current: User = Depends(get_current_user), d
 @app.post("/api/routes/favorite", response_model=SimpleOk)
 def add_to_favorites(payload: LikeAction, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
     route = db.get(Route, payload.route_id)
-    if not route:
+    if not route or route.deleted_at is not None:
         raise HTTPException(status_code=404, detail="Маршрут не найден")    
     
     existing = db.query(FavoriteRoute).filter(FavoriteRoute.route_id == route.id, FavoriteRoute.user_id == current.id).first()
@@ -413,37 +719,29 @@ def add_to_favorites(payload: LikeAction, current: User = Depends(get_current_us
     
     favorite = FavoriteRoute(route_id=route.id, user_id=current.id)
     db.add(favorite)
+    etags.bump(db, etags.favorites_key(current.id))
+    events.bus.publish(db, "recommender", user_id=current.id, route_id=route.id, weight=FAVORITE_WEIGHT)
     db.commit()
+    recommender.record(current.id, route.id, FAVORITE_WEIGHT)
     return SimpleOk()
 
 
-@app.get("/api/routes/favorites", response_model=List[RoutePublic])
-def get_favorites(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    favorites = db.query(FavoriteRoute).filter(FavoriteRoute.user_id == current.id).all()
-    result: List[RoutePublic] = []
-    for fav in favorites:
-        route = db.get(Route, fav.route_id)
-        if route:
-            likes = db.query(RouteLike).filter(RouteLike.route_id == route.id).count()
-            points = []
-            try:
-                raw = json.loads(route.points_json) if route.points_json else []
-                for p in raw:
-                    if 'lat' in p and 'lon' in p and 'name' in p:
-                        points.append({'name': p.get('name'), 'description': p.get('description'), 'lat': float(p.get('lat')), 'lon': float(p.get('lon'))})
-            except Exception:
-                points = []
-            result.append(RoutePublic(**{
-                "id": route.id,
-                "title": route.title,
-                "description": route.description,
-                "city": route.city,
-                "time_minutes": route.time_minutes,
-                "budget": route.budget,
-                "likes": likes,
-                "points": points,
-            }))
-    return result
+def _favorites_query(db: Session, current: User):
+    return _live_routes(db).join(FavoriteRoute, FavoriteRoute.route_id == Route.id).filter(FavoriteRoute.user_id == current.id).order_by(FavoriteRoute.id)
+
+
+@app.get("/api/routes/favorites", response_model=List[RouteListItem])
+def get_favorites(
+    request: Request,
+    points: str = Depends(_points_format),
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    etag, not_modified = etags.check(request, db, [etags.favorites_key(current.id), etags.ROUTES], vary=points)
+    if not_modified:
+        return not_modified
+    rows = _route_fragments(db, _favorites_query(db, current), viewer_id=current.id, points=points)
+    return etags.tag(json_list_response(request, stitch_list(rows)), etag)
 
 
 @app.delete("/api/routes/favorite/{route_id}", response_model=SimpleOk)
@@ -453,15 +751,70 @@ def remove_favorite(route_id: int, current: User = Depends(get_current_user), db
         # Идемпотентность
         return SimpleOk()
     db.delete(fav)
+    etags.bump(db, etags.favorites_key(current.id))
+    events.bus.publish(db, "recommender", user_id=current.id, route_id=route_id, weight=-FAVORITE_WEIGHT)
     db.commit()
+    recommender.record(current.id, route_id, -FAVORITE_WEIGHT)
     return SimpleOk()
 
 
 # Create route
+def refresh_route_derived(r: Route):
+    # Производные поля считаются при каждой записи маршрута (после flush, когда известен id)
+    points = parse_points(r.points_json)
+    r.distance_m = int(round(geometry.path_length_m([(p["lat"], p["lon"]) for p in points])))
+    r.points_count = len(points)
+    refresh_fragment(r)
+
+
+def _optimized_points(points: List[RoutePoint]) -> List[RoutePoint]:
+    # ?optimize=true на создании/правке — тот же предел, что у /api/routes/optimize
+    if len(points) > geometry.OPTIMIZE_MAX_POINTS:
+        raise HTTPException(status_code=422, detail=f"Оптимизация порядка доступна для маршрутов до {geometry.OPTIMIZE_MAX_POINTS} точек")
+    order = geometry.optimize_order([(p.lat, p.lon) for p in points])
+    return [points[i] for i in order]
+
+
+def _points_json(points: List[RoutePoint]) -> str:
+    return json.dumps([{
+        "name": p.name,
+        "description": p.description,
+        "lat": p.lat,
+        "lon": p.lon,
+    } for p in points])
+
+
+def _ensure_admin(current: User):
+    # Простейшая защита: разрешим только пользователю с id=1 (можно заменить на роль)
+    if current.id != 1:
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+
+
+@app.post("/api/routes/optimize", response_model=RouteOptimizeResponse)
+def optimize_route(payload: RouteOptimizeRequest, current: User = Depends(get_current_user)):
+    coords = [(p.lat, p.lon) for p in payload.points]
+    order = geometry.optimize_order(coords, keep_start=payload.keep_start)
+    distance = geometry.path_length_m([coords[i] for i in order])
+    return RouteOptimizeResponse(
+        order=order,
+        points=[payload.points[i] for i in order],
+        distance_m=int(round(distance)),
+        original_distance_m=int(round(geometry.path_length_m(coords))),
+        duration_minutes=geometry.durations_minutes(distance),
+    )
+
+
 @app.post("/api/routes", response_model=SimpleOk)
-def create_route(payload: RouteCreate, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_route(payload: RouteCreate, optimize: bool = False, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if not payload.title or not payload.city:
         raise HTTPException(status_code=400, detail="Некорректные данные маршрута")
+    points = _optimized_points(payload.points) if optimize else payload.points
+    if dedup.THRESHOLD:
+        # почти-дубликат живого маршрута (backend/dedup.py) — поиск по LSH-полосам, не по каталогу
+        duplicates = dedup.find(db, payload.city, payload.title, [(p.lat, p.lon) for p in points])
+        if duplicates:
+            duplicate_id, score = duplicates[0]
+            raise HTTPException(status_code=409, detail=f"Похожий маршрут уже есть (#{duplicate_id}, сходство {score:.0%})")
     r = Route(
         creator_user_id=current.id,
         title=payload.title,
@@ -469,149 +822,392 @@ def create_route(payload: RouteCreate, current: User = Depends(get_current_user)
         city=payload.city,
         time_minutes=payload.time_minutes,
         budget=payload.budget,
-        points_json=json.dumps([{
-            "name": p.name,
-            "description": p.description,
-            "lat": p.lat,
-            "lon": p.lon,
-        } for p in payload.points])
+        points_json=_points_json(points),
     )
     db.add(r)
+    db.flush()
+    refresh_route_derived(r)
+    dedup.index(db, r)
+    etags.bump(db, etags.ROUTES)
     db.commit()
     return SimpleOk()
 
 
 @app.delete("/api/routes/all", response_model=SimpleOk)
 def delete_all_routes(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # ADMIN: очистка всех маршрутов и связанных записей (лайки/избранное)
-    # Простейшая защита: разрешим только пользователю с id=1 (можно заменить на роль)
-    if current.id != 1:
-        raise HTTPException(status_code=403, detail="Недостаточно прав")
-    db.query(RouteLike).delete()
-    db.query(FavoriteRoute).delete()
-    db.query(Route).delete()
+    # ADMIN: очистка всех маршрутов; лайки/избранное и сами строки удаляет purger пакетами,
+    # ход — GET /api/routes/purge
+    _ensure_admin(current)
+    db.query(Route).filter(Route.deleted_at.is_(None)).update({Route.deleted_at: datetime.utcnow()}, synchronize_session=False)
+    etags.bump(db, etags.ROUTES)
+    events.bus.publish(db, "trending.clear")
+    events.bus.publish(db, "purger.wake")
     db.commit()
+    trending.clear()
+    purger.wake()
     return SimpleOk()
 
 
-# My routes
-@app.get("/api/routes/mine", response_model=List[RoutePublic])
-def my_routes(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user_routes = db.query(Route).filter(Route.creator_user_id == current.id).order_by(Route.created_at.desc()).all()
-    result: List[RoutePublic] = []
-    for r in user_routes:
-        likes = db.query(RouteLike).filter(RouteLike.route_id == r.id).count()
-        points = []
-        try:
-            raw = json.loads(r.points_json) if r.points_json else []
-            for p in raw:
-                if 'lat' in p and 'lon' in p and 'name' in p:
-                    points.append({
-                        'name': p.get('name'),
-                        'description': p.get('description'),
-                        'lat': float(p.get('lat')),
-                        'lon': float(p.get('lon')),
-                    })
-        except Exception:
-            points = []
-        result.append(RoutePublic(**{
-            "id": r.id,
-            "title": r.title,
-            "description": r.description,
-            "city": r.city,
-            "time_minutes": r.time_minutes,
-            "budget": r.budget,
-            "likes": likes,
-            "points": points,
-        }))
+@app.get("/api/routes/purge", response_model=PurgeStatus)
+def purge_status(current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    _ensure_admin(current)
+    return PurgeStatus(**purger.status(db))
+
+
+@app.get("/api/routes/duplicates", response_model=List[DuplicateCluster])
+def route_duplicates(
+    min_similarity: float = Query(dedup.THRESHOLD or 0.6, gt=0, le=1),
+    limit: int = Query(100, ge=1, le=1000),
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    # ADMIN: кластеры почти-дубликатов по всему каталогу, самые большие первыми
+    _ensure_admin(current)
+    return [DuplicateCluster(**cluster) for cluster in dedup.clusters(db, min_similarity, limit)]
+
+
+# Bulk export/import (NDJSON)
+EXPORT_YIELD_PER = 500
+IMPORT_MAX_ERRORS = 1000
+
+
+def _export_lines():
+    # Своя сессия: зависимость get_db закрывается раньше, чем отдаётся стрим
+    db = SessionLocal()
+    try:
+        stmt = select(Route).where(Route.deleted_at.is_(None)).order_by(Route.id).execution_options(stream_results=True, yield_per=EXPORT_YIELD_PER)
+        for r in db.scalars(stmt):
+            yield ndjson.dump_line(RouteExportItem(
+                id=r.id,
+                creator_user_id=r.creator_user_id,
+                created_at=r.created_at,
+                title=r.title,
+                description=r.description,
+                city=r.city,
+                time_minutes=r.time_minutes,
+                budget=r.budget,
+                points=parse_points(r.points_json),
+            ))
+            # не держим в identity map уже отданные маршруты
+            db.expunge(r)
+    finally:
+        db.close()
+
+
+@app.get("/api/routes/export")
+def export_routes(current: User = Depends(get_current_user)):
+    _ensure_admin(current)
+    return StreamingResponse(_export_lines(), media_type=ndjson.MEDIA_TYPE)
+
+
+def _import_batch(batch: List[tuple], result: RouteImportResult):
+    db = SessionLocal()
+    try:
+        routes = []
+        for _, item in batch:
+            r = Route(
+                creator_user_id=item.creator_user_id,
+                title=item.title,
+                description=item.description,
+                city=item.city,
+                time_minutes=item.time_minutes,
+                budget=item.budget,
+                points_json=_points_json(item.points),
+            )
+            if item.created_at:
+                r.created_at = item.created_at
+            routes.append(r)
+        db.add_all(routes)
+        db.flush()
+        for r in routes:
+            refresh_route_derived(r)
+            dedup.index(db, r)
+        etags.bump(db, etags.ROUTES)
+        db.commit()
+        result.imported += len(routes)
+    except Exception as e:
+        db.rollback()
+        for line_no, _ in batch:
+            _import_error(result, line_no, f"Ошибка записи пакета: {e}")
+    finally:
+        db.close()
+
+
+def _import_error(result: RouteImportResult, line_no: int, error: str):
+    result.failed += 1
+    if len(result.errors) < IMPORT_MAX_ERRORS:
+        result.errors.append(RouteImportError(line=line_no, error=error))
+
+
+@app.post("/api/routes/import", response_model=RouteImportResult)
+async def import_routes(
+    request: Request,
+    batch_size: int = Query(1000, ge=1, le=10000),
+    current: User = Depends(get_current_user),
+):
+    _ensure_admin(current)
+    result = RouteImportResult()
+    batch: List[tuple] = []
+    try:
+        async for line_no, line in ndjson.iter_lines(request.stream()):
+            try:
+                item = RouteImportItem.model_validate_json(line)
+            except ValidationError as e:
+                _import_error(result, line_no, "; ".join(
+                    f"{'.'.join(map(str, err['loc'])) or 'line'}: {err['msg']}" for err in e.errors()
+                ))
+                continue
+            if not item.title or not item.city:
+                _import_error(result, line_no, "Некорректные данные маршрута")
+                continue
+            batch.append((line_no, item))
+            if len(batch) >= batch_size:
+                await run_in_threadpool(_import_batch, batch, result)
+                batch = []
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if batch:
+        await run_in_threadpool(_import_batch, batch, result)
     return result
 
 
+# Trending routes
+@app.get("/api/routes/trending", response_model=List[RouteListItem])
+def trending_routes(
+    request: Request,
+    city: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=TRENDING_TOP_K),
+    points: str = Depends(_points_format),
+    viewer: Optional[User] = Depends(get_optional_user),
+    db: Session = Depends(get_db),
+):
+    # порядок — из кучи в памяти (backend/trending.py), из базы только фрагменты по id
+    route_ids = [route_id for route_id, _ in trending.top(city or None, limit)]
+    if not route_ids:
+        return json_list_response(request, b"[]")
+    rows = _route_fragments(db, _live_routes(db).filter(Route.id.in_(route_ids)), order=route_ids, viewer_id=viewer.id if viewer else None, points=points)
+    return json_list_response(request, stitch_list(rows))
+
+
+# My routes
+def _my_routes_query(db: Session, current: User):
+    return _live_routes(db).filter(Route.creator_user_id == current.id).order_by(Route.created_at.desc(), Route.id.desc())
+
+
+@app.get("/api/routes/mine", response_model=List[RouteListItem])
+def my_routes(
+    request: Request,
+    points: str = Depends(_points_format),
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    return json_stream_response(request, _stream_route_fragments(_my_routes_query(db, current), current.id, points))
+
+
 @app.get("/api/routes/{route_id}", response_model=RoutePublic)
 def get_route(route_id: int, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
     r = db.get(Route, route_id)
-    if not r or r.creator_user_id != current.id:
+    if not r or r.deleted_at is not None or r.creator_user_id != current.id:
         raise HTTPException(status_code=404, detail="Маршрут не найден")
     likes = db.query(RouteLike).filter(RouteLike.route_id == r.id).count()
-    points = []
-    try:
-        raw = json.loads(r.points_json) if r.points_json else []
-        for p in raw:
-            if 'lat' in p and 'lon' in p and 'name' in p:
-                points.append({
-                    'name': p.get('name'),
-                    'description': p.get('description'),
-                    'lat': float(p.get('lat')),
-                    'lon': float(p.get('lon')),
-                })
-    except Exception:
-        points = []
-    return RoutePublic(**{
-        "id": r.id,
-        "title": r.title,
-        "description": r.description,
-        "city": r.city,
-        "time_minutes": r.time_minutes,
-        "budget": r.budget,
-        "likes": likes,
-        "points": points,
-    })
+    return route_public(r, likes)
 
 
 @app.put("/api/routes/{route_id}", response_model=SimpleOk)
-def update_route(route_id: int, payload: RouteCreate, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_route(route_id: int, payload: RouteCreate, optimize: bool = False, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
     r = db.get(Route, route_id)
-    if not r or r.creator_user_id != current.id:
+    if not r or r.deleted_at is not None or r.creator_user_id != current.id:
         raise HTTPException(status_code=404, detail="Маршрут не найден")
+    moved = r.city != payload.city
     r.title = payload.title
     r.description = payload.description
     r.city = payload.city
     r.time_minutes = payload.time_minutes
     r.budget = payload.budget
-    r.points_json = json.dumps([
-        {"name": p.name, "description": p.description, "lat": p.lat, "lon": p.lon}
-        for p in payload.points
-    ])
+    r.points_json = _points_json(_optimized_points(payload.points) if optimize else payload.points)
+    refresh_route_derived(r)
+    dedup.index(db, r)
     db.add(r)
+    etags.bump(db, etags.ROUTES)
+    if moved:
+        events.bus.publish(db, "trending", route_id=route_id)
     db.commit()
+    if moved:
+        trending.move(route_id, r.city)
     return SimpleOk()
 
 
 @app.delete("/api/routes/{route_id}", response_model=SimpleOk)
 def delete_route(route_id: int, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
     r = db.get(Route, route_id)
-    if not r or r.creator_user_id != current.id:
+    if not r or r.deleted_at is not None or r.creator_user_id != current.id:
         raise HTTPException(status_code=404, detail="Маршрут не найден")
-    # каскадное удаление привязок
-    db.query(RouteLike).filter(RouteLike.route_id == r.id).delete()
-    db.query(FavoriteRoute).filter(FavoriteRoute.route_id == r.id).delete()
-    db.delete(r)
+    # привязки (лайки/избранное) и саму строку удалит purger
+    r.deleted_at = datetime.utcnow()
+    etags.bump(db, etags.ROUTES)
+    events.bus.publish(db, "trending", route_id=route_id)
+    events.bus.publish(db, "purger.wake")
     db.commit()
+    trending.remove(route_id)
+    purger.wake()
     return SimpleOk()
 
 
 # Rating
+def _stream_rating():
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(User.id, User.nickname, User.rating)
+            .order_by(User.rating.desc())
+            .execution_options(yield_per=STREAM_YIELD_PER)
+        )
+        yield from fragments.iter_json_array(
+            b'{"user_id":%d,"nickname":%s,"rating":%d}' % (user_id, json.dumps(nickname, ensure_ascii=False).encode(), value)
+            for user_id, nickname, value in rows
+        )
+    finally:
+        db.close()
+
+
 @app.get("/api/rating", response_model=List[RatingItem])
-def rating(db: Session = Depends(get_db)):
-    users = db.query(User).order_by(User.rating.desc()).all()
-    return [RatingItem(user_id=u.id, nickname=u.nickname, rating=u.rating) for u in users]
+def rating(request: Request, db: Session = Depends(get_db)):
+    etag, not_modified = etags.check(request, db, [etags.RATING])
+    if not_modified:
+        return not_modified
+    return etags.tag(json_stream_response(request, _stream_rating()), etag)
+
+
+def _rating_period(period: str, start: Optional[date]) -> date:
+    if period not in ledger.PERIODS:
+        raise HTTPException(status_code=400, detail="Период: week или month")
+    return ledger.period_start(period, start or date.today())
+
+
+@app.get("/api/rating/leaderboard", response_model=List[LeaderboardItem])
+def rating_leaderboard(
+    request: Request,
+    response: Response,
+    period: str = "week",
+    start: Optional[date] = None,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    # start — любой день периода; по умолчанию текущий период
+    period_start = _rating_period(period, start)
+    etag, not_modified = etags.check(request, db, [etags.RATING], vary=f"{period}|{period_start}|{limit}")
+    if not_modified:
+        return not_modified
+    etags.tag(response, etag)
+    return [
+        LeaderboardItem(user_id=user_id, nickname=nickname, gained=gained, rating=rating)
+        for user_id, nickname, gained, rating in ledger.leaderboard(db, period, period_start, limit)
+    ]
+
+
+@app.get("/api/rating/history", response_model=List[RatingHistoryItem])
+def rating_history(
+    period: str = "week",
+    limit: int = Query(12, ge=1, le=104),
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    _rating_period(period, None)
+    return [RatingHistoryItem(period_start=start, gained=gained) for start, gained in ledger.history(db, current.id, period, limit)]
+
+
+# Bootstrap: данные первой загрузки страницы одним запросом — один JWT, один пользователь,
+# одна сессия. Секции считаются по очереди: Session не потокобезопасна, а запросы к SQLite
+# короче сетевого round trip, который экономится. Секции с маршрутами отдаются потоком, как
+# в /api/routes, а лента без limit — только первая страница (BOOTSTRAP_ROUTES_LIMIT).
+BOOTSTRAP_ROUTES_LIMIT = 50
+BOOTSTRAP_SECTIONS = {
+    "me": lambda f, current, db: [_profile(db, current).model_dump_json().encode()],
+    "daily": lambda f, current, db: [get_daily_today(current, db).model_dump_json().encode()],
+    "messages": lambda f, current, db: [get_messages(current, db).model_dump_json().encode()],
+    "routes": lambda f, current, db: _stream_route_fragments(_filter_routes(_live_routes(db), f), current.id, f.points),
+    "favorites": lambda f, current, db: _stream_route_fragments(_favorites_query(db, current), current.id, f.points),
+    "mine": lambda f, current, db: _stream_route_fragments(_my_routes_query(db, current), current.id, f.points),
+}
+
+
+def _bootstrap_chunks(sections: List[Tuple[str, Iterable[bytes]]]):
+    yield b"{"
+    for i, (name, chunks) in enumerate(sections):
+        yield b'%s"%s":' % (b"," if i else b"", name.encode())
+        yield from chunks
+    yield b"}"
+
+
+@app.get("/api/bootstrap", response_model=BootstrapResponse)
+def bootstrap(
+    request: Request,
+    include: str = "me,daily,messages,routes",
+    filters: RouteFilters = Depends(),
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    # фильтры (city, sort, limit, ...) относятся к секции routes, как в /api/routes;
+    # points (формат точек) — ко всем секциям с маршрутами
+    _points_format(filters.points)
+    names = list(dict.fromkeys(name.strip() for name in include.split(",") if name.strip()))
+    unknown = [name for name in names if name not in BOOTSTRAP_SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Неизвестные секции: {', '.join(unknown)}")
+    if filters.limit is None:
+        filters.limit = BOOTSTRAP_ROUTES_LIMIT
+    # me/daily/messages считаются здесь, на сессии запроса; маршруты — при отдаче, в своей сессии
+    sections = [(name, BOOTSTRAP_SECTIONS[name](filters, current, db)) for name in names]
+    return json_stream_response(request, _bootstrap_chunks(sections))
+
+
+# Recommendations: item-item CF по лайкам/избранному (backend/recommender.py)
+RECOMMEND_MAX_ROUTES = 50
+
+
+@app.get("/api/recommendations/routes", response_model=List[RouteListItem])
+def recommended_routes(
+    request: Request,
+    city: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=RECOMMEND_MAX_ROUTES),
+    points: str = Depends(_points_format),
+    current: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    route_ids = recommender.recommend(SessionLocal, current.id, limit, city)
+    if not route_ids:
+        return json_list_response(request, b"[]")
+    rows = _route_fragments(db, _live_routes(db).filter(Route.id.in_(route_ids)), order=route_ids, viewer_id=current.id, points=points)
+    return json_list_response(request, stitch_list(rows))
 
 
-# Recommendations: fake stub that returns random points; client shows steps
 @app.post("/api/recommendations", response_model=RecommendationResponse)
-def recommend(req: RecommendationRequest, current: User = Depends(get_current_user)):
-    random.seed(req.city + req.description + str(req.places))
+def recommend(req: RecommendationRequest, current: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    # шаги — точки рекомендованных маршрутов города, по порядку ранжирования
     steps: List[RecommendationStep] = []
-    base_lat = 55.75 if req.city == "moscow" else 59.93
-    base_lon = 37.62 if req.city == "moscow" else 30.33
-    for i in range(req.places):
-        steps.append(
-            RecommendationStep(
-                name=f"Место {i+1}",
-                coordinate=Coordinate(lat=base_lat + random.uniform(-0.02, 0.02), lon=base_lon + random.uniform(-0.02, 0.02)),
-                hint="",
-            )
+    route_ids = recommender.recommend(SessionLocal, current.id, RECOMMEND_MAX_ROUTES, req.city)
+    routes = {r.id: r for r in _live_routes(db).filter(Route.id.in_(route_ids))} if route_ids else {}
+    ranked = [routes[route_id] for route_id in route_ids if route_id in routes]
+    if sum(r.points_count or 0 for r in ranked) < req.places:
+        # кандидаты CF и популярное кончились (у остальных маршрутов города нет ни лайков, ни
+        # избранного) — добираем шаги из новых маршрутов города, как в ленте. Как и в CF, без
+        # уже лайкнутого и избранного пользователем, и без его собственных маршрутов
+        q = _live_routes(db).filter(
+            Route.city == req.city,
+            or_(Route.creator_user_id.is_(None), Route.creator_user_id != current.id),
+            Route.id.notin_(select(RouteLike.route_id).where(RouteLike.user_id == current.id)),
+            Route.id.notin_(select(FavoriteRoute.route_id).where(FavoriteRoute.user_id == current.id)),
         )
+        if route_ids:
+            q = q.filter(Route.id.notin_(route_ids))
+        ranked += q.order_by(*ROUTE_SORTS["new"]).limit(req.places).all()
+    for r in ranked:
+        for p in parse_points(r.points_json):
+            if len(steps) >= req.places:
+                break
+            steps.append(RecommendationStep(name=p["name"], coordinate=Coordinate(lat=p["lat"], lon=p["lon"]), hint=r.title))
+        if len(steps) >= req.places:
+            break
     return RecommendationResponse(city=req.city, description=req.description, places=req.places, steps=steps)
 
 
@@ -655,6 +1251,10 @@ def ai_generate(payload: AIGenerateRequest):
 
     request_json = {"message": prompt, "api_key": CHAD_API_KEY}
 
+    # requests нужен только здесь: не грузим его при импорте приложения
+    import requests
+
+    started = time.perf_counter()
     try:
         resp = requests.post(
             url=f"https://ask.chadgpt.ru/api/public/{model}", json=request_json, timeout=45
@@ -662,9 +1262,13 @@ def ai_generate(payload: AIGenerateRequest):
         resp.raise_for_status()
         data = resp.json()
     except Exception as e:
+        metrics.AI_ERRORS.inc(model, type(e).__name__)
         raise HTTPException(status_code=502, detail=f"AI сервис недоступен: {e}")
+    finally:
+        metrics.AI_LATENCY.observe(time.perf_counter() - started, model)
 
     if not data.get("is_success"):
+        metrics.AI_ERRORS.inc(model, "not_success")
         raise HTTPException(status_code=400, detail=data.get("error_message", "AI ошибка"))
 
     route_text: str = data.get("response", "")
@@ -689,6 +1293,28 @@ def ai_generate(payload: AIGenerateRequest):
 def health():
     return {"status": "ok"}
 
+
+@app.get("/api/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    # async: gauges пула потоков читаются из event loop
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# Профили запросов (backend/profiler.py): список и collapsed stacks для flamegraph.pl/speedscope
+@app.get("/api/profiles", response_model=List[str], include_in_schema=False)
+def list_profiles(current: User = Depends(get_current_user)):
+    _ensure_admin(current)
+    return profiler.ring.list()
+
+
+@app.get("/api/profiles/{name}", include_in_schema=False)
+def get_profile(name: str, current: User = Depends(get_current_user)):
+    _ensure_admin(current)
+    path = profiler.ring.find(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Профиль не найден")
+    return Response(content=path.read_bytes(), media_type="text/plain; charset=utf-8")
+
 ROOT_DIR = Path(__file__).resolve().parent.parent
 app.mount("/", StaticFiles(directory=str(ROOT_DIR), html=True), name="static")
 uploads_dir = ROOT_DIR / "uploads"
@@ -697,5 +1323,10 @@ app.mount("/uploads", StaticFiles(directory=str(uploads_dir)), name="uploads")
 
 
 if __name__ == "__main__":
+    # один процесс на уже импортированном app: uvicorn.run("backend.main:app") импортировал бы
+    # модуль второй раз рядом с __main__. Несколько воркеров — python -m backend.serve
+    if events.WORKERS > 1:
+        raise SystemExit("GODATE_WORKERS > 1: запускайте python -m backend.serve")
     import uvicorn
+
     uvicorn.run(app, host="127.0.0.1", port=8877)
\ No newline at end of file
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Минимальный реестр метрик в текстовом формате Prometheus (без prometheus_client).
+# На горячем пути — только словарь и bisect под коротким локом.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), collect: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._collect = collect
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self) -> List[str]:
+        if self._collect is not None:
+            # значение снимается в момент scrape
+            try:
+                self.set(self._collect())
+            except Exception:
+                pass
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [counts по бакетам (+Inf последним), sum, count]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# HTTP
+HTTP_REQUESTS = Counter("godate_http_requests_total", "HTTP requests by endpoint and status", ("method", "path", "status"))
+HTTP_LATENCY = Histogram("godate_http_request_duration_seconds", "HTTP request latency", ("method", "path"))
+HTTP_IN_PROGRESS = Gauge("godate_http_requests_in_progress", "HTTP requests being processed")
+
+# SQL
+SQL_STATEMENTS = Counter("godate_sql_statements_total", "SQL statements executed, by endpoint", ("path",))
+SQL_SECONDS = Counter("godate_sql_seconds_total", "Time spent in SQL statements, by endpoint", ("path",))
+SQL_PER_REQUEST = Histogram("godate_sql_statements_per_request", "SQL statements per HTTP request", ("path",), COUNT_BUCKETS)
+
+# AI upstream
+AI_LATENCY = Histogram("godate_ai_upstream_duration_seconds", "Latency of AI upstream calls", ("model",))
+AI_ERRORS = Counter("godate_ai_upstream_errors_total", "Failed AI upstream calls", ("model", "kind"))
+
+
+class RequestStats:
+    __slots__ = ("sql_count", "sql_seconds")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+
+
+# Контекст запроса: копируется в threadpool вместе с contextvars, поэтому синхронные
+# обработчики пишут в тот же объект
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("godate_request_stats", default=None)
+_OUTSIDE_REQUEST = "-"
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("godate_query_start", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["godate_query_start"].pop()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+    else:
+        SQL_STATEMENTS.inc(_OUTSIDE_REQUEST)
+        SQL_SECONDS.inc(_OUTSIDE_REQUEST, amount=elapsed)
+
+
+def _execute_error(context):
+    # after_cursor_execute не вызывается для упавших запросов
+    starts = context.connection.info.get("godate_query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine: Engine):
+    # повторный вызов (второй импорт модуля приложения) не вешает слушатели ещё раз
+    if event.contains(engine, "after_cursor_execute", _after_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "handle_error", _execute_error)
+
+
+def install_threadpool_gauges():
+    # Насыщение пула потоков, в котором FastAPI выполняет синхронные обработчики; идемпотентно
+    from anyio import to_thread
+
+    if any(metric.name == "godate_threadpool_borrowed_tokens" for metric in _registry):
+        return
+
+    def _stat(attr: str) -> Callable[[], float]:
+        return lambda: getattr(to_thread.current_default_thread_limiter().statistics(), attr)
+
+    Gauge("godate_threadpool_borrowed_tokens", "Threadpool workers busy with sync handlers", collect=_stat("borrowed_tokens"))
+    Gauge("godate_threadpool_total_tokens", "Threadpool capacity", collect=_stat("total_tokens"))
+    Gauge("godate_threadpool_tasks_waiting", "Tasks waiting for a threadpool worker", collect=_stat("tasks_waiting"))
+
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # без шаблона маршрута не плодим метки по сырому пути
+    return "unmatched" if scope.get("path", "").startswith("/api") else "static"
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec()
+            _request_stats.reset(token)
+            method = scope["method"]
+            path = route_label(scope)
+            HTTP_REQUESTS.inc(method, path, str(status_code))
+            HTTP_LATENCY.observe(elapsed, method, path)
+            if stats.sql_count:
+                SQL_STATEMENTS.inc(path, amount=stats.sql_count)
+                SQL_SECONDS.inc(path, amount=stats.sql_seconds)
+            SQL_PER_REQUEST.observe(stats.sql_count, path)
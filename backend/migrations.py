@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import logging
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from .database import Base
+from . import models  # noqa: F401  — регистрирует таблицы в Base.metadata
+from .models import normalize_login
+from . import dedup
+from . import dailies
+
+
+# Версионированные миграции: номер схемы хранится в PRAGMA user_version.
+# На старте с актуальной базой выполняется один PRAGMA, без create_all и инспекции.
+# Новая колонка/индекс/таблица = новый шаг в конце MIGRATIONS; старые шаги не меняются.
+
+logger = logging.getLogger("godate.migrations")
+
+
+def _sync_models(conn: Connection):
+    # Базовая схема: таблицы моделей + nullable-колонки и индексы, которых нет в старых базах
+    # (до версионирования схема доливалась при каждом старте)
+    Base.metadata.create_all(bind=conn)
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl_type}"))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _seed_daily_tasks(conn: Connection):
+    if conn.execute(text("SELECT 1 FROM daily_tasks LIMIT 1")).first() is not None:
+        return
+    conn.execute(
+        text("INSERT INTO daily_tasks (code, title, description, reward_points) VALUES (:code, :title, :description, :reward_points)"),
+        [
+            {"code": "add_friend", "title": "Добавить нового друга", "description": "Добавьте нового друга сегодня", "reward_points": 20},
+            {"code": "date_out", "title": "Сходить на свидание", "description": "Кино/ресторан/парк — засчитывается по кнопке", "reward_points": 40},
+            {"code": "create_route", "title": "Создать свой маршрут", "description": "Создайте маршрут и поделитесь с другими", "reward_points": 30},
+        ],
+    )
+
+
+def _rating_ledger(conn: Connection):
+    # rating_events/rating_snapshots + начальная запись журнала для уже набранного рейтинга,
+    # чтобы сумма событий пользователя совпадала с users.rating
+    _sync_models(conn)
+    conn.execute(text(
+        "INSERT INTO rating_events (user_id, delta, reason, created_at) "
+        "SELECT id, rating, 'baseline', CURRENT_TIMESTAMP FROM users WHERE rating != 0"
+    ))
+
+
+def _user_lookup_columns(conn: Connection):
+    # users.email_lower/nickname_lower: lower() в SQLite понимает только ASCII, поэтому
+    # заполняем из Python. Старые базы могли завести «Bob» и «bob» — колонку получает
+    # первый по id, у остальных NULL (уникальный индекс NULL допускает), их видно в логе.
+    # Такие пользователи входят и находятся по точному email/нику (backend/utils.py).
+    _sync_models(conn)
+    taken = {"email_lower": set(), "nickname_lower": set()}
+    rows = []
+    duplicates = []
+    for user_id, email, nickname in conn.execute(text("SELECT id, email, nickname FROM users ORDER BY id")):
+        row = {"id": user_id}
+        for column, value in (("email_lower", email), ("nickname_lower", nickname)):
+            key = normalize_login(value)
+            if key in taken[column]:
+                row[column] = None
+                duplicates.append(f"{user_id}:{column}")
+            else:
+                taken[column].add(key)
+                row[column] = key
+        rows.append(row)
+    if rows:
+        conn.execute(text("UPDATE users SET email_lower = :email_lower, nickname_lower = :nickname_lower WHERE id = :id"), rows)
+    if duplicates:
+        logger.warning("users: %d logins differ only in case, left without *_lower: %s", len(duplicates), ", ".join(duplicates))
+
+
+def _friendships(conn: Connection):
+    # friendships из принятых заявок в друзья; решённым заявкам — resolved_at (точного
+    # момента старые базы не знают, берём created_at), чтобы архиватор мог их перенести
+    _sync_models(conn)
+    conn.execute(text(
+        "INSERT OR IGNORE INTO friendships (user_low_id, user_high_id, created_at) "
+        "SELECT min(from_user_id, to_user_id), max(from_user_id, to_user_id), created_at FROM friend_requests "
+        "WHERE status = 'accepted' AND type = 'friend'"
+    ))
+    conn.execute(text("UPDATE friend_requests SET resolved_at = created_at WHERE status != 'pending' AND resolved_at IS NULL"))
+
+
+# Индексы, которые перекрыты составными (префикс уникального ограничения или нового индекса)
+# и только замедляют запись
+_REDUNDANT_INDEXES = (
+    "ix_users_id",  # INTEGER PRIMARY KEY
+    "ix_friend_requests_from_user_id",  # ix_friend_requests_from_status, uq_request_unique
+    "ix_friend_requests_to_user_id",  # ix_friend_requests_to_status
+    "ix_daily_completion_user_id",  # uq_user_daily_once (user_id, date, task_id)
+    "ix_route_likes_route_id",  # uq_route_like_unique (route_id, user_id)
+    "ix_rating_snapshots_board",  # ix_rating_snapshots_leaderboard
+    "ix_favorite_routes_user_id",  # uq_favorite_route_unique (user_id, route_id)
+)
+
+
+def _covering_indexes(conn: Connection):
+    for name in _REDUNDANT_INDEXES:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    _sync_models(conn)
+
+
+def _route_minhash(conn: Connection):
+    # routes.minhash + route_minhash_bands для уже созданных маршрутов (backend/dedup.py)
+    _sync_models(conn)
+    dedup.rebuild(conn)
+
+
+def _daily_rollups(conn: Connection):
+    # daily_stats + серии пользователей по уже накопленным daily_completion (backend/dailies.py)
+    _sync_models(conn)
+    dailies.rebuild(conn)
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "baseline schema", _sync_models),
+    (2, "seed daily tasks", _seed_daily_tasks),
+    # добавление колонок/индексов моделей — повторный идемпотентный _sync_models
+    (3, "routes.deleted_at + ix_routes_deleted", _sync_models),
+    (4, "rating_events ledger + rating_snapshots", _rating_ledger),
+    (5, "users.email_lower/nickname_lower + unique indexes", _user_lookup_columns),
+    (6, "friendships + friend_requests.resolved_at + friend_requests_archive", _friendships),
+    (7, "composite indexes for hot queries, drop redundant single-column ones", _covering_indexes),
+    # заполняется пересчётом фрагментов в init_db (fragments.VERSION)
+    (8, "routes.public_polyline_json", _sync_models),
+    (9, "routes.minhash + route_minhash_bands near-duplicate index", _route_minhash),
+    (10, "change_events + worker_leases for multi-worker mode", _sync_models),
+    (11, "daily_stats + users.daily_streak/daily_best_streak/daily_last_date", _daily_rollups),
+    # _REDUNDANT_INDEXES дополнен, DROP INDEX IF EXISTS повторно безвреден
+    (12, "drop ix_favorite_routes_user_id (prefix of uq_favorite_route_unique)", _covering_indexes),
+    # подписи пересчитываются: у ячеек вес GEOMETRY_WEIGHT, маршруты без точек подписи не получают
+    (13, "routes.minhash with weighted geometry features", _route_minhash),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(conn: Connection) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def upgrade(engine: Optional[Engine] = None) -> List[int]:
+    # Возвращает номера применённых шагов (пусто — база уже актуальна)
+    if engine is None:
+        from .database import engine
+    with engine.connect() as conn:
+        if current_version(conn) >= LATEST:
+            return []
+    applied = []
+    with engine.begin() as conn:
+        version = current_version(conn)
+        for number, name, step in MIGRATIONS:
+            if number <= version:
+                continue
+            logger.info("applying migration %d: %s", number, name)
+            step(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {number}")
+            applied.append(number)
+    return applied
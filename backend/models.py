@@ -5,7 +5,9 @@ from enum import Enum
 from typing import Optional
 
 from sqlalchemy import (
+    BigInteger,
     Integer,
+    LargeBinary,
     String,
     DateTime,
     ForeignKey,
@@ -13,6 +15,9 @@ from sqlalchemy import (
     UniqueConstraint,
     Date,
     Text,
+    Index,
+    Float,
+    text,
 )
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 
@@ -30,10 +35,19 @@ class RequestStatus(str, Enum):
     declined = "declined"
 
 
+def normalize_login(value: str) -> str:
+    return value.strip().lower()
+
+
+def _lower(ctx, column: str) -> Optional[str]:
+    value = ctx.get_current_parameters().get(column)
+    return normalize_login(value) if value is not None else None
+
+
 class User(Base):
     __tablename__ = "users"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
     email: Mapped[str] = mapped_column(String(255), unique=True, index=True, nullable=False)
     nickname: Mapped[str] = mapped_column(String(50), unique=True, index=True, nullable=False)
     password_hash: Mapped[str] = mapped_column(String(255), nullable=False)
@@ -41,22 +55,73 @@ class User(Base):
     rating: Mapped[int] = mapped_column(Integer, default=0)
     soulmate_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("users.id"), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # нормализованные логины для поиска без учёта регистра одним индексным запросом;
+    # заполняются при вставке (в т.ч. пакетной), у дублей из старых баз — NULL
+    email_lower: Mapped[Optional[str]] = mapped_column(String(255), nullable=True, default=lambda ctx: _lower(ctx, "email"))
+    nickname_lower: Mapped[Optional[str]] = mapped_column(String(50), nullable=True, default=lambda ctx: _lower(ctx, "nickname"))
+    # серия дейликов подряд (backend/dailies.py); у старых строк до первого выполнения — NULL
+    daily_streak: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=0)
+    daily_best_streak: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, default=0)
+    daily_last_date: Mapped[Optional[date]] = mapped_column(Date, nullable=True)
 
     soulmate: Mapped[Optional["User"]] = relationship("User", remote_side=[id], uselist=False)
 
+    __table_args__ = (
+        Index("ux_users_email_lower", "email_lower", unique=True),
+        Index("ux_users_nickname_lower", "nickname_lower", unique=True),
+        Index("ix_users_rating", "rating"),
+    )
+
 
 class FriendRequest(Base):
     __tablename__ = "friend_requests"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    from_user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False, index=True)
-    to_user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    from_user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    to_user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
     type: Mapped[RequestType] = mapped_column(SAEnum(RequestType), nullable=False)
     status: Mapped[RequestStatus] = mapped_column(SAEnum(RequestStatus), default=RequestStatus.pending)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # когда заявку приняли/отклонили; по нему фоновый архиватор переносит её в архив
+    resolved_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
 
     __table_args__ = (
         UniqueConstraint("from_user_id", "to_user_id", "type", name="uq_request_unique"),
+        # входящие/исходящие ожидающие заявки (get_messages)
+        Index("ix_friend_requests_to_status", "to_user_id", "status"),
+        Index("ix_friend_requests_from_status", "from_user_id", "status"),
+        Index("ix_friend_requests_resolved", "resolved_at", sqlite_where=text("resolved_at IS NOT NULL")),
+    )
+
+
+class FriendRequestArchive(Base):
+    __tablename__ = "friend_requests_archive"
+
+    # Принятые/отклонённые заявки старше срока хранения (backend/archiver.py); id — как в friend_requests
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    from_user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    to_user_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    type: Mapped[RequestType] = mapped_column(SAEnum(RequestType), nullable=False)
+    status: Mapped[RequestStatus] = mapped_column(SAEnum(RequestStatus), nullable=False)
+    created_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    resolved_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_friend_requests_archive_pair", "from_user_id", "to_user_id"),
+    )
+
+
+class Friendship(Base):
+    __tablename__ = "friendships"
+
+    # Дружба — одна строка на пару (меньший id, больший id), не зависит от заявок и архива
+    user_low_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    user_high_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_friendships_high", "user_high_id", "user_low_id"),
     )
 
 
@@ -84,15 +149,24 @@ class DailyCompletion(Base):
     __tablename__ = "daily_completion"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
     date: Mapped[date] = mapped_column(Date, index=True)
     task_id: Mapped[int] = mapped_column(Integer, ForeignKey("daily_tasks.id"))
 
     __table_args__ = (
+        # он же индекс поиска выполнения (user_id, date, task_id)
         UniqueConstraint("user_id", "date", "task_id", name="uq_user_daily_once"),
     )
 
 
+class DailyStat(Base):
+    __tablename__ = "daily_stats"
+
+    # сколько пользователей выполнило дейлик дня; растёт в транзакции complete_daily
+    date: Mapped[date] = mapped_column(Date, primary_key=True)
+    completions: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
 class Route(Base):
     __tablename__ = "routes"
 
@@ -104,22 +178,138 @@ class Route(Base):
     time_minutes: Mapped[int] = mapped_column(Integer, default=0)
     budget: Mapped[int] = mapped_column(Integer, default=0)
     points_json: Mapped[str] = mapped_column(Text, nullable=True)
+    # Предрендеренный публичный JSON (RoutePublic без likes), обновляется при записи
+    public_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    public_json_version: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # То же с точками одной строкой encoded polyline (RoutePublicPolyline, ?points=polyline)
+    public_polyline_json: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Длина по прямым между точками в сохранённом порядке (backend/geometry.py)
+    distance_m: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    points_count: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Сумма затухающих лайков в шкале trending_state.t0 (backend/trending.py)
+    hot_score: Mapped[Optional[float]] = mapped_column(Float, nullable=True, default=0.0)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Мягкое удаление: строка скрыта сразу, физически удаляется фоновым purger
+    deleted_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # MinHash-подпись для поиска почти-дубликатов (backend/dedup.py)
+    minhash: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+
+    # Фильтры ленты: равенство по городу + диапазон по одной метрике
+    __table_args__ = (
+        Index("ix_routes_city_created", "city", "created_at"),
+        Index("ix_routes_city_budget", "city", "budget"),
+        Index("ix_routes_city_time", "city", "time_minutes"),
+        Index("ix_routes_city_distance", "city", "distance_m"),
+        Index("ix_routes_city_points", "city", "points_count"),
+        Index("ix_routes_created", "created_at"),
+        Index("ix_routes_budget", "budget"),
+        Index("ix_routes_time", "time_minutes"),
+        # «мои маршруты» и подсчёт лайков автора
+        Index("ix_routes_creator_created", "creator_user_id", "created_at"),
+        # частичный: только помеченные на удаление — очередь purger
+        Index("ix_routes_deleted", "deleted_at", sqlite_where=text("deleted_at IS NOT NULL")),
+    )
+
+
+class RouteMinhashBand(Base):
+    __tablename__ = "route_minhash_bands"
+
+    # LSH: по строке на полосу подписи маршрута; маршруты с общим band_key — кандидаты в дубликаты
+    band_key: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    route_id: Mapped[int] = mapped_column(Integer, ForeignKey("routes.id"), primary_key=True)
+
+    __table_args__ = (
+        Index("ix_route_minhash_bands_route", "route_id"),
+        {"sqlite_with_rowid": False},
+    )
 
 
 class RouteLike(Base):
     __tablename__ = "route_likes"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    route_id: Mapped[int] = mapped_column(Integer, ForeignKey("routes.id"), index=True)
+    route_id: Mapped[int] = mapped_column(Integer, ForeignKey("routes.id"))
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
     __table_args__ = (
+        # покрывает и лайки маршрута: count(id) по route_id читается из индекса
         UniqueConstraint("route_id", "user_id", name="uq_route_like_unique"),
     )
 
 
+class TrendingState(Base):
+    __tablename__ = "trending_state"
+
+    # одна строка: опорная точка шкалы hot_score (unix time)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    t0: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class ChangeEvent(Base):
+    __tablename__ = "change_events"
+
+    # Журнал изменений для воркеров (backend/events.py); AUTOINCREMENT — id не переиспользуются
+    # после чистки, пропуск в последовательности значит, что воркер отстал дальше журнала
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    origin: Mapped[str] = mapped_column(String(32), nullable=False)
+    topic: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[str] = mapped_column(Text, nullable=False, default="{}")
+
+    __table_args__ = ({"sqlite_autoincrement": True},)
+
+
+class WorkerLease(Base):
+    __tablename__ = "worker_leases"
+
+    # name -> какой воркер держит фоновые задачи и до какого момента (unix time)
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    holder: Mapped[str] = mapped_column(String(32), nullable=False)
+    expires_at: Mapped[float] = mapped_column(Float, nullable=False)
+
+
+class ResourceVersion(Base):
+    __tablename__ = "resource_versions"
+
+    # Счётчики версий для ETag (backend/etags.py): "routes", "rating", "user:<id>", ...
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class RatingEvent(Base):
+    __tablename__ = "rating_events"
+
+    # Журнал начислений рейтинга: только вставки, User.rating — их сумма (backend/ledger.py)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    delta: Mapped[int] = mapped_column(Integer, nullable=False)
+    reason: Mapped[str] = mapped_column(String(50), nullable=False)
+    ref: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_rating_events_user_created", "user_id", "created_at"),
+    )
+
+
+class RatingSnapshot(Base):
+    __tablename__ = "rating_snapshots"
+
+    # Прирост рейтинга пользователя за неделю/месяц, обновляется вместе с журналом
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    period: Mapped[str] = mapped_column(String(10), nullable=False)
+    period_start: Mapped[date] = mapped_column(Date, nullable=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    gained: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint("period", "period_start", "user_id", name="uq_rating_snapshot"),
+        # лидерборд периода и история пользователя — по индексу, без сортировки
+        Index("ix_rating_snapshots_leaderboard", "period", "period_start", "gained", "user_id"),
+        Index("ix_rating_snapshots_user", "user_id", "period", "period_start"),
+    )
+
+
 class LikesAward(Base):
     __tablename__ = "likes_award"
 
@@ -131,7 +321,8 @@ class FavoriteRoute(Base):
     __tablename__ = "favorite_routes"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), index=True)
+    # поиск по user_id — префикс uq_favorite_route_unique, отдельный индекс не нужен
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"))
     route_id: Mapped[int] = mapped_column(Integer, ForeignKey("routes.id"), index=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from typing import AsyncIterator, Tuple
+
+from pydantic import BaseModel
+
+
+MEDIA_TYPE = "application/x-ndjson"
+# Защита от строки без перевода строки на весь запрос
+MAX_LINE_BYTES = 1024 * 1024
+
+
+def dump_line(item: BaseModel) -> bytes:
+    return item.model_dump_json().encode() + b"\n"
+
+
+async def iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    # (номер строки с 1, содержимое) — пустые строки пропускаются, но учитываются в нумерации
+    buffer = b""
+    line_no = 0
+    async for chunk in stream:
+        buffer += chunk
+        while True:
+            pos = buffer.find(b"\n")
+            if pos < 0:
+                break
+            line, buffer = buffer[:pos], buffer[pos + 1:]
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+        if len(buffer) > MAX_LINE_BYTES:
+            raise ValueError(f"Строка {line_no + 1} длиннее {MAX_LINE_BYTES} байт")
+    if buffer.strip():
+        yield line_no + 1, buffer
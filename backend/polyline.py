@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import Iterable, List, Tuple
+
+
+# Encoded polyline (формат Google Maps) с точностью 1e-6 вместо стандартной 1e-5: координаты
+# переводятся в целые микроградусы, пишутся разности с предыдущей точкой, каждая разность —
+# zigzag и группы по 5 бит символами с кодами 63..126. Соседние точки маршрута близко,
+# поэтому пара (lat, lon) занимает ~8-12 байт против ~40 в JSON-объекте.
+# Декодер для браузера — Polyline в js/api.js.
+
+PRECISION = 6
+
+
+def _encode_value(value: int, out: List[str]):
+    value = ~(value << 1) if value < 0 else value << 1
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+
+
+def encode(coords: Iterable[Tuple[float, float]], precision: int = PRECISION) -> str:
+    factor = 10 ** precision
+    out: List[str] = []
+    prev_lat = prev_lon = 0
+    for lat, lon in coords:
+        lat_i, lon_i = round(lat * factor), round(lon * factor)
+        _encode_value(lat_i - prev_lat, out)
+        _encode_value(lon_i - prev_lon, out)
+        prev_lat, prev_lon = lat_i, lon_i
+    return "".join(out)
+
+
+def decode(encoded: str, precision: int = PRECISION) -> List[Tuple[float, float]]:
+    factor = 10 ** precision
+    coords: List[Tuple[float, float]] = []
+    values = [0, 0]
+    index = 0
+    while index < len(encoded):
+        for i in (0, 1):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            values[i] += ~(result >> 1) if result & 1 else result >> 1
+        coords.append((values[0] / factor, values[1] / factor))
+    return coords
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import hmac
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from anyio import to_thread
+
+from . import metrics
+
+
+# Профилирование одного запроса без передеплоя: запрос с заголовком X-Profile: <GODATE_PROFILE_TOKEN>
+# или случайная доля GODATE_PROFILE_SAMPLE_RATE запросов профилируется сэмплером — отдельный
+# поток раз в INTERVAL_MS снимает стеки всех потоков процесса (sys._current_frames), пока
+# запрос не отдал тело ответа. Результат — collapsed stacks («a;b;c 12», формат flamegraph.pl
+# и speedscope) в кольце из KEEP файлов; эндпоинт и время ответа — в имени файла, id профиля
+# запроса по заголовку — в ответе (X-Profile-Id).
+# Одновременно профилируется не больше одного запроса. Простаивающие потоки не пишутся,
+# поэтому под нагрузкой в профиль попадают и параллельные запросы — стек начинается с имени
+# потока, обработчик ищется по его функции.
+
+TOKEN = os.environ.get("GODATE_PROFILE_TOKEN", "")
+SAMPLE_RATE = float(os.environ.get("GODATE_PROFILE_SAMPLE_RATE", "0"))
+INTERVAL_MS = float(os.environ.get("GODATE_PROFILE_INTERVAL_MS", "5"))
+KEEP = int(os.environ.get("GODATE_PROFILE_KEEP", "50"))
+# вне дерева проекта: корень репозитория раздаётся как статика
+DEFAULT_DIR = Path(os.environ.get("GODATE_PROFILE_DIR") or Path(tempfile.gettempdir()) / "godate-profiles")
+HEADER = b"x-profile"
+SUFFIX = ".folded"
+
+# Листовые функции ожидания: поток простаивает (пул, event loop, фоновые задачи)
+_IDLE_LEAVES = {"wait", "select", "poll"}
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+PROFILES = metrics.Counter("godate_profiles_total", "Requests profiled by the sampling profiler", ("path", "trigger"))
+
+
+class Sampler:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="godate-profiler", daemon=True)
+        self._labels: Dict[object, str] = {}
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            path = Path(code.co_filename)
+            label = f"{path.parent.name}/{path.name}:{code.co_name}".replace(";", ":").replace(" ", "_")
+            self._labels[code] = label
+        return label
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own or frame.f_code.co_name in _IDLE_LEAVES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(_UNSAFE.sub("_", names.get(ident, str(ident))))
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+class ProfileRing:
+    # каталог с не более чем keep профилями; старые удаляются при записи новых
+    def __init__(self, directory: Path = DEFAULT_DIR, keep: int = KEEP):
+        self.directory = Path(directory)
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def new_id(self) -> str:
+        # микросекунды — чтобы порядок имён совпадал с порядком записи и кольцо удаляло старые
+        return datetime.utcnow().strftime("%Y%m%dT%H%M%S%f") + f"-{random.getrandbits(16):04x}"
+
+    def write(self, profile_id: str, method: str, path: str, status: int, elapsed: float, body: str) -> str:
+        name = f"{profile_id}_{method}_{_UNSAFE.sub('_', path).strip('_') or 'root'}_{status}_{elapsed * 1000:.0f}ms{SUFFIX}"
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / name).write_text(body, encoding="utf-8")
+            for old in self.list()[self.keep:]:
+                (self.directory / old).unlink(missing_ok=True)
+        return name
+
+    def list(self) -> List[str]:
+        # новые первыми
+        if not self.directory.is_dir():
+            return []
+        return sorted((p.name for p in self.directory.glob(f"*{SUFFIX}")), reverse=True)
+
+    def find(self, name_or_id: str) -> Optional[Path]:
+        # по полному имени файла или по id из заголовка X-Profile-Id
+        if not name_or_id or name_or_id != Path(name_or_id).name:
+            return None
+        for name in self.list():
+            if name == name_or_id or name.startswith(name_or_id + "_"):
+                return self.directory / name
+        return None
+
+
+ring = ProfileRing()
+
+
+class ProfilerMiddleware:
+    def __init__(self, app, ring: ProfileRing = ring, token: str = TOKEN, sample_rate: float = SAMPLE_RATE):
+        self.app = app
+        self.ring = ring
+        self.token = token.encode()
+        self.sample_rate = sample_rate
+        self._busy = threading.Lock()
+
+    def _trigger(self, scope) -> Optional[str]:
+        if self.token:
+            for name, value in scope.get("headers") or []:
+                if name == HEADER and hmac.compare_digest(value, self.token):
+                    return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if trigger is None or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = Sampler(INTERVAL_MS / 1000)
+        profile_id = self.ring.new_id()
+        started = time.perf_counter()
+        state = {"status": 500, "done": False}
+
+        def finish():
+            if state["done"]:
+                return
+            state["done"] = True
+            sampler.stop()
+            self._busy.release()
+            label = metrics.route_label(scope)
+            PROFILES.inc(label, trigger)
+            self.ring.write(profile_id, scope["method"], label, state["status"], time.perf_counter() - started, sampler.collapsed())
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                if trigger == "header":
+                    message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile_id.encode())]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # время ответа без учёта отправки последнего куска клиенту
+                await to_thread.run_sync(finish)
+            await send(message)
+
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            await to_thread.run_sync(finish)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from .models import Route, RouteLike, FavoriteRoute, RouteMinhashBand
+
+
+# Удаление маршрутов в два шага: обработчик только ставит routes.deleted_at (чтение их уже
+# не видит), а фоновый поток удаляет маршруты небольшими пакетами. Пакет — одна транзакция:
+# лайки, избранное, полосы dedup и сами строки уходят вместе, остановка между пакетами не
+# оставляет лайков без маршрута. Между пакетами пауза — блокировка записи SQLite не держится
+# дольше одного пакета, и лайки/дейлики успевают пройти между пакетами.
+
+BATCH_SIZE = 500
+PAUSE_SECONDS = 0.05
+IDLE_SECONDS = 60.0
+
+logger = logging.getLogger("godate.purger")
+
+
+class Purger:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.running = False
+        self.purged: Dict[str, int] = {"routes": 0, "likes": 0, "favorites": 0}
+        self.last_error: Optional[str] = None
+
+    def wake(self):
+        self._wake.set()
+
+    def run_once(self, session_factory: Callable[[], Session]) -> int:
+        # один пакет маршрутов в одной транзакции: сначала зависимые строки, потом сами маршруты
+        db = session_factory()
+        try:
+            route_ids = db.scalars(
+                # в порядке удаления — прямо по частичному индексу ix_routes_deleted
+                select(Route.id).where(Route.deleted_at.is_not(None)).order_by(Route.deleted_at, Route.id).limit(BATCH_SIZE)
+            ).all()
+            if not route_ids:
+                return 0
+            removed = {
+                key: db.execute(delete(model).where(model.route_id.in_(route_ids))).rowcount
+                for model, key in ((RouteLike, "likes"), (FavoriteRoute, "favorites"))
+            }
+            db.execute(delete(RouteMinhashBand).where(RouteMinhashBand.route_id.in_(route_ids)))
+            db.execute(delete(Route).where(Route.id.in_(route_ids), Route.deleted_at.is_not(None)))
+            db.commit()
+            with self._lock:
+                for key, count in removed.items():
+                    self.purged[key] += count
+                self.purged["routes"] += len(route_ids)
+            return len(route_ids)
+        finally:
+            db.close()
+
+    def drain(self, session_factory: Callable[[], Session]):
+        self.running = True
+        try:
+            while not self._stop.is_set() and self.run_once(session_factory):
+                time.sleep(PAUSE_SECONDS)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.exception("route purge failed")
+        finally:
+            self.running = False
+
+    def pending(self, db: Session) -> int:
+        # частичный индекс ix_routes_deleted содержит только помеченные строки
+        return db.scalar(select(func.count()).select_from(Route).where(Route.deleted_at.is_not(None))) or 0
+
+    def status(self, db: Session) -> dict:
+        with self._lock:
+            purged = dict(self.purged)
+        return {"pending_routes": self.pending(db), "running": self.running, "purged": purged, "last_error": self.last_error}
+
+    def start(self, session_factory: Callable[[], Session]):
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                self.drain(session_factory)
+                self._wake.wait(IDLE_SECONDS)
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=loop, name="godate-purger", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+purger = Purger()
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Tuple
+
+from anyio import to_thread
+from jose import jwt, JWTError
+
+from .auth import SECRET_KEY, ALGORITHM
+from .database import DB_PATH
+from .events import WORKERS
+from . import metrics
+
+
+# Допуск запросов по token bucket: у каждого пользователя (по JWT) или, без токена, у IP своё
+# ведро на CAPACITY токенов, пополняемое со скоростью REFILL_PER_SECOND. Запрос стоит COSTS
+# токенов (дорогие эндпоинты — больше); когда токенов не хватает — 429 с Retry-After.
+# Хранилище: память процесса (один воркер) или общий SQLite-файл (GODATE_WORKERS > 1).
+
+ENABLED = os.environ.get("GODATE_RATE_LIMIT", "1").lower() not in {"0", "false", "no"}
+STORE = os.environ.get("GODATE_RATE_STORE") or ("sqlite" if WORKERS > 1 else "memory")
+STORE_PATH = Path(os.environ.get("GODATE_RATE_DB") or DB_PATH.with_name("ratelimit.db"))
+CAPACITY = float(os.environ.get("GODATE_RATE_CAPACITY", "60"))
+REFILL_PER_SECOND = float(os.environ.get("GODATE_RATE_REFILL", "1"))
+# Анонимы за одним NAT делят ведро IP — оно больше пользовательского
+IP_CAPACITY_FACTOR = 4.0
+# X-Forwarded-For учитывается только за доверенным прокси
+TRUST_PROXY = os.environ.get("GODATE_TRUST_PROXY", "").lower() in {"1", "true", "yes"}
+
+DEFAULT_COST = 1.0
+# (метод, путь) -> стоимость; 0 — без ограничений
+COSTS: Dict[Tuple[str, str], float] = {
+    ("POST", "/api/ai/generate"): 10.0,  # до 45 с внешнего вызова
+    ("POST", "/api/auth/login"): 5.0,  # bcrypt
+    ("POST", "/api/auth/register"): 5.0,  # bcrypt
+    ("GET", "/api/routes"): 2.0,
+    ("GET", "/api/routes/export"): 20.0,
+    ("POST", "/api/routes/import"): 20.0,
+    ("POST", "/api/recommendations"): 3.0,
+    ("GET", "/api/health"): 0.0,
+    ("GET", "/api/metrics"): 0.0,
+}
+
+REJECTED = metrics.Counter("godate_ratelimit_rejected_total", "Requests rejected by the rate limiter", ("path", "scope"))
+
+
+def _refill(tokens: float, updated: float, now: float, capacity: float) -> float:
+    return min(capacity, tokens + (now - updated) * REFILL_PER_SECOND)
+
+
+def _decide(tokens: float, cost: float) -> Tuple[bool, float, float]:
+    # (пропустить, остаток, через сколько секунд хватит токенов)
+    if tokens >= cost:
+        return True, tokens - cost, 0.0
+    return False, tokens, (cost - tokens) / REFILL_PER_SECOND
+
+
+class MemoryStore:
+    # полные вёдра неотличимы от отсутствующих — периодически выбрасываем их
+    PRUNE_EVERY = 10000
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, key: str, cost: float, capacity: float, now: float) -> Tuple[bool, float]:
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            allowed, tokens, retry_after = _decide(_refill(tokens, updated, now, capacity), cost)
+            self._buckets[key] = (tokens, now)
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                self._prune(now)
+        return allowed, retry_after
+
+    def _prune(self, now: float):
+        full_after = CAPACITY * IP_CAPACITY_FACTOR / REFILL_PER_SECOND
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < full_after}
+
+
+class SQLiteStore:
+    # Общие вёдра для нескольких процессов uvicorn; отдельный файл, чтобы не занимать
+    # блокировку записи основной базы. Соединение — своё на поток.
+    def __init__(self, path: Path = STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, cost: float, capacity: float, now: float) -> Tuple[bool, float]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            allowed, tokens, retry_after = _decide(_refill(tokens, updated, now, capacity), cost)
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens, now),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+
+def make_store():
+    return SQLiteStore() if STORE == "sqlite" else MemoryStore()
+
+
+def _client_key(scope) -> Tuple[str, str, float]:
+    # (ключ ведра, scope для метрик, ёмкость)
+    headers = dict(scope.get("headers") or [])
+    auth = headers.get(b"authorization", b"").decode("latin-1")
+    if auth.lower().startswith("bearer "):
+        try:
+            user_id = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            user_id = None
+        if user_id is not None:
+            return f"user:{user_id}", "user", CAPACITY
+    ip = None
+    if TRUST_PROXY and b"x-forwarded-for" in headers:
+        ip = headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    if not ip:
+        client = scope.get("client")
+        ip = client[0] if client else "unknown"
+    return f"ip:{ip}", "ip", CAPACITY * IP_CAPACITY_FACTOR
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store if store is not None else make_store()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api"):
+            await self.app(scope, receive, send)
+            return
+        rule = (scope["method"], scope["path"])
+        cost = COSTS.get(rule, DEFAULT_COST)
+        if cost <= 0:
+            await self.app(scope, receive, send)
+            return
+        key, kind, capacity = _client_key(scope)
+        now = time.time()
+        if isinstance(self.store, MemoryStore):
+            allowed, retry_after = self.store.take(key, cost, capacity, now)
+        else:
+            allowed, retry_after = await to_thread.run_sync(self.store.take, key, cost, capacity, now)
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+        REJECTED.inc(scope["path"] if rule in COSTS else "other", kind)
+        body = json.dumps({"detail": "Слишком много запросов, повторите позже"}, ensure_ascii=False).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
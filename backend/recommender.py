@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from .models import Route, RouteLike, FavoriteRoute
+
+if TYPE_CHECKING:
+    import numpy as np
+    from scipy import sparse
+
+
+# Item-item коллаборативная фильтрация по лайкам и избранному.
+# Модель (косинусная близость маршрутов, top-N соседей на маршрут) строится целиком в фоне,
+# свежие действия пользователя до пересборки учитываются через overlay.
+# numpy/scipy импортируются при первой сборке (в фоновом потоке), а не при старте приложения.
+
+LIKE_WEIGHT = 1.0
+FAVORITE_WEIGHT = 2.0
+NEIGHBORS = 50
+REFRESH_SECONDS = 60.0
+# Если действие касается маршрута, которого ещё нет в модели, пересобираем раньше, но не чаще
+MIN_REBUILD_SECONDS = 5.0
+
+logger = logging.getLogger("godate.recommender")
+
+
+@dataclass
+class Model:
+    route_ids: np.ndarray
+    index: Dict[int, int]
+    cities: np.ndarray
+    user_rows: Dict[int, int]
+    ratings: sparse.csr_matrix
+    similarity: sparse.csr_matrix
+    city_popular: Dict[str, np.ndarray]
+    popular: np.ndarray
+    build_seconds: float = 0.0
+    built_at: float = field(default_factory=time.time)
+
+
+def load_interactions(db: Session) -> Tuple[List[Tuple[int, int, float]], List[Tuple[int, str]]]:
+    interactions = [(u, r, LIKE_WEIGHT) for r, u in db.query(RouteLike.route_id, RouteLike.user_id)]
+    interactions += [(u, r, FAVORITE_WEIGHT) for r, u in db.query(FavoriteRoute.route_id, FavoriteRoute.user_id)]
+    routes = [(rid, city) for rid, city in db.query(Route.id, Route.city).filter(Route.deleted_at.is_(None))]
+    return interactions, routes
+
+
+def _prune_rows(m: sparse.csr_matrix, keep: int) -> sparse.csr_matrix:
+    import numpy as np
+    from scipy import sparse
+
+    # оставляем keep самых похожих соседей в каждой строке
+    m = m.tocsr()
+    indptr, indices, data = m.indptr, m.indices, m.data
+    rows, cols, vals = [], [], []
+    for i in range(m.shape[0]):
+        start, end = indptr[i], indptr[i + 1]
+        if start == end:
+            continue
+        row_data = data[start:end]
+        row_idx = indices[start:end]
+        if end - start > keep:
+            top = np.argpartition(-row_data, keep)[:keep]
+            row_data, row_idx = row_data[top], row_idx[top]
+        rows.append(np.full(len(row_idx), i, dtype=np.int32))
+        cols.append(row_idx)
+        vals.append(row_data)
+    if not rows:
+        return sparse.csr_matrix(m.shape, dtype=np.float32)
+    return sparse.csr_matrix(
+        (np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=m.shape, dtype=np.float32
+    )
+
+
+def build_model(interactions: Iterable[Tuple[int, int, float]], routes: Sequence[Tuple[int, str]], neighbors: int = NEIGHBORS) -> Model:
+    import numpy as np
+    from scipy import sparse
+
+    started = time.perf_counter()
+    route_ids = np.array([rid for rid, _ in routes], dtype=np.int64)
+    cities = np.array([city for _, city in routes], dtype=object)
+    index = {int(rid): i for i, rid in enumerate(route_ids)}
+
+    user_rows: Dict[int, int] = {}
+    rows, cols, vals = [], [], []
+    for user_id, route_id, weight in interactions:
+        col = index.get(route_id)
+        if col is None:
+            continue
+        rows.append(user_rows.setdefault(user_id, len(user_rows)))
+        cols.append(col)
+        vals.append(weight)
+    ratings = sparse.csr_matrix(
+        (np.asarray(vals, dtype=np.float32), (np.asarray(rows, dtype=np.int32), np.asarray(cols, dtype=np.int32))),
+        shape=(len(user_rows), len(route_ids)),
+    )
+    ratings.sum_duplicates()
+
+    # косинус между столбцами (маршрутами): нормируем столбцы и перемножаем
+    norms = np.sqrt(np.asarray(ratings.multiply(ratings).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = ratings @ sparse.diags(1.0 / norms)
+    similarity = (normalized.T @ normalized).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+    similarity = _prune_rows(similarity, neighbors)
+
+    popularity = np.asarray(ratings.sum(axis=0)).ravel()
+    popular = np.argsort(-popularity, kind="stable")
+    popular = popular[popularity[popular] > 0]
+    city_popular = {}
+    for city in set(cities.tolist()):
+        city_popular[city] = popular[cities[popular] == city]
+
+    return Model(
+        route_ids=route_ids,
+        index=index,
+        cities=cities,
+        user_rows=user_rows,
+        ratings=ratings,
+        similarity=similarity,
+        city_popular=city_popular,
+        popular=popular,
+        build_seconds=time.perf_counter() - started,
+    )
+
+
+def top_k(model: Model, user_id: int, k: int, city: Optional[str] = None, overlay: Optional[Dict[int, float]] = None) -> List[int]:
+    import numpy as np
+    from scipy import sparse
+
+    # история пользователя: строка матрицы + ещё не попавшие в модель действия
+    history: Dict[int, float] = {}
+    row = model.user_rows.get(user_id)
+    if row is not None:
+        start, end = model.ratings.indptr[row], model.ratings.indptr[row + 1]
+        for col, weight in zip(model.ratings.indices[start:end], model.ratings.data[start:end]):
+            history[int(col)] = float(weight)
+    for route_id, weight in (overlay or {}).items():
+        col = model.index.get(route_id)
+        if col is not None:
+            history[col] = history.get(col, 0.0) + weight
+    history = {col: w for col, w in history.items() if w > 0}
+
+    result: List[int] = []
+    if history:
+        cols = np.fromiter(history.keys(), dtype=np.int32)
+        weights = np.fromiter(history.values(), dtype=np.float32)
+        user_vec = sparse.csr_matrix((weights, (np.zeros(len(cols), dtype=np.int32), cols)), shape=(1, len(model.route_ids)))
+        scores = user_vec @ model.similarity
+        candidates, values = scores.indices, scores.data
+        mask = ~np.isin(candidates, cols)
+        if city is not None:
+            mask &= model.cities[candidates] == city
+        candidates, values = candidates[mask], values[mask]
+        if len(candidates) > k:
+            top = np.argpartition(-values, k)[:k]
+            candidates, values = candidates[top], values[top]
+        order = np.argsort(-values, kind="stable")
+        result = [int(model.route_ids[c]) for c in candidates[order]]
+
+    if len(result) < k:
+        # холодный старт: популярное в городе (или вообще), кроме уже виденного
+        seen = set(history) | {model.index[r] for r in result}
+        fallback = model.city_popular.get(city, np.empty(0, dtype=np.int64)) if city is not None else model.popular
+        for col in fallback:
+            if len(result) >= k:
+                break
+            if int(col) not in seen:
+                result.append(int(model.route_ids[col]))
+    return result
+
+
+class Recommender:
+    def __init__(self, refresh_seconds: float = REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._model: Optional[Model] = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        # действия после последней сборки: user_id -> {route_id: вес}
+        self._pending: Dict[int, Dict[int, float]] = {}
+        self._in_flight: Dict[int, Dict[int, float]] = {}
+        self._dirty = True
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+
+    def record(self, user_id: int, route_id: int, weight: float):
+        with self._lock:
+            user = self._pending.setdefault(user_id, {})
+            user[route_id] = user.get(route_id, 0.0) + weight
+            self._dirty = True
+        model = self._model
+        if model is None or route_id not in model.index:
+            self._wake.set()
+
+    def invalidate(self):
+        # пересобрать при первой возможности (другой воркер, отставший журнал событий)
+        self._dirty = True
+        self._wake.set()
+
+    def _overlay(self, user_id: int) -> Dict[int, float]:
+        with self._lock:
+            merged = dict(self._in_flight.get(user_id, {}))
+            for route_id, weight in self._pending.get(user_id, {}).items():
+                merged[route_id] = merged.get(route_id, 0.0) + weight
+        return merged
+
+    def refresh(self, session_factory: Callable[[], Session]) -> Model:
+        with self._build_lock:
+            with self._lock:
+                self._in_flight, self._pending = self._pending, {}
+                self._dirty = False
+            db = session_factory()
+            try:
+                interactions, routes = load_interactions(db)
+            except Exception:
+                db.rollback()
+                raise
+            finally:
+                db.close()
+            model = build_model(interactions, routes)
+            with self._lock:
+                self._model = model
+                self._in_flight = {}
+            return model
+
+    def model(self, session_factory: Callable[[], Session]) -> Model:
+        model = self._model
+        if model is None:
+            model = self.refresh(session_factory)
+        return model
+
+    def recommend(self, session_factory: Callable[[], Session], user_id: int, k: int, city: Optional[str] = None) -> List[int]:
+        return top_k(self.model(session_factory), user_id, k, city, self._overlay(user_id))
+
+    def start(self, session_factory: Callable[[], Session]):
+        if self._thread is not None:
+            return
+
+        def loop():
+            while not self._stop.is_set():
+                if self._dirty:
+                    try:
+                        self.refresh(session_factory)
+                    except Exception:
+                        # модель остаётся прежней, пересборка повторится на следующем круге
+                        logger.exception("recommender rebuild failed")
+                        self._dirty = True
+                self._stop.wait(MIN_REBUILD_SECONDS)
+                self._wake.wait(max(self.refresh_seconds - MIN_REBUILD_SECONDS, 0))
+                self._wake.clear()
+
+        self._thread = threading.Thread(target=loop, name="godate-recommender", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+recommender = Recommender()
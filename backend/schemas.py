@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 from datetime import date, datetime
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 from pydantic import BaseModel, EmailStr, Field
 
 from .models import RequestType, RequestStatus
+from .geometry import OPTIMIZE_MAX_POINTS
 
 
 class Token(BaseModel):
@@ -35,6 +36,11 @@ class UserPublic(BaseModel):
         from_attributes = True
 
 
+class UserSearchItem(BaseModel):
+    id: int
+    nickname: str
+
+
 class Profile(BaseModel):
     id: int
     email: EmailStr
@@ -84,18 +90,44 @@ class DailyTodayResponse(BaseModel):
     date: date
     task: DailyTaskPublic
     completed: bool
+    # сколько пользователей уже выполнили дейлик сегодня
+    completions: int = 0
+    streak: int = 0
+    best_streak: int = 0
 
 
 class DailyCompleteResponse(BaseModel):
     awarded_points: int
     new_rating: int
+    streak: int = 0
+
+
+class DailyStatItem(BaseModel):
+    date: date
+    completions: int
+
+
+class DailyStatsResponse(BaseModel):
+    date: date
+    completions: int
+    streak: int
+    best_streak: int
+    last_completed: Optional[date] = None
+    # последние дни, начиная с сегодняшнего
+    history: List[DailyStatItem]
 
 
 class RoutePoint(BaseModel):
     name: str
     description: Optional[str] = None
-    lat: float
-    lon: float
+    # NaN/Infinity JSON-парсер пропускает, а длина пути, 2-opt и ячейки dedup на них падают
+    lat: float = Field(ge=-90, le=90, allow_inf_nan=False)
+    lon: float = Field(ge=-180, le=180, allow_inf_nan=False)
+
+
+class RoutePointLabel(BaseModel):
+    name: str
+    description: Optional[str] = None
 
 
 class RoutePublic(BaseModel):
@@ -106,18 +138,105 @@ class RoutePublic(BaseModel):
     time_minutes: int
     budget: int
     likes: int = 0
+    # для текущего пользователя; анониму всегда false
+    liked_by_me: bool = False
+    favorited_by_me: bool = False
     points: List[RoutePoint] = []
+    distance_m: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
+class RoutePublicPolyline(BaseModel):
+    # ?points=polyline: координаты всех точек — одна строка encoded polyline (backend/polyline.py),
+    # подписи точек в том же порядке — в points; пустые (null) поля не передаются
+    id: int
+    title: str
+    description: str
+    city: str
+    time_minutes: int
+    budget: int
+    likes: int = 0
+    liked_by_me: bool = False
+    favorited_by_me: bool = False
+    points: List[RoutePointLabel] = []
+    polyline: str = ""
+    distance_m: Optional[int] = None
+
+
+class PurgeStatus(BaseModel):
+    pending_routes: int
+    running: bool
+    purged: Dict[str, int]
+    last_error: Optional[str] = None
+
+
+class DuplicateCluster(BaseModel):
+    route_ids: List[int]
+    city: str
+    # название маршрута с наименьшим id
+    title: str
+    # наименьшее сходство среди пар, связавших кластер
+    similarity: float
+
+
+class ArchiveStatus(BaseModel):
+    retention_days: float
+    pending: int
+    archived_total: int
+    archived: int
+    running: bool
+    last_run: Optional[datetime] = None
+    last_error: Optional[str] = None
+
+
+class BootstrapResponse(BaseModel):
+    # Секции, не указанные в include, в ответе отсутствуют
+    me: Optional[Profile] = None
+    daily: Optional[DailyTodayResponse] = None
+    messages: Optional[MessagesResponse] = None
+    routes: Optional[List[RoutePublic]] = None
+    favorites: Optional[List[RoutePublic]] = None
+    mine: Optional[List[RoutePublic]] = None
+
+
+class RouteFilters(BaseModel):
+    # Диапазоны включительные; sort: new/old, budget/-budget, time/-time, distance/-distance, points/-points
+    city: Optional[str] = None
+    min_budget: Optional[int] = Field(None, ge=0)
+    max_budget: Optional[int] = Field(None, ge=0)
+    min_time: Optional[int] = Field(None, ge=0)
+    max_time: Optional[int] = Field(None, ge=0)
+    min_points: Optional[int] = Field(None, ge=0)
+    max_points: Optional[int] = Field(None, ge=0)
+    min_distance: Optional[int] = Field(None, ge=0)
+    max_distance: Optional[int] = Field(None, ge=0)
+    sort: str = "new"
+    limit: Optional[int] = Field(None, ge=1, le=1000)
+    offset: int = Field(0, ge=0)
+    # формат точек: full — объекты с lat/lon, polyline — RoutePublicPolyline
+    points: str = "full"
+
+
 class RatingItem(BaseModel):
     user_id: int
     nickname: str
     rating: int
 
 
+class LeaderboardItem(BaseModel):
+    user_id: int
+    nickname: str
+    gained: int
+    rating: int
+
+
+class RatingHistoryItem(BaseModel):
+    period_start: date
+    gained: int
+
+
 class AvatarUpdate(BaseModel):
     avatar_url: str
 
@@ -135,6 +254,42 @@ class RouteCreate(BaseModel):
     points: List[RoutePoint] = []
 
 
+class RouteOptimizeRequest(BaseModel):
+    points: List[RoutePoint] = Field(..., max_length=OPTIMIZE_MAX_POINTS)
+    # False — искать и лучшую стартовую точку
+    keep_start: bool = True
+
+
+class RouteOptimizeResponse(BaseModel):
+    order: List[int]
+    points: List[RoutePoint]
+    distance_m: int
+    original_distance_m: int
+    duration_minutes: Dict[str, int]
+
+
+class RouteExportItem(RouteCreate):
+    id: int
+    creator_user_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+
+class RouteImportItem(RouteCreate):
+    creator_user_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
+
+class RouteImportError(BaseModel):
+    line: int
+    error: str
+
+
+class RouteImportResult(BaseModel):
+    imported: int = 0
+    failed: int = 0
+    errors: List[RouteImportError] = []
+
+
 class RecommendationRequest(BaseModel):
     city: str
     description: str
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import argparse
+import os
+from typing import List, Optional
+
+
+# Запуск API в нескольких процессах (один процесс uvicorn упирается в одно ядро):
+#   python -m backend.serve --port 8876 --workers 4
+# Число воркеров — --workers или GODATE_WORKERS, 0 — по числу ядер. Миграции и пересчёт
+# фрагментов выполняются здесь один раз, до старта воркеров, а не наперегонки в каждом;
+# база с несколькими воркерами переводится в WAL.
+# Воркеры получают GODATE_WORKERS через окружение: с ним включаются журнал событий
+# (backend/events.py) и общее хранилище лимитера (backend/ratelimit.py).
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="GOdate API в нескольких процессах uvicorn")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8876)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("GODATE_WORKERS", "1")), help="0 — по числу ядер")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+    os.environ["GODATE_WORKERS"] = str(workers)
+
+    import uvicorn
+    from .database import engine
+    from .main import init_db
+
+    if workers > 1:
+        # WAL (сохраняется в файле базы): читатели других процессов не блокируют писателя
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    init_db()
+    uvicorn.run("backend.main:app", host=args.host, port=args.port, workers=workers, log_level=args.log_level)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Отладка запросов для dev/staging (включается GODATE_SQL_DEBUG=1):
+# - число запросов на HTTP-запрос (заголовок X-Query-Count);
+# - повторяющиеся формы запроса (N+1) с местом вызова;
+# - медленные запросы с EXPLAIN QUERY PLAN.
+# assert_max_queries() работает всегда и предназначен для тестов.
+
+ENABLED = os.environ.get("GODATE_SQL_DEBUG", "").lower() in {"1", "true", "yes"}
+SLOW_QUERY_MS = float(os.environ.get("GODATE_SLOW_QUERY_MS", "100"))
+NPLUSONE_THRESHOLD = int(os.environ.get("GODATE_NPLUSONE_THRESHOLD", "5"))
+
+logger = logging.getLogger("godate.sql")
+
+BACKEND_DIR = str(Path(__file__).resolve().parent)
+# Инфраструктурные модули не считаются местом вызова
+_SKIP_FILES = {__file__, str(Path(BACKEND_DIR) / "metrics.py"), str(Path(BACKEND_DIR) / "database.py")}
+
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_POSTCOMPILE = re.compile(r"\(?__\[POSTCOMPILE_\w+\]\)?")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    # IN (?, ?, ?) разной длины — одна и та же форма
+    shape = _IN_LIST.sub("(?...)", statement)
+    shape = _POSTCOMPILE.sub("(?...)", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+
+def call_site() -> str:
+    # Ближайший кадр приложения (backend/, не инфраструктура) над SQLAlchemy
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(BACKEND_DIR) and filename not in _SKIP_FILES:
+            return f"{Path(filename).name}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+class QueryLog:
+    __slots__ = ("count", "shapes", "sites")
+
+    def __init__(self):
+        self.count = 0
+        self.shapes: Counter = Counter()
+        self.sites: Dict[str, str] = {}
+
+    def record(self, statement: str):
+        shape = statement_shape(statement)
+        self.count += 1
+        n = self.shapes[shape] = self.shapes[shape] + 1
+        # место второго вызова — это и есть цикл, порождающий N+1
+        if n <= 2:
+            self.sites[shape] = call_site()
+
+    def repeated(self, threshold: int = NPLUSONE_THRESHOLD) -> List[Tuple[str, int, str]]:
+        return [(shape, n, self.sites.get(shape, "?")) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+_query_log: ContextVar[Optional[QueryLog]] = ContextVar("godate_query_log", default=None)
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return ""
+    try:
+        # отдельный курсор на том же соединении: текущий курсор ещё читается
+        rows = conn.connection.driver_connection.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    except Exception as e:
+        return f"(EXPLAIN failed: {e})"
+    return "; ".join(str(row[-1]) for row in rows)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("godate_debug_start", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["godate_debug_start"].pop()) * 1000
+    log = _query_log.get()
+    if log is not None:
+        log.record(statement)
+    if elapsed_ms >= SLOW_QUERY_MS:
+        plan = "" if executemany else _explain(conn, statement, parameters)
+        logger.warning("slow query %.1f ms at %s: %s | plan: %s", elapsed_ms, call_site(), statement_shape(statement), plan)
+
+
+def _execute_error(context):
+    starts = context.connection.info.get("godate_debug_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine: Engine):
+    # идемпотентно, как metrics.instrument_engine
+    if event.contains(engine, "after_cursor_execute", _after_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "handle_error", _execute_error)
+
+
+class QueryDebugMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        log = QueryLog()
+        token = _query_log.set(log)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # к началу ответа обработчик уже отработал (кроме стримов)
+                message["headers"] = list(message.get("headers", [])) + [(b"x-query-count", str(log.count).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _query_log.reset(token)
+            for shape, n, site in log.repeated():
+                logger.warning("N+1 suspect: %d x %s at %s (%s %s)", n, shape, site, scope["method"], scope["path"])
+
+
+@contextmanager
+def assert_max_queries(max_count: int, engine: Optional[Engine] = None):
+    # Для тестов: with assert_max_queries(5): client.get("/api/routes")
+    # Слушает движок глобально, поэтому видит запросы из потока TestClient.
+    if engine is None:
+        from .database import engine
+    log = QueryLog()
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        log.record(statement)
+
+    event.listen(engine, "after_cursor_execute", _record)
+    try:
+        yield log
+    finally:
+        event.remove(engine, "after_cursor_execute", _record)
+    if log.count > max_count:
+        details = "\n".join(f"  {n} x {shape}  [{log.sites.get(shape, '?')}]" for shape, n in log.shapes.most_common())
+        raise AssertionError(f"Ожидалось не больше {max_count} SQL-запросов, выполнено {log.count}:\n{details}")
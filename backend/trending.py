@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import heapq
+import math
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from .models import Route, RouteLike, TrendingState
+
+
+# «Горячие» маршруты. Лайк в момент t добавляет exp(λ·(t − T0)) к Route.hot_score,
+# т.е. счёт — сумма экспоненциально затухающих лайков в общей шкале с опорной точкой T0.
+# Текущее значение = hot_score · exp(−λ·(now − T0)) — общий множитель для всех маршрутов,
+# поэтому порядок от времени не зависит: top-K по городам держится в кучах и обновляется
+# на лайк за O(K) с маленьким K; таблица лайков при чтении не нужна.
+# Чтобы exp не рос бесконечно, T0 периодически сдвигается, а все счёты умножаются на один
+# множитель (перенормировка) — порядок и кучи при этом остаются валидными.
+
+HALF_LIFE_HOURS = 24.0
+DECAY = math.log(2) / (HALF_LIFE_HOURS * 3600)
+TOP_K = 100
+# Неделя: инкремент лайка не больше 2^7, до переполнения float очень далеко
+RENORMALIZE_AFTER_SECONDS = 7 * 24 * 3600
+ALL_CITIES = None
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _timestamp(dt: datetime) -> float:
+    # created_at хранится как naive UTC
+    return (dt - _EPOCH).total_seconds()
+
+
+class TrendingIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.t0: float = 0.0
+        # route_id -> (город, hot_score)
+        self._scores: Dict[int, Tuple[str, float]] = {}
+        # город (None — все города) -> min-куча (hot_score, route_id) из TOP_K лучших
+        self._heaps: Dict[Optional[str], List[Tuple[float, int]]] = {}
+        self._members: Dict[Optional[str], set] = {}
+
+    def load(self, db: Session, backfill: bool = True):
+        # при старте: опорная точка, пересчёт строк без hot_score (после миграций), кучи из routes.hot_score
+        state = db.get(TrendingState, 1)
+        if state is None:
+            state = TrendingState(id=1, t0=time.time())
+            db.add(state)
+            db.flush()
+        self.t0 = state.t0
+        if backfill:
+            self._backfill(db)
+        if time.time() - self.t0 > RENORMALIZE_AFTER_SECONDS:
+            self.renormalize(db)
+        db.commit()
+        scores = {rid: (city, score) for rid, city, score in db.query(Route.id, Route.city, Route.hot_score).filter(Route.hot_score > 0, Route.deleted_at.is_(None))}
+        with self._lock:
+            self._scores = scores
+            self._heaps, self._members = {}, {}
+            for key in {ALL_CITIES} | {city for city, _ in scores.values()}:
+                self._rebuild(key)
+
+    def _backfill(self, db: Session):
+        # строки, созданные до появления hot_score: один раз считаем по истории лайков
+        pending = [rid for (rid,) in db.query(Route.id).filter(Route.hot_score.is_(None))]
+        for start in range(0, len(pending), 500):
+            chunk = pending[start:start + 500]
+            totals = dict.fromkeys(chunk, 0.0)
+            for route_id, created_at in db.query(RouteLike.route_id, RouteLike.created_at).filter(RouteLike.route_id.in_(chunk)):
+                totals[route_id] += self.increment(_timestamp(created_at))
+            db.execute(update(Route), [{"id": rid, "hot_score": score} for rid, score in totals.items()])
+
+    def increment(self, when: float) -> float:
+        return math.exp(DECAY * (when - self.t0))
+
+    def record_like(self, db: Session, route: Route, when: Optional[float] = None) -> Tuple[float, float]:
+        # атомарный инкремент (и, если пора, сдвиг t0) в той же транзакции, что и сам лайк;
+        # коммит — у вызывающего. Память не трогаем: (t0, инкремент) передаются в add()
+        # после успешного коммита, при откате кучи и t0 остаются как в базе
+        when = time.time() if when is None else when
+        t0 = self.t0
+        if when - t0 > RENORMALIZE_AFTER_SECONDS:
+            t0 = self._move_t0(db, t0, when)
+        inc = math.exp(DECAY * (when - t0))
+        db.execute(update(Route).where(Route.id == route.id).values(hot_score=func.coalesce(Route.hot_score, 0.0) + inc))
+        return t0, inc
+
+    def add(self, route_id: int, city: str, t0: float, inc: float):
+        with self._lock:
+            if t0 != self.t0:
+                self._rescale(t0)
+            _, score = self._scores.get(route_id, (city, 0.0))
+            self._set(route_id, city, score + inc)
+
+    def move(self, route_id: int, city: str):
+        # маршрут сменил город: переносим счёт в кучу нового города
+        with self._lock:
+            entry = self._scores.get(route_id)
+            if entry is None or entry[0] == city:
+                return
+            self._remove(route_id)
+            self._set(route_id, city, entry[1])
+
+    def renormalize(self, db: Session, when: Optional[float] = None):
+        when = time.time() if when is None else when
+        with self._lock:
+            if when - self.t0 <= 0:
+                return
+            self._rescale(self._move_t0(db, self.t0, when))
+
+    def _move_t0(self, db: Session, t0: float, when: float) -> float:
+        # только база: опорная точка, действующая после этой транзакции.
+        # Сдвиг только от своей t0: при нескольких воркерах (backend/events.py) другой мог успеть раньше
+        moved = db.execute(update(TrendingState).where(TrendingState.id == 1, TrendingState.t0 == t0).values(t0=when)).rowcount
+        if not moved:
+            return db.scalar(select(TrendingState.t0).where(TrendingState.id == 1))
+        db.execute(update(Route).where(Route.hot_score > 0).values(hot_score=Route.hot_score * math.exp(-DECAY * (when - t0))))
+        return when
+
+    def refresh(self, db: Session, route_ids):
+        # маршруты, изменённые другим воркером: счёт и город — из базы, повторное применение безвредно
+        t0 = db.scalar(select(TrendingState.t0).where(TrendingState.id == 1))
+        rows = db.execute(
+            select(Route.id, Route.city, Route.hot_score).where(Route.id.in_(route_ids), Route.deleted_at.is_(None))
+        ).all()
+        with self._lock:
+            if t0 is not None and t0 != self.t0:
+                self._rescale(t0)
+            live = set()
+            for route_id, city, score in rows:
+                live.add(route_id)
+                if score:
+                    self._set(route_id, city, score)
+            for route_id in set(route_ids) - live:
+                self._remove(route_id)
+
+    def remove(self, route_id: int):
+        with self._lock:
+            self._remove(route_id)
+
+    def clear(self):
+        with self._lock:
+            self._scores, self._heaps, self._members = {}, {}, {}
+
+    def top(self, city: Optional[str], k: int) -> List[Tuple[int, float]]:
+        # [(route_id, текущий счёт)] по убыванию
+        with self._lock:
+            best = heapq.nlargest(k, self._heaps.get(city, ()))
+            scale = math.exp(-DECAY * (time.time() - self.t0))
+        return [(rid, score * scale) for score, rid in best]
+
+    # дальше — только под self._lock
+    def _rescale(self, t0: float):
+        # положительный общий множитель сохраняет и порядок, и свойство кучи
+        factor = math.exp(-DECAY * (t0 - self.t0))
+        self.t0 = t0
+        self._scores = {rid: (city, score * factor) for rid, (city, score) in self._scores.items()}
+        self._heaps = {key: [(score * factor, rid) for score, rid in heap] for key, heap in self._heaps.items()}
+
+    def _remove(self, route_id: int):
+        entry = self._scores.pop(route_id, None)
+        if entry is None:
+            return
+        for key in (ALL_CITIES, entry[0]):
+            if route_id in self._members.get(key, ()):
+                self._rebuild(key)
+
+    def _set(self, route_id: int, city: str, score: float):
+        self._scores[route_id] = (city, score)
+        for key in (ALL_CITIES, city):
+            heap = self._heaps.setdefault(key, [])
+            members = self._members.setdefault(key, set())
+            if route_id in members:
+                # счёт только растёт: обновляем запись, K маленькое — heapify дёшев
+                idx = next(i for i, (_, rid) in enumerate(heap) if rid == route_id)
+                heap[idx] = (score, route_id)
+                heapq.heapify(heap)
+            elif len(heap) < TOP_K:
+                heapq.heappush(heap, (score, route_id))
+                members.add(route_id)
+            elif score > heap[0][0]:
+                _, dropped = heapq.heapreplace(heap, (score, route_id))
+                members.discard(dropped)
+                members.add(route_id)
+
+    def _rebuild(self, key: Optional[str]):
+        items = [(score, rid) for rid, (city, score) in self._scores.items() if key is ALL_CITIES or city == key]
+        heap = heapq.nlargest(TOP_K, items)
+        heapq.heapify(heap)
+        self._heaps[key] = heap
+        self._members[key] = {rid for _, rid in heap}
+
+
+trending = TrendingIndex()
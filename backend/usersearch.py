@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import User, normalize_login
+
+
+# Автодополнение ника для «добавить друга»: отсортированный массив ников в нижнем регистре
+# и бинарный поиск по префиксу. Совпадения лежат подряд от bisect_left(prefix), поэтому
+# запрос — O(log n + limit) без обращения к базе (LIKE 'abc%' в SQLite по индексу не идёт
+# из-за case-insensitive LIKE). Индекс строится при первом поиске, новые пользователи
+# добавляются в него при регистрации.
+
+MAX_LIMIT = 20
+
+
+class NicknameIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        # параллельные массивы: bisect по списку строк быстрее, чем по кортежам
+        self._keys: List[str] = []
+        self._ids: List[int] = []
+        self._names: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, db: Session):
+        rows = db.execute(
+            select(User.nickname_lower, User.id, User.nickname)
+            .where(User.nickname_lower.is_not(None))
+            .order_by(User.nickname_lower)
+        ).all()
+        keys, ids, names = [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]
+        # ники без nickname_lower (совпали с чужим без учёта регистра, см. миграцию 5) —
+        # ключ из Python, таких единицы
+        for user_id, nickname in db.execute(select(User.id, User.nickname).where(User.nickname_lower.is_(None))):
+            key = normalize_login(nickname)
+            pos = bisect_left(keys, key)
+            keys.insert(pos, key)
+            ids.insert(pos, user_id)
+            names.insert(pos, nickname)
+        with self._lock:
+            self._keys, self._ids, self._names = keys, ids, names
+            self._loaded = True
+
+    def ensure_loaded(self, session_factory: Callable[[], Session]):
+        if self._loaded:
+            return
+        db = session_factory()
+        try:
+            self.load(db)
+        finally:
+            db.close()
+
+    def add(self, user_id: int, nickname: str):
+        if not self._loaded:
+            return
+        key = normalize_login(nickname)
+        with self._lock:
+            pos = bisect_left(self._keys, key)
+            if pos < len(self._keys) and self._keys[pos] == key:
+                return
+            self._keys.insert(pos, key)
+            self._ids.insert(pos, user_id)
+            self._names.insert(pos, nickname)
+
+    def search(self, prefix: str, limit: int = 10, exclude: Optional[int] = None) -> List[Tuple[int, str]]:
+        # [(id, nickname)] по алфавиту; точное совпадение — первым, оно короче остальных
+        prefix = normalize_login(prefix)
+        if not prefix:
+            return []
+        limit = min(limit, MAX_LIMIT)
+        found = []
+        with self._lock:
+            keys, ids, names = self._keys, self._ids, self._names
+            pos = bisect_left(keys, prefix)
+            while pos < len(keys) and len(found) < limit and keys[pos].startswith(prefix):
+                if ids[pos] != exclude:
+                    found.append((ids[pos], names[pos]))
+                pos += 1
+        return found
+
+
+nicknames = NicknameIndex()
@@ -2,18 +2,51 @@ from __future__ import annotations
 
 from typing import Optional
 
+from sqlalchemy import or_, select
 from sqlalchemy.orm import Session
 
-from .models import User
+from .models import User, normalize_login
 
 
-def find_user_by_login_or_id(db: Session, login_or_id: str) -> Optional[User]:
-    user: Optional[User] = None
-    if login_or_id.isdigit():
-        user = db.get(User, int(login_or_id))
-    if user is None:
-        user = db.query(User).filter(User.nickname == login_or_id).first()
-    if user is None:
-        user = db.query(User).filter(User.email == login_or_id).first()
-    return user
+# Миграция 5 оставила *_lower пустым у логинов, совпавших с чужими без учёта регистра
+# («Bob» и «bob» в старой базе): таких ищем по точному значению колонки.
+def _login_condition(lower_column, column, key: str, raw: str):
+    return (lower_column == key) | (lower_column.is_(None) & (column == raw))
+
+
+def _login_matches(lower_value: Optional[str], value: str, key: str, raw: str) -> bool:
+    return lower_value == key if lower_value is not None else value == raw
+
 
+def find_user_by_email(db: Session, email: str) -> Optional[User]:
+    # точное совпадение (пользователь без email_lower) важнее совпадения без учёта регистра
+    raw = email.strip()
+    users = db.scalars(select(User).where(_login_condition(User.email_lower, User.email, normalize_login(email), raw))).all()
+    return next((u for u in users if u.email == raw), users[0] if users else None)
+
+
+def find_user_by_login_or_id(db: Session, login_or_id: str) -> Optional[User]:
+    # один запрос по индексам (id, nickname[_lower], email[_lower]), не больше нескольких строк;
+    # при нескольких совпадениях приоритет как раньше: id, затем ник, затем email
+    key = normalize_login(login_or_id)
+    if not key:
+        return None
+    raw = login_or_id.strip()
+    conditions = [
+        _login_condition(User.nickname_lower, User.nickname, key, raw),
+        _login_condition(User.email_lower, User.email, key, raw),
+    ]
+    if key.isdigit():
+        conditions.append(User.id == int(key))
+    users = db.scalars(select(User).where(or_(*conditions))).all()
+    for matches in (
+        lambda u: str(u.id) == key,
+        lambda u: u.nickname == raw,
+        lambda u: _login_matches(u.nickname_lower, u.nickname, key, raw),
+        lambda u: u.email == raw,
+        lambda u: _login_matches(u.email_lower, u.email, key, raw),
+    ):
+        for user in users:
+            if matches(user):
+                return user
+    return None
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import anyio
+
+
+BASELINES_DIR = Path(__file__).resolve().parent / "baselines"
+# Замедление медианы сильнее порога считается регрессией
+DEFAULT_THRESHOLD = 0.20
+
+
+def summarize(samples_s: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_s)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        "runs": len(ordered),
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": p95 * 1000,
+        "min_ms": ordered[0] * 1000,
+    }
+
+
+def consume(response) -> int:
+    # Размер тела ответа; потоковое тело прочитывается целиком, но в памяти не копится
+    iterator = getattr(response, "body_iterator", None)
+    if iterator is None:
+        return len(response.body)
+
+    async def read() -> int:
+        return sum([len(chunk) async for chunk in iterator])
+
+    return anyio.run(read)
+
+
+def time_calls(fn: Callable[[], object], repeat: int, warmup: int = 2) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def save(name: str, results: Dict[str, dict], meta: Optional[dict] = None) -> Path:
+    BASELINES_DIR.mkdir(exist_ok=True)
+    path = BASELINES_DIR / f"{name}.json"
+    payload = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            **(meta or {}),
+        },
+        "results": results,
+    }
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    return path
+
+
+def compare(name: str, results: Dict[str, dict], threshold: float = DEFAULT_THRESHOLD, metric: str = "median_ms") -> List[str]:
+    # Возвращает список регрессий относительно сохранённого baseline (пусто — всё в норме)
+    path = BASELINES_DIR / f"{name}.json"
+    if not path.exists():
+        return []
+    baseline = json.loads(path.read_text(encoding="utf-8"))["results"]
+    regressions = []
+    for key, current in results.items():
+        old = baseline.get(key, {}).get(metric)
+        new = current.get(metric)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        marker = "REGRESSION" if change > threshold else "ok"
+        print(f"  {key:<28} {old:10.3f} -> {new:10.3f} {metric} ({change:+.1%}) {marker}")
+        if change > threshold:
+            regressions.append(key)
+    return regressions
+
+
+def print_table(results: Dict[str, dict]):
+    for key, r in results.items():
+        extra = "".join(f"  {k}={v:.3f}" if isinstance(v, float) else f"  {k}={v}" for k, v in r.items())
+        print(f"  {key:<28}{extra}")
+
+
+def report(name: str, results: Dict[str, dict], args, meta: Optional[dict] = None) -> int:
+    # Общий хвост для всех бенчмарков: --save пишет baseline, --compare падает на регрессии
+    print_table(results)
+    code = 0
+    if args.compare:
+        print(f"compare with {BASELINES_DIR / (name + '.json')}:")
+        if compare(name, results, args.threshold):
+            code = 1
+    if args.save:
+        print(f"saved {save(name, results, meta)}")
+    return code
+
+
+def add_arguments(parser):
+    parser.add_argument("--save", action="store_true", help="сохранить результаты как baseline")
+    parser.add_argument("--compare", action="store_true", help="сравнить с сохранённым baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import bindparam, func, insert, update
+
+from backend.auth import get_password_hash
+from backend.database import DB_PATH, SessionLocal
+from backend.main import init_db, refresh_route_derived
+from backend import dailies, dedup, ledger
+from backend.models import (
+    User, FriendRequest, RequestType, RequestStatus, DailyTask, GlobalDaily, DailyCompletion, Route, RouteLike, FavoriteRoute,
+    RatingEvent, Friendship,
+)
+
+
+# Синтетические данные прямо в godate.db (или в GODATE_DB_PATH):
+#   GODATE_DB_PATH=/tmp/bench.db python -m bench.datagen --users 2000 --routes 10000
+# Пользователи: bench{i}@example.com / пароль --password
+
+CITIES = {
+    "moscow": (55.75, 37.62),
+    "spb": (59.93, 30.33),
+    "kazan": (55.79, 49.12),
+    "novosibirsk": (55.03, 82.92),
+}
+CHUNK = 5000
+
+
+def _bulk(db, model, rows):
+    for start in range(0, len(rows), CHUNK):
+        db.execute(insert(model), rows[start:start + CHUNK])
+
+
+def _max_id(db, model) -> int:
+    return db.query(func.max(model.id)).scalar() or 0
+
+
+def generate(args):
+    rnd = random.Random(args.seed)
+    now = datetime.utcnow()
+    init_db()
+    db = SessionLocal()
+    try:
+        # Users
+        first_user = _max_id(db, User) + 1
+        password_hash = get_password_hash(args.password)
+        user_ids = list(range(first_user, first_user + args.users))
+        _bulk(db, User, [{
+            "id": uid,
+            "email": f"bench{uid}@example.com",
+            "nickname": f"bench{uid}",
+            "password_hash": password_hash,
+            "rating": 0,
+            "created_at": now - timedelta(days=rnd.randint(0, 365)),
+        } for uid in user_ids])
+
+        # Friend requests: принятые/ожидающие/отклонённые, без дублей пары
+        statuses = [RequestStatus.accepted] * 6 + [RequestStatus.pending] * 3 + [RequestStatus.declined]
+        pairs = set()
+        requests_rows = []
+        friendship_rows = []
+        for uid in user_ids:
+            for other in rnd.sample(user_ids, min(args.friends, len(user_ids) - 1)):
+                if other == uid or (uid, other) in pairs or (other, uid) in pairs:
+                    continue
+                pairs.add((uid, other))
+                status = rnd.choice(statuses)
+                created_at = now - timedelta(minutes=rnd.randint(0, 60 * 24 * 90))
+                requests_rows.append({
+                    "from_user_id": uid,
+                    "to_user_id": other,
+                    "type": RequestType.friend,
+                    "status": status,
+                    "created_at": created_at,
+                    "resolved_at": created_at if status != RequestStatus.pending else None,
+                })
+                if status == RequestStatus.accepted:
+                    friendship_rows.append({"user_low_id": min(uid, other), "user_high_id": max(uid, other), "created_at": created_at})
+        _bulk(db, FriendRequest, requests_rows)
+        _bulk(db, Friendship, friendship_rows)
+
+        # Routes with points
+        first_route = _max_id(db, Route) + 1
+        route_rows = []
+        route_owner = {}
+        for rid in range(first_route, first_route + args.routes):
+            city = rnd.choice(list(CITIES))
+            base_lat, base_lon = CITIES[city]
+            owner = rnd.choice(user_ids)
+            route_owner[rid] = owner
+            title = f"Маршрут {rid}"
+            points = [{
+                "name": f"Точка {j + 1}",
+                "description": None,
+                "lat": base_lat + rnd.uniform(-0.05, 0.05),
+                "lon": base_lon + rnd.uniform(-0.05, 0.05),
+            } for j in range(rnd.randint(1, args.points))]
+            if route_rows and rnd.random() < args.duplicates:
+                # почти-дубликат: чужие точки со сдвигом до ~10 м в другом порядке (backend/dedup.py)
+                source = rnd.choice(route_rows)
+                city, title = source["city"], source["title"]
+                points = [dict(p, lat=p["lat"] + rnd.uniform(-1e-4, 1e-4), lon=p["lon"] + rnd.uniform(-1e-4, 1e-4)) for p in json.loads(source["points_json"])]
+                rnd.shuffle(points)
+            r = Route(
+                id=rid,
+                creator_user_id=owner,
+                title=title,
+                description=rnd.choice(["Прогулка и кофе", "Музеи и ужин", "Парк, кино, набережная"]),
+                city=city,
+                time_minutes=rnd.randint(30, 360),
+                budget=rnd.choice([0, 500, 1000, 2000, 3500, 5000, 10000]),
+                points_json=json.dumps(points),
+                created_at=now - timedelta(minutes=rnd.randint(0, 60 * 24 * 180)),
+            )
+            refresh_route_derived(r)
+            route_rows.append({
+                "id": r.id,
+                "creator_user_id": r.creator_user_id,
+                "title": r.title,
+                "description": r.description,
+                "city": r.city,
+                "time_minutes": r.time_minutes,
+                "budget": r.budget,
+                "points_json": r.points_json,
+                "public_json": r.public_json,
+                "public_polyline_json": r.public_polyline_json,
+                "public_json_version": r.public_json_version,
+                "distance_m": r.distance_m,
+                "points_count": r.points_count,
+                "created_at": r.created_at,
+            })
+        _bulk(db, Route, route_rows)
+        dedup.rebuild(db)
+
+        # Likes & favorites: популярность по Ципфу, чтобы были «горячие» маршруты
+        route_ids = list(route_owner)
+        weights = [1 / (i + 1) for i in range(len(route_ids))]
+        like_rows, fav_rows = [], []
+        for uid in user_ids:
+            liked = set(rnd.choices(route_ids, weights=weights, k=args.likes)) if route_ids else set()
+            for rid in liked:
+                if route_owner[rid] == uid:
+                    continue
+                like_rows.append({"route_id": rid, "user_id": uid, "created_at": now - timedelta(minutes=rnd.randint(0, 60 * 24 * 30))})
+            favs = set(rnd.choices(route_ids, weights=weights, k=args.favorites)) if route_ids else set()
+            for rid in favs:
+                fav_rows.append({"route_id": rid, "user_id": uid, "created_at": now - timedelta(minutes=rnd.randint(0, 60 * 24 * 30))})
+        _bulk(db, RouteLike, like_rows)
+        _bulk(db, FavoriteRoute, fav_rows)
+
+        # Dailies: глобальное задание на каждый день и выполнения
+        tasks = db.query(DailyTask).all()
+        taken = {d for (d,) in db.query(GlobalDaily.date).all()}
+        days = []
+        for back in range(args.days):
+            day = date.today() - timedelta(days=back)
+            if day in taken:
+                continue
+            task = rnd.choice(tasks)
+            days.append((day, task))
+        _bulk(db, GlobalDaily, [{"date": day, "task_id": task.id} for day, task in days])
+        completion_rows = []
+        event_rows = []
+        rating = {uid: 0 for uid in user_ids}
+        for day, task in days:
+            for uid in user_ids:
+                if rnd.random() < args.completion_rate:
+                    completion_rows.append({"user_id": uid, "date": day, "task_id": task.id})
+                    event_rows.append({
+                        "user_id": uid, "delta": task.reward_points, "reason": ledger.DAILY,
+                        "ref": day.isoformat(), "created_at": datetime.combine(day, datetime.min.time()),
+                    })
+                    rating[uid] += task.reward_points
+        _bulk(db, DailyCompletion, completion_rows)
+        # счётчики дней и серии, как если бы выполнения шли через complete_daily
+        dailies.rebuild(db)
+        # журнал рейтинга и снапшоты периодов, как если бы начисления шли через ledger.award
+        _bulk(db, RatingEvent, event_rows)
+        ledger.rebuild_snapshots(db)
+        rating_rows = [{"uid": uid, "new_rating": r} for uid, r in rating.items() if r]
+        if rating_rows:
+            db.execute(
+                update(User.__table__).where(User.__table__.c.id == bindparam("uid")).values(rating=bindparam("new_rating")),
+                rating_rows,
+            )
+        db.commit()
+        return {
+            "users": len(user_ids),
+            "friend_requests": len(requests_rows),
+            "routes": len(route_rows),
+            "likes": len(like_rows),
+            "favorites": len(fav_rows),
+            "daily_completions": len(completion_rows),
+        }
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор синтетических данных для бенчмарков")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--friends", type=int, default=10, help="заявок в друзья на пользователя")
+    parser.add_argument("--routes", type=int, default=5000)
+    parser.add_argument("--points", type=int, default=6, help="максимум точек в маршруте")
+    parser.add_argument("--duplicates", type=float, default=0.02, help="доля почти-дубликатов среди маршрутов")
+    parser.add_argument("--likes", type=int, default=20, help="лайков на пользователя")
+    parser.add_argument("--favorites", type=int, default=5, help="избранных на пользователя")
+    parser.add_argument("--days", type=int, default=30, help="дней истории дейликов")
+    parser.add_argument("--completion-rate", type=float, default=0.3)
+    parser.add_argument("--password", default="benchpass")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    counts = generate(args)
+    print(f"{DB_PATH}: " + ", ".join(f"{k}={v}" for k, v in counts.items()) + f" in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
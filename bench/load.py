@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import requests
+
+from . import baseline
+
+
+# Локальная HTTP-нагрузка смесью сценариев. Без --url поднимает uvicorn на свободном порту
+# поверх GODATE_DB_PATH (данные — из python -m bench.datagen):
+#   GODATE_DB_PATH=/tmp/bench.db python -m bench.load --duration 20 --concurrency 8 --compare
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# (имя, вес, метод, путь, нужна авторизация, допустимые статусы)
+SCENARIOS = [
+    ("routes_list", 20, "GET", "/api/routes", False, {200}),
+    ("routes_city", 15, "GET", "/api/routes?city=moscow", False, {200}),
+    ("me", 15, "GET", "/api/users/me", True, {200}),
+    ("messages", 10, "GET", "/api/messages", True, {200}),
+    ("daily_today", 10, "GET", "/api/dailies/today", True, {200}),
+    ("favorites", 10, "GET", "/api/routes/favorites", True, {200}),
+    ("rating", 10, "GET", "/api/rating", False, {200}),
+    # повторный лайк отвечает 400 — это штатный путь обработчика
+    ("like", 10, "POST", "/api/routes/like", True, {200, 400}),
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def spawn_server(workers: int = 1):
+    port = _free_port()
+    cmd = [sys.executable, "-m", "backend.serve", "--port", str(port), "--workers", str(workers), "--log-level", "warning"]
+    # один клиент с одного IP — лимитер выключен, если явно не задан GODATE_RATE_LIMIT
+    env = {"GODATE_RATE_LIMIT": "0", **os.environ}
+    proc = subprocess.Popen(cmd, cwd=ROOT_DIR, env=env)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            if requests.get(f"{url}/api/health", timeout=0.5).ok:
+                return proc, url
+        except requests.RequestException:
+            pass
+        if proc.poll() is not None:
+            raise SystemExit("uvicorn завершился при старте")
+        time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit("uvicorn не поднялся за 20 секунд")
+
+
+def login_users(url: str, count: int, password: str):
+    tokens = []
+    for uid in range(1, count * 5):
+        if len(tokens) >= count:
+            break
+        resp = requests.post(f"{url}/api/auth/login", data={"username": f"bench{uid}@example.com", "password": password})
+        if resp.ok:
+            tokens.append(resp.json()["access_token"])
+    if not tokens:
+        raise SystemExit("Не удалось войти ни одним bench-пользователем: запустите python -m bench.datagen")
+    return tokens
+
+
+def run_load(url: str, tokens, duration: float, concurrency: int, seed: int, max_route_id: int):
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    weights = [s[1] for s in SCENARIOS]
+
+    def worker(idx: int):
+        rnd = random.Random(seed + idx)
+        session = requests.Session()
+        token = tokens[idx % len(tokens)]
+        local = defaultdict(list)
+        local_errors = defaultdict(int)
+        while time.perf_counter() < deadline:
+            name, _, method, path, auth, ok_statuses = rnd.choices(SCENARIOS, weights=weights)[0]
+            headers = {"Authorization": f"Bearer {token}"} if auth else {}
+            body = {"route_id": rnd.randint(1, max_route_id)} if method == "POST" else None
+            started = time.perf_counter()
+            try:
+                resp = session.request(method, url + path, headers=headers, json=body, timeout=30)
+                status = resp.status_code
+            except requests.RequestException:
+                status = 0
+            elapsed = time.perf_counter() - started
+            local[name].append(elapsed)
+            if status not in ok_statuses:
+                local_errors[name] += 1
+        with lock:
+            for key, values in local.items():
+                samples[key].extend(values)
+            for key, value in local_errors.items():
+                errors[key] += value
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    results = {}
+    everything = []
+    for name, values in sorted(samples.items()):
+        everything.extend(values)
+        results[name] = {**baseline.summarize(values), "errors": errors.get(name, 0)}
+    results["_total"] = {**baseline.summarize(everything), "requests": len(everything), "rps": len(everything) / wall, "errors": sum(errors.values())}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP-нагрузка смесью сценариев GOdate")
+    parser.add_argument("--url", help="адрес уже запущенного сервера; без него поднимается локальный uvicorn")
+    parser.add_argument("--workers", type=int, default=1, help="число процессов uvicorn для локального сервера")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--users", type=int, default=20, help="виртуальных пользователей (логинов)")
+    parser.add_argument("--password", default="benchpass")
+    parser.add_argument("--routes", type=int, default=5000, help="диапазон id маршрутов для лайков")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--name", default="load", help="имя baseline-файла")
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    proc = None
+    url = args.url
+    if not url:
+        proc, url = spawn_server(args.workers)
+    try:
+        tokens = login_users(url, args.users, args.password)
+        results = run_load(url, tokens, args.duration, args.concurrency, args.seed, args.routes)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+    total = results["_total"]
+    print(f"load {url}: {total['requests']} requests, {total['rps']:.1f} rps, {total['errors']} errors")
+    meta = {"url": url, "duration": args.duration, "concurrency": args.concurrency, "workers": args.workers}
+    raise SystemExit(baseline.report(args.name, results, args, meta))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from pydantic import TypeAdapter
+from sqlalchemy import func
+from starlette.requests import Request
+
+from backend import main
+from backend.database import DB_PATH, SessionLocal
+from backend.fragments import json_list_response, stitch_list
+from backend.models import Route, User
+from backend.schemas import RatingItem, RouteFilters
+
+from . import baseline
+
+
+# Пиковая память и время длинных списков: прежний путь (вся выборка и всё тело в памяти)
+# против потокового (backend.main._stream_route_fragments / _stream_rating). Нужна база
+# с большим числом маршрутов:
+#   GODATE_DB_PATH=/tmp/bench100k.db python -m bench.datagen --users 5000 --routes 100000
+#   GODATE_DB_PATH=/tmp/bench100k.db python -m bench.memory --compare
+
+_RATING = TypeAdapter(List[RatingItem])
+
+
+def _request(gzip: bool) -> Request:
+    headers = [(b"accept-encoding", b"gzip")] if gzip else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers, "query_string": b""})
+
+
+def _routes_materialized(db, gzip: bool) -> int:
+    rows = main._route_fragments(db, main._filter_routes(main._live_routes(db), RouteFilters()))
+    return baseline.consume(json_list_response(_request(gzip), stitch_list(rows)))
+
+
+def _routes_streamed(db, gzip: bool) -> int:
+    return baseline.consume(main.list_routes(request=_request(gzip), filters=RouteFilters(), viewer=None, db=db))
+
+
+def _rating_materialized(db, gzip: bool) -> int:
+    users = db.query(User).order_by(User.rating.desc()).all()
+    items = [RatingItem(user_id=u.id, nickname=u.nickname, rating=u.rating) for u in users]
+    return baseline.consume(json_list_response(_request(gzip), _RATING.dump_json(items)))
+
+
+def _rating_streamed(db, gzip: bool) -> int:
+    return baseline.consume(main.rating(request=_request(gzip), db=db))
+
+
+def measure(fn: Callable[[], int], repeat: int) -> Dict[str, float]:
+    # время — без tracemalloc (он замедляет аллокации в разы), пик памяти — отдельным прогоном
+    result = baseline.time_calls(fn, repeat, warmup=1)
+    tracemalloc.start()
+    try:
+        size = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    result["peak_mb"] = peak / 2**20
+    result["body_kb"] = size / 1024
+    return result
+
+
+def run(repeat: int, gzip: bool):
+    cases = {
+        "routes_materialized": _routes_materialized,
+        "routes_streamed": _routes_streamed,
+        "rating_materialized": _rating_materialized,
+        "rating_streamed": _rating_streamed,
+    }
+    db = SessionLocal()
+    try:
+        meta = {
+            "db": str(DB_PATH),
+            "users": db.query(func.count(User.id)).scalar(),
+            "routes": db.query(func.count(Route.id)).scalar(),
+            "gzip": gzip,
+        }
+        if not meta["routes"]:
+            raise SystemExit(f"{DB_PATH}: нет маршрутов, сначала запустите python -m bench.datagen")
+        results = {}
+        for name, fn in cases.items():
+            results[name] = measure(lambda: fn(db, gzip), repeat)
+            db.expunge_all()
+        return results, meta
+    finally:
+        db.close()
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Пиковая память длинных списков: целиком в памяти против потока")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-gzip", action="store_true", help="клиент без Accept-Encoding: gzip")
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+    started = time.perf_counter()
+    results, meta = run(args.repeat, not args.no_gzip)
+    print(f"memory ({meta['users']} users, {meta['routes']} routes, gzip={meta['gzip']}, {time.perf_counter() - started:.0f} s):")
+    return baseline.report("memory", results, args, meta)
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
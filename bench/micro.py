@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import argparse
+
+from sqlalchemy import func
+from starlette.requests import Request
+from starlette.responses import Response
+
+from backend import main
+from backend.auth import create_access_token, get_current_user
+from backend.database import DB_PATH, SessionLocal
+from backend.models import User, FriendRequest, Route, RouteLike
+from backend.schemas import RouteFilters
+from backend.utils import find_user_by_login_or_id
+
+from . import baseline
+
+
+# Микробенчмарки горячих обработчиков, вызываются напрямую, без HTTP:
+#   GODATE_DB_PATH=/tmp/bench.db python -m bench.micro --compare
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": [(b"accept-encoding", b"gzip")], "query_string": b""})
+
+
+def _pick_users(db):
+    # самые «тяжёлые» пользователи: больше всего заявок и лайков на маршрутах
+    busiest = (
+        db.query(FriendRequest.to_user_id, func.count())
+        .group_by(FriendRequest.to_user_id).order_by(func.count().desc()).first()
+    )
+    author = (
+        db.query(Route.creator_user_id, func.count(RouteLike.id))
+        .join(RouteLike, RouteLike.route_id == Route.id)
+        .filter(Route.creator_user_id.isnot(None))
+        .group_by(Route.creator_user_id).order_by(func.count(RouteLike.id).desc()).first()
+    )
+    any_user = db.query(User.id).order_by(User.id).first()
+    if any_user is None:
+        raise SystemExit(f"{DB_PATH}: нет пользователей, сначала запустите python -m bench.datagen")
+    viewer = db.get(User, busiest[0] if busiest else any_user[0])
+    owner = db.get(User, author[0] if author else any_user[0])
+    return viewer, owner
+
+
+def run(repeat: int):
+    db = SessionLocal()
+    try:
+        viewer, owner = _pick_users(db)
+        token = create_access_token({"sub": str(viewer.id)})
+        city = db.query(Route.city).group_by(Route.city).order_by(func.count().desc()).limit(1).scalar()
+        cases = {
+            "list_routes": lambda: baseline.consume(main.list_routes(request=_request(), filters=RouteFilters(), viewer=None, db=db)),
+            "list_routes_city": lambda: baseline.consume(main.list_routes(request=_request(), filters=RouteFilters(city=city), viewer=None, db=db)),
+            "get_me": lambda: main.get_me(request=_request(), response=Response(), current=viewer, db=db),
+            "get_messages": lambda: main.get_messages(current=viewer, db=db),
+            "daily_today": lambda: main.get_daily_today(current=viewer, db=db),
+            "daily_stats": lambda: main.get_daily_stats(days=30, current=viewer, db=db),
+            "bootstrap": lambda: main.bootstrap(request=_request(), include="me,daily,messages,routes", filters=RouteFilters(city=city), current=viewer, db=db),
+            "_award_rating_for_likes": lambda: main._award_rating_for_likes(db, owner),
+            "get_current_user": lambda: get_current_user(db=db, token=token),
+            "find_user_by_login_or_id": lambda: find_user_by_login_or_id(db, owner.email.upper()),
+            "search_users": lambda: main.search_users(prefix=owner.nickname[:3], limit=10, current=viewer),
+        }
+        results = {}
+        for name, fn in cases.items():
+            results[name] = baseline.time_calls(fn, repeat)
+            # сбрасываем identity map, чтобы каждый кейс читал из базы, а не из кэша сессии
+            db.expire_all()
+        meta = {
+            "db": str(DB_PATH),
+            "users": db.query(func.count(User.id)).scalar(),
+            "routes": db.query(func.count(Route.id)).scalar(),
+            "likes": db.query(func.count(RouteLike.id)).scalar(),
+        }
+        return results, meta
+    finally:
+        db.close()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Микробенчмарки горячих функций backend.main")
+    parser.add_argument("--repeat", type=int, default=30)
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+    results, meta = run(args.repeat)
+    print(f"micro ({meta['users']} users, {meta['routes']} routes, {meta['likes']} likes):")
+    raise SystemExit(baseline.report("micro", results, args, meta))
+
+
+if __name__ == "__main__":
+    main_cli()
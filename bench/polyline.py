@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import sys
+
+from backend import polyline
+from backend.fragments import GZIP_LEVEL, render_route, render_route_polyline, stitch_list
+
+from . import baseline
+from .serialization import make_routes
+
+
+# Размер и CPU списка маршрутов с ?points=polyline против обычного формата (lat/lon объектами):
+#   python -m bench.polyline --routes 1000 --points 8 --compare
+# render_* — пересчёт фрагментов при записи, stitch_* — сборка ответа, decode — разбор
+# всех polyline на клиенте (в Python, для порядка величин).
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Список маршрутов: точки объектами против encoded polyline")
+    parser.add_argument("--routes", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    routes = make_routes(args.routes, args.points)
+    full = [(r.public_json, 3) for r in routes]
+    compact = [(r.public_polyline_json, 3) for r in routes]
+    encoded = [json.loads(fragment)["polyline"] for fragment, _ in compact]
+    for r, line in zip(routes, encoded[:50]):
+        expected = [(round(p["lat"], 6), round(p["lon"], 6)) for p in json.loads(r.points_json)]
+        assert polyline.decode(line) == expected
+
+    results = {
+        "render_full": baseline.time_calls(lambda: [render_route(r) for r in routes], args.repeat),
+        "render_polyline": baseline.time_calls(lambda: [render_route_polyline(r) for r in routes], args.repeat),
+        "stitch_full": baseline.time_calls(lambda: stitch_list(full), args.repeat),
+        "stitch_polyline": baseline.time_calls(lambda: stitch_list(compact), args.repeat),
+        "decode": baseline.time_calls(lambda: [polyline.decode(line) for line in encoded], args.repeat),
+    }
+    for name, rows in (("full", full), ("polyline", compact)):
+        body = stitch_list(rows)
+        results[f"stitch_{name}"]["body_bytes"] = len(body)
+        results[f"stitch_{name}"]["gzip_bytes"] = len(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    ratio = results["stitch_full"]["body_bytes"] / results["stitch_polyline"]["body_bytes"]
+    gzip_ratio = results["stitch_full"]["gzip_bytes"] / results["stitch_polyline"]["gzip_bytes"]
+    print(f"{args.routes} routes, {args.points} points each (polyline body x{ratio:.1f} smaller, gzip x{gzip_ratio:.1f}):")
+    meta = {"routes": args.routes, "points": args.points}
+    return baseline.report("polyline", results, args, meta)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import List, Tuple
+
+
+# Бюджеты SQL-запросов на горячие эндпоинты: каждый запрос сценария выполняется внутри
+# backend.sqldebug.assert_max_queries, превышение (обычно — N+1 в новом коде) — код 1.
+# Работает на копии базы bench.datagen, число запросов от объёма данных зависеть не должно:
+#   GODATE_DB_PATH=/tmp/bench.db python -m bench.querybudget
+#   python -m bench.querybudget --db /tmp/bench.db --verbose
+
+# (метод, путь, с токеном, тело, бюджет запросов); {city}/{route} подставляются из базы.
+# В бюджет входят выборка пользователя по токену и проверка ETag.
+BUDGETS: List[Tuple[str, str, bool, object, int]] = [
+    ("GET", "/api/users/me", True, None, 4),
+    ("GET", "/api/messages", True, None, 4),
+    ("GET", "/api/dailies/today", True, None, 4),
+    ("GET", "/api/dailies/stats?days=30", True, None, 2),
+    ("GET", "/api/routes", False, None, 2),
+    # с токеном флаги liked_by_me/favorited_by_me — запрос на пачку строк, поэтому с limit
+    ("GET", "/api/routes?limit=50", True, None, 4),
+    ("GET", "/api/routes?city={city}&sort=budget&limit=20", True, None, 4),
+    ("GET", "/api/routes/favorites", True, None, 4),
+    ("GET", "/api/routes/mine", True, None, 3),
+    ("GET", "/api/routes/trending", True, None, 3),
+    ("GET", "/api/rating", False, None, 2),
+    ("GET", "/api/rating/leaderboard?period=week", False, None, 2),
+    ("GET", "/api/users/search?prefix=bench1", True, None, 1),
+    ("GET", "/api/bootstrap?include=me,daily,messages,routes,favorites,mine", True, None, 15),
+    ("POST", "/api/routes/like", True, {"route_id": "{route}"}, 12),
+    ("POST", "/api/routes/favorite", True, {"route_id": "{route}"}, 7),
+    ("POST", "/api/dailies/complete", True, None, 14),
+]
+
+
+def _fill(value, ids: dict):
+    if isinstance(value, str):
+        return value.format(**ids)
+    if isinstance(value, dict):
+        filled = {key: _fill(item, ids) for key, item in value.items()}
+        return {key: int(item) if key.endswith("_id") else item for key, item in filled.items()}
+    return value
+
+
+def run(db_path: Path, verbose: bool) -> int:
+    os.environ["GODATE_DB_PATH"] = str(db_path)
+    os.environ.setdefault("GODATE_RATE_LIMIT", "0")
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func, select
+
+    from backend import main
+    from backend.auth import create_access_token
+    from backend.database import SessionLocal
+    from backend.models import Route, User
+    from backend.sqldebug import assert_max_queries
+
+    main.init_db()
+    db = SessionLocal()
+    try:
+        viewer_id = db.scalar(select(func.min(User.id)).where(User.email.like("bench%")))
+        if viewer_id is None:
+            raise SystemExit(f"{db_path}: нет данных, сначала запустите python -m bench.datagen")
+        ids = {
+            "city": db.scalar(select(Route.city).group_by(Route.city).order_by(func.count().desc()).limit(1)),
+            "route": db.scalar(
+                select(Route.id).where(Route.creator_user_id != viewer_id, Route.deleted_at.is_(None)).order_by(Route.id.desc()).limit(1)
+            ),
+        }
+    finally:
+        db.close()
+
+    client = TestClient(main.app)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(viewer_id)})}"}
+    # прогрев: ленивые индексы в памяти и модель рекомендаций строятся при первом обращении
+    client.get("/api/users/search?prefix=bench1", headers=headers)
+
+    failures = 0
+    for method, path, auth, body, budget in BUDGETS:
+        path = _fill(path, ids)
+        try:
+            with assert_max_queries(budget) as log:
+                response = client.request(method, path, headers=headers if auth else {}, json=_fill(body, ids))
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL {method} {path}{' (auth)' if auth else ''}: {e}")
+            continue
+        if response.status_code >= 500:
+            raise SystemExit(f"{method} {path}: {response.status_code} {response.text[:200]}")
+        if verbose:
+            print(f"ok   {method} {path}{' (auth)' if auth else ''}: {log.count}/{budget}")
+    print(f"querybudget: {len(BUDGETS)} requests, {failures} over budget")
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бюджеты числа SQL-запросов на горячие эндпоинты")
+    parser.add_argument("--db", type=Path, default=None, help="база bench.datagen (по умолчанию GODATE_DB_PATH)")
+    parser.add_argument("--verbose", action="store_true", help="печатать число запросов каждого эндпоинта")
+    args = parser.parse_args()
+    source = args.db or Path(os.environ.get("GODATE_DB_PATH", ""))
+    if not source.is_file():
+        parser.error("укажите --db или GODATE_DB_PATH с данными bench.datagen")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # like/favorite/complete пишут в базу — работаем с копией
+        db_path = Path(tmp) / "godate.db"
+        shutil.copy(source, db_path)
+        return run(db_path, args.verbose)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+# Регрессии планов запросов: сценарий проходит по эндпоинтам backend.main на копии базы
+# bench.datagen, записывает каждый выполненный SELECT/UPDATE/DELETE и прогоняет его через
+# EXPLAIN QUERY PLAN. Код 1, если запрос читает таблицу полным SCAN без индекса или
+# сортирует во временном B-tree — кроме ALLOWED ниже, где это осознанно.
+#   GODATE_DB_PATH=/tmp/bench.db python -m bench.queryplans
+#   python -m bench.queryplans --db /tmp/bench.db --verbose
+
+# (регулярное выражение по форме запроса, месту вызова или строке плана; причина)
+ALLOWED: List[Tuple[str, str]] = [
+    (r"\bdaily_tasks\b", "справочник из нескольких строк"),
+    (r"\btrending_state\b", "одна строка"),
+    (r"ix_routes_deleted|ix_friend_requests_resolved", "частичный индекс: в нём только строки очереди"),
+    (r"^recommender\.py", "модель рекомендаций строится по всем лайкам и избранному"),
+    (r"FROM users ORDER BY users\.rating DESC", "рейтинг отдаёт всех пользователей — обход ix_users_rating без сортировки"),
+    (r"FROM routes WHERE routes\.deleted_at IS NULL ORDER BY", "лента без фильтров — обход индекса колонки сортировки, с limit — ранний выход"),
+    (r"count\(\*\) AS count_1 FROM friend_requests_archive$", "админский статус архива"),
+    (r"^dedup\.py:\d+ in clusters$", "админский поиск кластеров дубликатов по всему каталогу"),
+    (r"JOIN favorite_routes .* ORDER BY favorite_routes\.id$", "избранное одного пользователя: сортировка десятков строк дешевле отдельного индекса (user_id) на запись"),
+]
+
+# любой SCAN — обход всей таблицы или всего индекса; допустимы только SEARCH
+_FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)")
+_TEMP_SORT = re.compile(r"USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT|RIGHT PART OF ORDER BY)")
+
+
+def violations(plan: List[str]) -> List[str]:
+    return [detail for detail in plan if _FULL_SCAN.match(detail) or _TEMP_SORT.search(detail)]
+
+
+def allowed(shape: str, site: str, detail: str) -> bool:
+    return any(re.search(pattern, text) for pattern, _ in ALLOWED for text in (shape, site, detail))
+
+
+def scenario(client, headers: Dict[str, str], ids: Dict[str, int]):
+    # чтение — основные экраны, потом записи, которые меняют копию базы
+    city = ids["city"]
+    reads = [
+        "/api/users/me",
+        "/api/messages",
+        "/api/dailies/today",
+        "/api/dailies/stats?days=30",
+        "/api/routes",
+        "/api/routes?limit=20",
+        f"/api/routes?city={city}",
+        f"/api/routes?city={city}&sort=budget&max_budget=3000",
+        f"/api/routes?city={city}&sort=-distance&limit=20",
+        f"/api/routes?city={city}&sort=time&min_time=30&max_time=120",
+        "/api/routes?sort=budget&limit=20",
+        "/api/routes/mine",
+        "/api/routes/favorites",
+        "/api/routes/trending",
+        "/api/rating",
+        "/api/rating/leaderboard?period=week",
+        "/api/rating/leaderboard?period=month&limit=10",
+        "/api/rating/history?period=week",
+        "/api/users/search?prefix=bench1",
+        "/api/bootstrap?include=me,daily,messages,routes,favorites,mine",
+        "/api/recommendations/routes",
+    ]
+    if ids["own_route"]:
+        reads.append(f"/api/routes/{ids['own_route']}")
+    for path in reads:
+        response = client.get(path, headers=headers)
+        if response.status_code >= 400:
+            raise SystemExit(f"GET {path}: {response.status_code} {response.text[:200]}")
+    writes = [
+        ("POST", "/api/users/request", {"login_or_id": str(ids["stranger"]), "type": "friend"}),
+        ("POST", "/api/routes/like", {"route_id": ids["route"]}),
+        ("POST", "/api/routes/favorite", {"route_id": ids["route"]}),
+        ("DELETE", f"/api/routes/favorite/{ids['route']}", None),
+        ("POST", "/api/dailies/complete", None),
+        ("POST", "/api/routes", {"title": "Прогулка", "description": "", "city": "bench", "time_minutes": 60, "budget": 0,
+                                 "points": [{"name": "A", "lat": 55.75, "lon": 37.62}, {"name": "B", "lat": 55.76, "lon": 37.63}]}),
+        ("DELETE", "/api/users/friend", {"friend_id": ids["friend"]}),
+    ]
+    if ids["own_route"]:
+        # помеченный маршрут потом удаляет purger.run_once
+        writes.append(("DELETE", f"/api/routes/{ids['own_route']}", None))
+    for method, path, body in writes:
+        client.request(method, path, headers=headers, json=body)
+
+
+def capture(db_path: Path) -> Dict[str, Tuple[str, List[str], str]]:
+    # {форма запроса: (сам запрос, план, место вызова)}
+    os.environ["GODATE_DB_PATH"] = str(db_path)
+    os.environ.setdefault("GODATE_RATE_LIMIT", "0")
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event, func, select
+
+    from backend import main
+    from backend import dedup
+    from backend.archiver import archiver
+    from backend.auth import create_access_token
+    from backend.database import SessionLocal, engine
+    from backend.models import FriendRequest, Friendship, Route, User
+    from backend.purger import purger
+    from backend.sqldebug import call_site, statement_shape
+
+    main.init_db()
+    db = SessionLocal()
+    try:
+        viewer_id = db.scalar(
+            select(FriendRequest.to_user_id).group_by(FriendRequest.to_user_id).order_by(func.count().desc()).limit(1)
+        )
+        if viewer_id is None:
+            raise SystemExit(f"{db_path}: нет данных, сначала запустите python -m bench.datagen")
+        friend = db.scalar(select(Friendship.user_high_id).where(Friendship.user_low_id == viewer_id).limit(1))
+        friend = friend or db.scalar(select(Friendship.user_low_id).where(Friendship.user_high_id == viewer_id).limit(1))
+        route = db.scalar(select(Route.id).where(Route.creator_user_id != viewer_id, Route.deleted_at.is_(None)).order_by(Route.id.desc()).limit(1))
+        ids = {
+            "route": route,
+            "own_route": db.scalar(select(Route.id).where(Route.creator_user_id == viewer_id, Route.deleted_at.is_(None)).limit(1)),
+            "friend": friend or 0,
+            "stranger": db.scalar(select(func.max(User.id))),
+            "city": db.scalar(select(Route.city).group_by(Route.city).order_by(func.count().desc()).limit(1)),
+        }
+        owner = db.get(User, db.scalar(select(Route.creator_user_id).where(Route.id == route)) or viewer_id)
+    finally:
+        db.close()
+
+    captured: Dict[str, Tuple[str, List[str], str]] = {}
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        head = statement.lstrip().split(None, 1)[0].upper()
+        if executemany or head not in {"SELECT", "UPDATE", "DELETE"}:
+            return
+        shape = statement_shape(statement)
+        if shape in captured:
+            return
+        rows = conn.connection.driver_connection.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        captured[shape] = (statement, [str(row[-1]) for row in rows], call_site())
+
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(viewer_id)})}"}
+    scenario(TestClient(main.app), headers, ids)
+
+    # фоновые задачи и служебные пути, которые сценарий не вызывает
+    db = SessionLocal()
+    try:
+        main.find_user_by_login_or_id(db, owner.nickname.upper())
+        main.find_user_by_login_or_id(db, str(owner.id))
+        main._award_rating_for_likes(db, owner)
+        purger.status(db)
+        archiver.status(db)
+        dedup.clusters(db)
+    finally:
+        db.close()
+    purger.run_once(SessionLocal)
+    archiver.run_once(SessionLocal)
+    return captured
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN для запросов backend.main")
+    parser.add_argument("--db", type=Path, default=None, help="база bench.datagen (по умолчанию GODATE_DB_PATH)")
+    parser.add_argument("--verbose", action="store_true", help="печатать план каждого запроса")
+    args = parser.parse_args()
+    source = args.db or Path(os.environ.get("GODATE_DB_PATH", ""))
+    if not source.is_file():
+        parser.error("укажите --db или GODATE_DB_PATH с данными bench.datagen")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # сценарий пишет в базу — работаем с копией
+        db_path = Path(tmp) / "godate.db"
+        shutil.copy(source, db_path)
+        captured = capture(db_path)
+
+    failures = 0
+    for shape, (statement, plan, site) in sorted(captured.items(), key=lambda kv: kv[1][2]):
+        bad = [detail for detail in violations(plan) if not allowed(shape, site, detail)]
+        if bad:
+            failures += 1
+        if bad or args.verbose:
+            print(f"{'FAIL' if bad else 'ok  '} {site}")
+            print(f"     {shape[:300]}")
+            for detail in plan:
+                print(f"       {'!' if detail in bad else ' '} {detail}")
+    print(f"queryplans: {len(captured)} queries, {failures} regressions")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from collections import defaultdict
+
+from backend.database import DB_PATH, SessionLocal
+from backend.recommender import build_model, load_interactions, top_k
+
+from . import baseline
+
+
+# Офлайн-оценка рекомендателя: leave-one-out по пользователям с >= 2 действиями.
+# Скрытое действие должно попасть в top-K, построенный по остальным:
+#   GODATE_DB_PATH=/tmp/bench.db python -m bench.recommender_eval --k 10
+
+
+def split(interactions, seed: int):
+    by_user = defaultdict(list)
+    for user_id, route_id, weight in interactions:
+        by_user[user_id].append((route_id, weight))
+    rnd = random.Random(seed)
+    train, held_out = [], {}
+    for user_id, items in by_user.items():
+        distinct = sorted({r for r, _ in items})
+        if len(distinct) >= 2:
+            held = rnd.choice(distinct)
+            held_out[user_id] = held
+            items = [(r, w) for r, w in items if r != held]
+        train.extend((user_id, r, w) for r, w in items)
+    return train, held_out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="recall@K и время сборки item-item рекомендателя")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--max-users", type=int, default=5000, help="сколько пользователей оценивать")
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        interactions, routes = load_interactions(db)
+    finally:
+        db.close()
+    if not interactions:
+        raise SystemExit(f"{DB_PATH}: нет лайков/избранного, сначала запустите python -m bench.datagen")
+    train, held_out = split(interactions, args.seed)
+    city_of = dict(routes)
+
+    started = time.perf_counter()
+    model = build_model(train, routes)
+    build_s = time.perf_counter() - started
+
+    users = list(held_out.items())[:args.max_users]
+    seen = defaultdict(set)
+    for user_id, route_id, _ in train:
+        seen[user_id].add(route_id)
+    popular = [int(model.route_ids[c]) for c in model.popular]
+    hits = hits_city = hits_popular = 0
+    lookups = []
+    for user_id, held in users:
+        t = time.perf_counter()
+        recs = top_k(model, user_id, args.k)
+        lookups.append(time.perf_counter() - t)
+        hits += held in recs
+        hits_city += held in top_k(model, user_id, args.k, city=city_of.get(held))
+        top_popular = []
+        for route_id in popular:
+            if len(top_popular) >= args.k:
+                break
+            if route_id not in seen[user_id]:
+                top_popular.append(route_id)
+        hits_popular += held in top_popular
+
+    n = max(len(users), 1)
+    results = {
+        "build": {"median_ms": build_s * 1000, "routes": len(routes), "interactions": len(train), "nnz_similarity": int(model.similarity.nnz)},
+        "lookup": baseline.summarize(lookups) if lookups else {},
+        f"recall@{args.k}": {"item_item": hits / n, "item_item_city": hits_city / n, "popularity": hits_popular / n, "users": len(users)},
+    }
+    print(f"{DB_PATH}: {len(users)} users evaluated")
+    raise SystemExit(baseline.report("recommender", results, args, {"k": args.k}))
+
+
+if __name__ == "__main__":
+    main()
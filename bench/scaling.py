@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from . import baseline
+from .load import login_users, run_load, spawn_server
+
+
+# Пропускная способность смеси bench.load при 1..N воркерах (python -m backend.serve --workers N):
+#   GODATE_DB_PATH=/tmp/bench.db python -m bench.scaling --workers 1 2 4 --duration 15
+# Клиент — потоки одного процесса; на --concurrency-per-worker соединений на воркер. Если
+# rps перестаёт расти раньше, чем кончаются ядра, сначала проверьте, что упёрлись не в клиент
+# (запустите его с другой машины через bench.load --url).
+
+
+def main() -> int:
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Масштабирование API по числу воркеров uvicorn")
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, 2, 4, cpus}), help="числа воркеров по очереди")
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--concurrency-per-worker", type=int, default=8)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--password", default="benchpass")
+    parser.add_argument("--routes", type=int, default=5000, help="диапазон id маршрутов для лайков")
+    parser.add_argument("--seed", type=int, default=1)
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    results = {}
+    single_rps = None
+    for workers in args.workers:
+        proc, url = spawn_server(workers)
+        try:
+            tokens = login_users(url, args.users, args.password)
+            run = run_load(url, tokens, args.duration, args.concurrency_per_worker * workers, args.seed, args.routes)
+        finally:
+            proc.terminate()
+            proc.wait()
+        total = run["_total"]
+        single_rps = single_rps or total["rps"]
+        results[f"workers_{workers}"] = {
+            "rps": total["rps"],
+            "speedup": total["rps"] / single_rps,
+            "median_ms": total["median_ms"],
+            "p95_ms": total["p95_ms"],
+            "requests": total["requests"],
+            "errors": total["errors"],
+        }
+        print(f"{workers} workers: {total['rps']:.1f} rps")
+    print(f"scaling ({cpus} cpus, {args.duration:.0f} s per run):")
+    meta = {"cpus": cpus, "duration": args.duration, "concurrency_per_worker": args.concurrency_per_worker}
+    return baseline.report("scaling", results, args, meta)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import random
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from backend.fragments import parse_points, stitch_list, GZIP_LEVEL
+from backend.main import refresh_route_derived
+from backend.models import Route
+from backend.schemas import RoutePublic
+
+from . import baseline
+
+
+# Сравнение сериализации списка маршрутов: старый путь через RoutePublic + response_model
+# против склейки предрендеренных фрагментов. Запуск: python -m bench.serialization
+
+
+def make_routes(n: int, points: int) -> List[Route]:
+    rnd = random.Random(42)
+    routes = []
+    for i in range(n):
+        r = Route(
+            id=i + 1,
+            title=f"Маршрут {i}",
+            description="Прогулка по центру, кофе и набережная",
+            city=rnd.choice(["moscow", "spb", "kazan"]),
+            time_minutes=rnd.randint(30, 300),
+            budget=rnd.randint(0, 5000),
+            points_json=json.dumps([{
+                "name": f"Точка {j}",
+                "description": None,
+                "lat": 55.75 + rnd.uniform(-0.05, 0.05),
+                "lon": 37.62 + rnd.uniform(-0.05, 0.05),
+            } for j in range(points)]),
+        )
+        refresh_route_derived(r)
+        routes.append(r)
+    return routes
+
+
+def legacy(routes: List[Route], adapter: TypeAdapter) -> bytes:
+    result = []
+    for r in routes:
+        result.append(RoutePublic(**{
+            "id": r.id,
+            "title": r.title,
+            "description": r.description,
+            "city": r.city,
+            "time_minutes": r.time_minutes,
+            "budget": r.budget,
+            "likes": 3,
+            "points": parse_points(r.points_json),
+            "distance_m": r.distance_m,
+        }))
+    # то, что делает FastAPI с response_model: валидация, jsonable_encoder, json.dumps
+    value = adapter.validate_python(result, from_attributes=True)
+    content = jsonable_encoder(value)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def fragments(routes: List[Route]) -> bytes:
+    return stitch_list((r.public_json, 3) for r in routes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время сериализации списка маршрутов")
+    parser.add_argument("--routes", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    routes = make_routes(args.routes, args.points)
+    adapter = TypeAdapter(List[RoutePublic])
+    assert json.loads(legacy(routes, adapter)) == json.loads(fragments(routes))
+
+    body = fragments(routes)
+    compressed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    results = {
+        "legacy": baseline.time_calls(lambda: legacy(routes, adapter), args.repeat),
+        "fragments": baseline.time_calls(lambda: fragments(routes), args.repeat),
+        "gzip": baseline.time_calls(lambda: gzip.compress(body, compresslevel=GZIP_LEVEL), args.repeat),
+    }
+    results["fragments"]["body_bytes"] = len(body)
+    results["gzip"]["body_bytes"] = len(compressed)
+    print(f"{args.routes} routes, {args.points} points each "
+          f"(x{results['legacy']['median_ms'] / results['fragments']['median_ms']:.1f} faster than legacy):")
+    meta = {"routes": args.routes, "points": args.points}
+    raise SystemExit(baseline.report("serialization", results, args, meta))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from . import baseline
+
+
+# Холодный старт backend.main: разбивка времени импорта по модулям (python -X importtime)
+# и фазы старта в отдельном процессе — импорт, init_db на новой базе, init_db на актуальной.
+#   python -m bench.startup                      # отчёт
+#   python -m bench.startup --budget-ms 1500     # код 1, если холодный старт дольше бюджета
+#   python -m bench.startup --db /tmp/bench.db   # на копии существующей базы
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_PHASES = """
+import json, time
+started = time.perf_counter()
+import backend.main as main
+imported = time.perf_counter()
+main.init_db()
+print(json.dumps({"import": imported - started, "init_db": time.perf_counter() - imported}))
+"""
+
+
+def _run(args: List[str], db_path: Path) -> subprocess.CompletedProcess:
+    env = {**os.environ, "GODATE_DB_PATH": str(db_path), "PYTHONPATH": str(ROOT)}
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def import_profile(db_path: Path) -> List[Tuple[str, int, int, int]]:
+    # [(модуль, self_us, cumulative_us, глубина)] в порядке вывода importtime
+    stderr = _run(["-X", "importtime", "-c", "import backend.main"], db_path).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def print_import_profile(rows: List[Tuple[str, int, int, int]], top: int):
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+    total = sum(by_package.values())
+    print(f"import backend.main: {total / 1000:.1f} ms")
+    print("by top-level package (self time):")
+    for package, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]:
+        print(f"  {package:<28} {us / 1000:8.1f} ms  {us / total:6.1%}")
+    # прямые импорты приложения: что именно тянет каждый модуль backend
+    print("imported by backend modules (cumulative):")
+    app_rows = [(name, cumulative) for name, _, cumulative, _ in rows if name.startswith("backend.") or name == "backend"]
+    for name, cumulative in sorted(app_rows, key=lambda r: -r[1])[:top]:
+        print(f"  {name:<28} {cumulative / 1000:8.1f} ms")
+
+
+def startup_phases(source_db: Path, repeat: int) -> Dict[str, dict]:
+    samples: Dict[str, List[float]] = defaultdict(list)
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / "godate.db"
+            if source_db is not None:
+                shutil.copy(source_db, db_path)
+            first = json.loads(_run(["-c", _PHASES], db_path).stdout.strip().splitlines()[-1])
+            second = json.loads(_run(["-c", _PHASES], db_path).stdout.strip().splitlines()[-1])
+        samples["import"].append(second["import"])
+        samples["init_db_migrate"].append(first["init_db"])
+        samples["init_db_current"].append(second["init_db"])
+        samples["cold_start"].append(second["import"] + second["init_db"])
+    return {key: baseline.summarize(values) for key, values in samples.items()}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Профиль холодного старта backend.main")
+    parser.add_argument("--db", type=Path, default=None, help="копия какой базы используется (по умолчанию новая пустая)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=None, help="бюджет медианы cold_start (импорт + init_db)")
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print_import_profile(import_profile(Path(tmp) / "godate.db"), args.top)
+    results = startup_phases(args.db, args.repeat)
+    print("startup phases:")
+    code = baseline.report("startup", results, args, meta={"db": str(args.db) if args.db else "empty"})
+    if args.budget_ms is not None:
+        cold = results["cold_start"]["median_ms"]
+        verdict = "ok" if cold <= args.budget_ms else "OVER BUDGET"
+        print(f"cold start {cold:.1f} ms, budget {args.budget_ms:.1f} ms: {verdict}")
+        if cold > args.budget_ms:
+            code = 1
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import argparse
+import random
+import string
+import sys
+import time
+
+from backend.usersearch import NicknameIndex
+
+from . import baseline
+
+
+# Автодополнение ника на синтетическом индексе без базы (по умолчанию миллион ников):
+#   python -m bench.usersearch --users 1000000 --compare
+# Цель — медиана поиска заметно меньше миллисекунды.
+
+
+def build(users: int, seed: int) -> NicknameIndex:
+    rnd = random.Random(seed)
+    alphabet = string.ascii_lowercase + string.digits + "_"
+    names = {}
+    while len(names) < users:
+        name = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(4, 14)))
+        names.setdefault(name, len(names) + 1)
+    index = NicknameIndex()
+    keys = sorted(names)
+    index._keys = keys
+    index._ids = [names[k] for k in keys]
+    index._names = list(keys)
+    index._loaded = True
+    return index
+
+
+def run(users: int, queries: int, seed: int):
+    started = time.perf_counter()
+    index = build(users, seed)
+    built = time.perf_counter() - started
+    rnd = random.Random(seed + 1)
+    samples = {}
+    for length in (1, 2, 3, 5):
+        prefixes = [rnd.choice(index._keys)[:length] for _ in range(queries)]
+        timings = []
+        for prefix in prefixes:
+            t0 = time.perf_counter()
+            index.search(prefix, 10)
+            timings.append(time.perf_counter() - t0)
+        samples[f"prefix_{length}"] = baseline.summarize(timings)
+    insert_timings = []
+    for i in range(min(queries, 200)):
+        t0 = time.perf_counter()
+        index.add(users + i + 1, f"new_user_{i}")
+        insert_timings.append(time.perf_counter() - t0)
+    samples["add"] = baseline.summarize(insert_timings)
+    return samples, built
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Поиск ника по префиксу в NicknameIndex")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    baseline.add_arguments(parser)
+    args = parser.parse_args()
+    results, built = run(args.users, args.queries, args.seed)
+    print(f"usersearch ({args.users} nicknames, index built in {built:.1f} s):")
+    return baseline.report("usersearch", results, args, meta={"users": args.users})
+
+
+if __name__ == "__main__":
+    sys.exit(main())
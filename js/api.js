@@ -1,3 +1,63 @@
+// Encoded polyline с точностью 1e-6, как backend/polyline.py: списки маршрутов с ?points=polyline
+// отдают координаты одной строкой. Арифметика вместо побитовых операций — без 32-битных ограничений.
+const Polyline = {
+  PRECISION: 6,
+  encode(coords, precision = Polyline.PRECISION) {
+    const factor = 10 ** precision;
+    let out = '';
+    let prevLat = 0;
+    let prevLon = 0;
+    const put = (value) => {
+      let v = value < 0 ? -2 * value - 1 : 2 * value;
+      while (v >= 32) {
+        out += String.fromCharCode(32 + (v % 32) + 63);
+        v = Math.floor(v / 32);
+      }
+      out += String.fromCharCode(v + 63);
+    };
+    for (const [lat, lon] of coords) {
+      const latI = Math.round(lat * factor);
+      const lonI = Math.round(lon * factor);
+      put(latI - prevLat);
+      put(lonI - prevLon);
+      prevLat = latI;
+      prevLon = lonI;
+    }
+    return out;
+  },
+  decode(encoded, precision = Polyline.PRECISION) {
+    const factor = 10 ** precision;
+    const coords = [];
+    let index = 0;
+    let lat = 0;
+    let lon = 0;
+    const next = () => {
+      let result = 0;
+      let mult = 1;
+      let byte;
+      do {
+        byte = encoded.charCodeAt(index++) - 63;
+        result += (byte % 32) * mult;
+        mult *= 32;
+      } while (byte >= 32);
+      return result % 2 ? -(result + 1) / 2 : result / 2;
+    };
+    while (index < encoded.length) {
+      lat += next();
+      lon += next();
+      coords.push([lat / factor, lon / factor]);
+    }
+    return coords;
+  },
+  // маршрут в формате polyline -> обычный вид (points с lat/lon); обычный возвращается как есть
+  expandRoute(route) {
+    if (typeof route.polyline !== 'string') return route;
+    const coords = Polyline.decode(route.polyline);
+    const { polyline, ...rest } = route;
+    return { ...rest, points: (route.points || []).map((p, i) => ({ ...p, lat: coords[i][0], lon: coords[i][1] })) };
+  },
+};
+
 const API = {
   async request(path, { method = 'GET', body, auth = false } = {}) {
     const url = `${window.API_CONFIG.BASE_URL}${path}`;
@@ -34,8 +94,17 @@ const API = {
     if (!res.ok) throw new Error('Неверный email или пароль');
     return res.json();
   },
+  // Bootstrap: несколько секций первой загрузки одним запросом
+  async bootstrap(params = {}) {
+    const q = new URLSearchParams(params).toString();
+    return this.request(q ? `/bootstrap?${q}` : '/bootstrap', { auth: true });
+  },
   // Users
   async me() { return this.request('/users/me', { auth: true }); },
+  async searchUsers(prefix, limit = 10) {
+    const q = new URLSearchParams({ prefix, limit }).toString();
+    return this.request(`/users/search?${q}`, { auth: true });
+  },
   async logout() { return this.request('/users/logout', { method: 'POST' }); },
   async updateAvatarFile(file) {
     const form = new FormData();
@@ -61,7 +130,14 @@ const API = {
   async routes(params = {}) {
     const q = new URLSearchParams(params).toString();
     const path = q ? `/routes?${q}` : '/routes';
-    return this.request(path);
+    // с токеном в маршрутах приходят liked_by_me / favorited_by_me
+    const routes = await this.request(path, { auth: true });
+    return routes.map(Polyline.expandRoute);
+  },
+  async trendingRoutes(params = {}) {
+    const q = new URLSearchParams(params).toString();
+    const routes = await this.request(q ? `/routes/trending?${q}` : '/routes/trending', { auth: true });
+    return routes.map(Polyline.expandRoute);
   },
   async likeRoute(route_id) { return this.request('/routes/like', { method: 'POST', body: { route_id }, auth: true }); },
   async addToFavorites(route_id) { return this.request('/routes/favorite', { method: 'POST', body: { route_id }, auth: true }); },
@@ -71,14 +147,21 @@ const API = {
   async updateRoute(route_id, payload) { return this.request(`/routes/${route_id}`, { method: 'PUT', body: payload, auth: true }); },
   async deleteRoute(route_id) { return this.request(`/routes/${route_id}`, { method: 'DELETE', auth: true }); },
   async createRoute(payload) { return this.request('/routes', { method: 'POST', body: payload, auth: true }); },
+  async optimizeRoute(points, keep_start = true) { return this.request('/routes/optimize', { method: 'POST', body: { points, keep_start } }); },
   async removeFavorite(route_id) { return this.request(`/routes/favorite/${route_id}`, { method: 'DELETE', auth: true }); },
   // Rating
   async rating() { return this.request('/rating'); },
   // Recs
   async recommend(city, description, places) { return this.request('/recommendations', { method: 'POST', body: { city, description, places }, auth: true }); },
+  async recommendedRoutes(params = {}) {
+    const q = new URLSearchParams(params).toString();
+    const routes = await this.request(q ? `/recommendations/routes?${q}` : '/recommendations/routes', { auth: true });
+    return routes.map(Polyline.expandRoute);
+  },
   // AI Generation
   async aiGenerate(payload) { return this.request('/ai/generate', { method: 'POST', body: payload }); },
 };
 
 window.API = API;
+window.Polyline = Polyline;
 
@@ -6,9 +6,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
   const dailyButtons = Array.from(document.querySelectorAll('[data-daily]'));
 
-  async function refreshDailyUI() {
+  async function refreshDailyUI(preloaded) {
     try {
-      const info = await API.dailyToday();
+      const info = preloaded || await API.dailyToday();
       const isCompleted = !!info.completed;
       dailyButtons.forEach(btn => {
         btn.disabled = isCompleted;
@@ -131,17 +131,17 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
-  async function loadRoutes() {
+  function routeParams() {
+    return cityFilter && cityFilter.value ? { city: cityFilter.value } : {};
+  }
+
+  async function loadRoutes(preloaded) {
     if (!stack) return;
     stack.innerHTML = '<div class="loading-routes">Загрузка маршрутов...</div>';
     try {
-      const params = cityFilter && cityFilter.value ? { city: cityFilter.value } : {};
-      const [allRoutes, favorites] = await Promise.all([
-        API.routes(params),
-        (async () => { try { return await API.getFavorites(); } catch { return []; } })(),
-      ]);
-      const favoriteIds = new Set((favorites || []).map(r => r.id));
-      routes = (allRoutes || []).filter(r => !favoriteIds.has(r.id));
+      // уже добавленные в избранное отмечены сервером (favorited_by_me), отдельный запрос не нужен
+      const allRoutes = preloaded ? preloaded.routes : await API.routes({ ...routeParams(), points: 'polyline' });
+      routes = (allRoutes || []).map(Polyline.expandRoute).filter(r => !r.favorited_by_me);
       currentIndex = 0;
       layoutStack();
     } catch (e) {
@@ -177,7 +177,7 @@ document.addEventListener('DOMContentLoaded', () => {
   }
 
   // Обработчики
-  applyBtn?.addEventListener('click', loadRoutes);
+  applyBtn?.addEventListener('click', () => loadRoutes());
 
   // Поддержка жестов: влево — skip, вправо — в избранное
   if (stack) {
@@ -260,8 +260,14 @@ document.addEventListener('DOMContentLoaded', () => {
     });
   }
 
-  // Первичная загрузка
-  loadRoutes();
-  refreshDailyUI();
+  // Первичная загрузка: для авторизованного — один запрос /bootstrap вместо двух
+  (async () => {
+    let boot = null;
+    if (window.getAuthToken()) {
+      try { boot = await API.bootstrap({ include: 'daily,routes', points: 'polyline', ...routeParams() }); } catch {}
+    }
+    loadRoutes(boot);
+    refreshDailyUI(boot && boot.daily);
+  })();
   startDailyCountdown();
 });
@@ -1,6 +1,6 @@
-async function renderProfile() {
+async function renderProfile(preloaded) {
   try {
-    const me = await API.me();
+    const me = preloaded || await API.me();
     document.getElementById('userName').innerText = me.nickname;
     document.getElementById('userEmail').innerText = me.email;
     document.getElementById('userId').innerText = me.id;
@@ -68,6 +68,27 @@ async function renderProfile() {
       catch (e) { UI.showModal('Ошибка', e.message); }
     };
 
+    // подсказки ников при вводе (id и email не подсказываем)
+    const friendInput = document.getElementById('friendInput');
+    const friendSuggestions = document.getElementById('friendSuggestions');
+    let suggestTimer = null;
+    friendInput.oninput = () => {
+      clearTimeout(suggestTimer);
+      const prefix = friendInput.value.trim();
+      if (!prefix || /^\d+$/.test(prefix) || prefix.includes('@')) { friendSuggestions.innerHTML = ''; return; }
+      suggestTimer = setTimeout(async () => {
+        try {
+          const users = await API.searchUsers(prefix);
+          friendSuggestions.innerHTML = '';
+          users.forEach(u => {
+            const option = document.createElement('option');
+            option.value = u.nickname;
+            friendSuggestions.appendChild(option);
+          });
+        } catch (e) { friendSuggestions.innerHTML = ''; }
+      }, 150);
+    };
+
     // кнопки смены аватарки
     const selectAvatarBtn = document.getElementById('selectAvatarBtn');
     const changeAvatarBtn = document.getElementById('changeAvatarBtn');
@@ -108,12 +129,12 @@ async function renderProfile() {
   }
 }
 
-async function renderMyRoutes() {
+async function renderMyRoutes(preloaded) {
   const container = document.getElementById('myRoutesList');
   if (!container) return;
   try {
     container.innerHTML = '<div class="loading-routes">Загрузка...</div>';
-    const routes = await API.myRoutes();
+    const routes = preloaded || await API.myRoutes();
     if (!routes.length) { container.innerHTML = '<p>У вас пока нет маршрутов</p>'; return; }
     container.innerHTML = '';
     routes.forEach(r => {
@@ -173,5 +194,10 @@ async function removeFriend(friendId) {
   }
 }
 
-document.addEventListener('DOMContentLoaded', async () => { await renderProfile(); await renderMyRoutes(); });
+document.addEventListener('DOMContentLoaded', async () => {
+  let boot = {};
+  try { boot = await API.bootstrap({ include: 'me,mine' }); } catch {}
+  await renderProfile(boot.me);
+  await renderMyRoutes(boot.mine);
+});
 